@@ -1,10 +1,13 @@
 import csv
+from collections import defaultdict
 from datetime import datetime
 from io import StringIO
+from typing import Dict, List, Optional, Set, Tuple
 
 import pytz
-import tldextract
+from celery import group
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
 
 import logging
@@ -13,7 +16,9 @@ from websecmap.api.models import SIDNUpload
 from websecmap.celery import app
 from websecmap.map.logic.map_defaults import get_country, get_organization_type
 from websecmap.map.models import Configuration
+from websecmap.organizations import normalization
 from websecmap.organizations.models import Url
+from websecmap.scanners.scanner.utils import in_chunks
 
 log = logging.getLogger(__package__)
 
@@ -22,6 +27,9 @@ FIELD_SECOND_LEVEL = 1
 FIELD_QNAME = 2
 FIELD_ASNS = 3
 
+# The amount of subdomains that are resolved and added in a single task.
+SIDN_CHUNK_SIZE = 100
+
 
 def get_uploads(user):
     # last 500 should be enough...
@@ -115,6 +123,12 @@ def sidn_process_upload(amount: int = 25):
 
 @app.task(queue="reporting")
 def sidn_handle_domain_upload(upload_id: int):
+    """
+    Plans the subdomains of an upload: the subdomains are grouped per second level domain that is in the database,
+    subdomains that already exist are left out. The remaining subdomains are resolved and added in chunks, in parallel.
+    Every chunk records its progress and the added domains on the upload, the last chunk marks the upload as done, or
+    as error when a chunk failed.
+    """
     log.debug(f"Processing sidn data from {upload_id}")
 
     upload = SIDNUpload.objects.all().filter(id=upload_id).first()
@@ -123,17 +137,73 @@ def sidn_handle_domain_upload(upload_id: int):
         log.debug(f"Could not find upload {upload_id}.")
         return
 
-    added = set(process_SIDN_row(row) for row in csv.reader(StringIO(upload.posted_data), delimiter=","))
-    # remove all error situations, which return None
-    added.remove(None)
+    chunks = plan_SIDN_upload(group_SIDN_subdomains(upload.posted_data))
 
-    upload.state = "done"
-    upload.amount_of_newly_added_domains = len(added)
-    upload.newly_added_domains = [url.url for url in added]
+    upload.state = "being_processed" if chunks else "done"
+    upload.amount_of_chunks = len(chunks)
+    upload.processed_chunks = 0
+    upload.errors = ""
+    upload.amount_of_newly_added_domains = 0
+    upload.newly_added_domains = []
     upload.save()
 
+    log.debug(f"Adding subdomains from upload {upload_id} in {len(chunks)} chunks.")
+    if chunks:
+        group(sidn_add_subdomains.si(upload_id, url_id, subdomains) for url_id, subdomains in chunks).apply_async()
+
+
+@app.task(queue="reporting")
+def sidn_add_subdomains(upload_id: int, url_id: int, subdomains: List[str]):
+    """A chunk that fails is counted as processed as well, so the upload is finished, in the state error."""
+    added_domains, error = [], ""
+    try:
+        url = Url.objects.all().filter(id=url_id).first()
+        added = url.add_subdomains_bulk(subdomains, "added via SIDN") if url else []
+        added_domains = list(Url.objects.all().filter(id__in=added).values_list("url", flat=True))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record_SIDN_chunk(upload_id, added_domains, error)
+
+
+def record_SIDN_chunk(upload_id: int, added_domains: List[str], error: str = ""):
+    # chunks finish at the same time, the lock makes sure no progress is lost.
+    with transaction.atomic():
+        upload = SIDNUpload.objects.all().select_for_update().defer("posted_data").filter(id=upload_id).first()
+        if not upload:
+            return
+
+        upload.processed_chunks += 1
+        upload.newly_added_domains = (upload.newly_added_domains or []) + added_domains
+        upload.amount_of_newly_added_domains = len(upload.newly_added_domains)
+        if error:
+            upload.errors += f"{error}\n"
+        if upload.processed_chunks >= upload.amount_of_chunks:
+            upload.state = "error" if upload.errors else "done"
+        upload.save(
+            update_fields=[
+                "processed_chunks",
+                "newly_added_domains",
+                "amount_of_newly_added_domains",
+                "errors",
+                "state",
+            ]
+        )
+
+
+def group_SIDN_subdomains(csv_data: str) -> Dict[str, Set[str]]:
+    """Reads the upload row by row, returns the subdomains per second level domain."""
+    subdomains = defaultdict(set)
+    for row in csv.reader(StringIO(csv_data), delimiter=","):
+        parsed = parse_SIDN_row(row)
+        if parsed:
+            second_level_domain, subdomain = parsed
+            subdomains[second_level_domain].add(subdomain)
+    return subdomains
 
-def process_SIDN_row(row):
+
+def parse_SIDN_row(row) -> Optional[Tuple[str, str]]:
     if len(row) < 4:
         log.debug("Row does not have the correct length.")
         return
@@ -143,13 +213,11 @@ def process_SIDN_row(row):
         log.debug("Ignoring header field.")
         return
 
-    log.debug(f"Processing {row[FIELD_QNAME]}.")
-
     # We only care about the qname, field, which can be a very long domain
     # it might also not match the 2nd level in case of old domains.
     # for example: 333,arnhem.nl,www.myris.zeewolde.nl.,1 -> the 2nd level should be ignored there.
     # Do not roll your own domain extraction.
-    extracted = tldextract.extract(remove_last_dot(row[FIELD_QNAME]))
+    extracted = normalization.extract(remove_last_dot(row[FIELD_QNAME]).lower())
 
     if not extracted.subdomain:
         log.debug("No subdomain found in query. Skipping.")
@@ -159,27 +227,50 @@ def process_SIDN_row(row):
         log.debug("Found wildcard in subdomain. Not adding this.")
         return
 
-    second_level_domain = f"{extracted.domain}.{extracted.suffix}"
-    existing_second_level_url = (
-        Url.objects.all()
-        .filter(
-            Q(computed_subdomain__isnull=True) | Q(computed_subdomain=""),
-            url=second_level_domain,
-            is_dead=False,
-            # We cannot verify if this is a real subdomain, as wildcards always resolve. There are ways with overhead.
-            uses_dns_wildcard=False,
-            # Some domains should not add new subdomains, for example large organizations with 5000 real subdomains.
-            do_not_find_subdomains=False,
+    return f"{extracted.domain}.{extracted.suffix}", extracted.subdomain
+
+
+def plan_SIDN_upload(subdomains: Dict[str, Set[str]]) -> List[Tuple[int, List[str]]]:
+    """Returns chunks of new subdomains of existing second level domains, as (url id, subdomains)."""
+    parents = {}
+    for second_level_domains in in_chunks(sorted(subdomains), 500):
+        # the oldest url wins when a domain is in the database more than once.
+        parents.update(
+            Url.objects.all()
+            .filter(
+                Q(computed_subdomain__isnull=True) | Q(computed_subdomain=""),
+                url__in=second_level_domains,
+                is_dead=False,
+                # We cannot verify if this is a real subdomain, as wildcards always resolve. There are ways with
+                # overhead.
+                uses_dns_wildcard=False,
+                # Some domains should not add new subdomains, for example large organizations with 5000 real
+                # subdomains.
+                do_not_find_subdomains=False,
+            )
+            .order_by("-id")
+            .values_list("url", "id")
         )
-        .first()
-    )
-
-    if not existing_second_level_url:
-        log.debug(f"Url '{second_level_domain}' is not in the database yet, so cannot add a subdomain.")
-        return
 
-    log.debug(f"Attempting to add {extracted.subdomain} as a subdomain of {second_level_domain}.")
-    return existing_second_level_url.add_subdomain(extracted.subdomain, "added via SIDN")
+    log.debug(f"{len(parents)} of {len(subdomains)} second level domains are in the database.")
+
+    candidates = {
+        f"{subdomain}.{domain}": (domain, subdomain) for domain in parents for subdomain in subdomains[domain]
+    }
+    existing = set()
+    for new_urls in in_chunks(sorted(candidates), 500):
+        existing.update(Url.objects.all().filter(url__in=new_urls).values_list("url", flat=True))
+
+    new_subdomains = defaultdict(list)
+    for new_url in sorted(set(candidates) - existing):
+        domain, subdomain = candidates[new_url]
+        new_subdomains[domain].append(subdomain)
+
+    return [
+        (parents[domain], chunk)
+        for domain, domain_subdomains in new_subdomains.items()
+        for chunk in in_chunks(domain_subdomains, SIDN_CHUNK_SIZE)
+    ]
 
 
 def get_map_configuration():
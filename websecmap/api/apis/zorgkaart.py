@@ -37,7 +37,6 @@ from typing import List, Dict, Any
 
 import googlemaps
 import requests
-import tldextract
 import logging
 
 from constance import config
@@ -47,6 +46,7 @@ from iso3166 import countries_by_alpha2
 from requests.auth import HTTPBasicAuth
 
 from websecmap.celery import app
+from websecmap.organizations import normalization
 from websecmap.organizations.models import Organization, OrganizationType, Coordinate, Url
 
 log = logging.getLogger(__package__)
@@ -390,7 +390,7 @@ def add_urls_to_organizations(organizations: List[Organization], urls: List[str]
         for url in urls:
             # make the API easier to use:
             # will parse extensive urls: https://www.apple.com:80/yolo/swag
-            extract = tldextract.extract(url)
+            extract = normalization.extract(url)
 
             if extract.subdomain:
                 url = f"{extract.subdomain}.{extract.domain}.{extract.suffix}"
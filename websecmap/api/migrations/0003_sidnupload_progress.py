@@ -0,0 +1,27 @@
+# Generated by Django 3.1.13 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_auto_20200218_0842"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sidnupload",
+            name="amount_of_chunks",
+            field=models.PositiveIntegerField(
+                default=0, help_text="The new subdomains of an upload are resolved and added in this many chunks."
+            ),
+        ),
+        migrations.AddField(
+            model_name="sidnupload",
+            name="processed_chunks",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Progress: the amount of chunks that have been resolved and added."
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.13 on 2026-10-19 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_sidnupload_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sidnupload",
+            name="errors",
+            field=models.TextField(
+                blank=True, default="", help_text="Errors of chunks that failed, the upload ends in the state error."
+            ),
+        ),
+    ]
@@ -32,6 +32,18 @@ class SIDNUpload(models.Model):
 
     amount_of_newly_added_domains = models.PositiveIntegerField(default=0)
 
+    amount_of_chunks = models.PositiveIntegerField(
+        default=0, help_text="The new subdomains of an upload are resolved and added in this many chunks."
+    )
+
+    processed_chunks = models.PositiveIntegerField(
+        default=0, help_text="Progress: the amount of chunks that have been resolved and added."
+    )
+
+    errors = models.TextField(
+        default="", blank=True, help_text="Errors of chunks that failed, the upload ends in the state error."
+    )
+
     class Meta:
         get_latest_by = "at_when"
         ordering = ("-at_when",)
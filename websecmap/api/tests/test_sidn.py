@@ -1,3 +1,4 @@
+import pytest
 from django.contrib.auth.models import User
 from django.test import TestCase
 
@@ -5,6 +6,7 @@ import websecmap
 from websecmap.api.apis.sidn import (
     get_map_configuration,
     sidn_domain_upload,
+    sidn_add_subdomains,
     sidn_handle_domain_upload,
     get_2ndlevel_domains,
     remove_last_dot,
@@ -31,8 +33,10 @@ class ApiTest(TestCase):
         )
 
 
-def test_domain_upload(db, requests_mock, current_path):
+def test_domain_upload(db, requests_mock, current_path, settings, mocker):
     # the first answer is cached indefinitely. So the first request has to be correct.
+    # the subdomains are added in tasks, which run directly here.
+    settings.CELERY_TASK_ALWAYS_EAGER = True
 
     requests_mock.get(
         "https://publicsuffix.org/list/public_suffix_list.dat",
@@ -110,6 +114,22 @@ def test_domain_upload(db, requests_mock, current_path):
         ]
     )
     assert first_upload.amount_of_newly_added_domains == 9
+    assert first_upload.processed_chunks == first_upload.amount_of_chunks == 1
+
+    # processing again does not add the same subdomains again
+    sidn_handle_domain_upload(1)
+    first_upload = SIDNUpload.objects.first()
+    assert (first_upload.state, first_upload.amount_of_chunks, first_upload.newly_added_domains) == ("done", 0, [])
+
+    # a chunk that fails is recorded, the upload ends in the state error instead of being processed forever
+    first_upload.state, first_upload.amount_of_chunks = "being_processed", 1
+    first_upload.save()
+    mocker.patch.object(Url, "add_subdomains_bulk", side_effect=OSError("resolver unavailable"))
+    with pytest.raises(OSError):
+        sidn_add_subdomains(first_upload.id, new_url.id, ["new"])
+    first_upload = SIDNUpload.objects.first()
+    assert (first_upload.state, first_upload.processed_chunks) == ("error", 1)
+    assert first_upload.errors == "OSError: resolver unavailable\n"
 
 
 def text(filepath: str):
@@ -15,6 +15,15 @@ class Websecmap(AppConfig):
 
     def ready(self):
         """Run when Failmap app has fully loaded."""
+        # this module is also used in settings, so connecting to signals of models happens here.
+        from constance.backends.database.models import Constance
+        from constance.signals import config_updated
+        from django.db.models.signals import post_save
+
+        from websecmap.app.constance import invalidate_config_snapshot
+
+        config_updated.connect(invalidate_config_snapshot)
+        post_save.connect(invalidate_config_snapshot, sender=Constance)
 
         # detect if we run inside the autoreloader's second thread
         inner_run = os.environ.get("RUN_MAIN")
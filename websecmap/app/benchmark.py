@@ -0,0 +1,149 @@
+"""
+Measures the report pipeline, map data, planner and the top and ticker data against the current database.
+
+Use a database with a synthetic world (see websecmap.app.synthetic) to get comparable measurements. Every run is
+appended as a line of json to a results file, together with the database vendor and the size of the data. A run is
+compared with the previous run on the same database and data size, so regressions stand out.
+
+Everything a run changes, such as reports, map data and planned scans, is rolled back afterwards. So every run starts
+from the same data.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import pytz
+from django.db import connection, transaction
+
+from websecmap.map.logic.map import get_map_data
+from websecmap.map.logic.ticker import get_ticker_data
+from websecmap.map.logic.top import get_top_fail_data, get_top_win_data
+from websecmap.map.models import MapDataCache, OrganizationReport
+from websecmap.map.report import PUBLISHED_SCAN_TYPES, calculate_map_data, recreate_organization_reports
+from websecmap.organizations.models import Organization, Url
+from websecmap.reporting.models import UrlReport
+from websecmap.reporting.report import recreate_url_reports
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, PlannedScan, UrlGenericScan
+from websecmap.scanners.plannedscan import plan_outdated_scans
+
+log = logging.getLogger(__package__)
+
+
+def benchmarks(country: str, layer: str, map_days: int) -> Dict[str, Callable[[], Any]]:
+    """The measured operations, in the order they are run: reports are created before they are used."""
+
+    def url_reports():
+        url_ids = list(Url.objects.all().values_list("id", flat=True))
+        for task in recreate_url_reports(url_ids):
+            task.apply()
+
+    def organization_reports():
+        recreate_organization_reports(list(Organization.objects.all().values_list("id", flat=True)))
+
+    return {
+        "recreate_url_reports": url_reports,
+        "recreate_organization_reports": organization_reports,
+        "calculate_map_data": lambda: calculate_map_data(days=map_days),
+        "get_map_data": lambda: get_map_data(country, layer, 0, ""),
+        "plan_outdated_scans": lambda: plan_outdated_scans(PUBLISHED_SCAN_TYPES),
+        "top": lambda: (get_top_win_data(country, layer), get_top_fail_data(country, layer)),
+        "ticker": lambda: get_ticker_data(country, layer, 0, 0),
+    }
+
+
+def run_benchmarks(
+    country: str = "NL", layer: str = "municipality", map_days: int = 7, only: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Runs the benchmarks, returns the duration in seconds and the number of queries per benchmark. Benchmarks that are
+    not in only, but come before one that is, are run without measuring them: they create what is measured later.
+    """
+    result = {
+        "when": datetime.now(pytz.utc).isoformat(),
+        "database": connection.vendor,
+        "size": data_size(),
+        "parameters": {"country": country, "layer": layer, "map_days": map_days},
+        "timings": {},
+        "queries": {},
+    }
+
+    selected = benchmarks(country, layer, map_days)
+    if only:
+        last = max(list(selected).index(name) for name in only)
+        selected = dict(list(selected.items())[: last + 1])
+
+    with transaction.atomic():
+        for name, benchmark in selected.items():
+            if only and name not in only:
+                benchmark()
+                continue
+
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                benchmark()
+                result["timings"][name] = round(time.perf_counter() - started, 3)
+            result["queries"][name] = queries.count
+            log.info(f"{name}: {result['timings'][name]} seconds, {queries.count} queries.")
+
+        transaction.set_rollback(True)
+
+    return result
+
+
+class QueryCounter:
+    # Counts queries without storing them, so millions of queries can be counted.
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def data_size() -> Dict[str, int]:
+    return {
+        "organizations": Organization.objects.all().count(),
+        "urls": Url.objects.all().count(),
+        "endpoints": Endpoint.objects.all().count(),
+        "url_scans": UrlGenericScan.objects.all().count(),
+        "endpoint_scans": EndpointGenericScan.objects.all().count(),
+        "url_reports": UrlReport.objects.all().count(),
+        "organization_reports": OrganizationReport.objects.all().count(),
+        "map_data": MapDataCache.objects.all().count(),
+        "planned_scans": PlannedScan.objects.all().count(),
+    }
+
+
+def store_result(result: Dict[str, Any], filename: str):
+    with open(filename, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+def previous_result(result: Dict[str, Any], filename: str) -> Optional[Dict[str, Any]]:
+    """The last stored run on the same database, with the same data and parameters."""
+    if not os.path.exists(filename):
+        return None
+
+    previous = None
+    with open(filename) as f:
+        for line in f:
+            stored = json.loads(line)
+            if all(stored[key] == result[key] for key in ["database", "size", "parameters"]):
+                previous = stored
+    return previous
+
+
+def compare(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> List[str]:
+    lines = []
+    for name, duration in result["timings"].items():
+        line = f"{name:<32} {duration:>10.3f}s {result['queries'][name]:>10} queries"
+        if previous and name in previous["timings"]:
+            before = previous["timings"][name]
+            change = (duration - before) / before * 100 if before else 0
+            line += f"   was {before:.3f}s ({change:+.0f}%), {previous['queries'][name]} queries"
+        lines.append(line)
+    return lines
@@ -0,0 +1,25 @@
+"""
+Versioned cache keys: cached values include a version in their key, invalidating them all is bumping that version.
+
+This way everything that is cached under a version is invalidated at once, in every process that shares the cache,
+without knowing the keys of the cached values.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+
+def cache_version(key: str) -> int:
+    return cache.get(key, 0)
+
+
+def bump_cache_version(key: str):
+    """Bumps the version after the current transaction is committed, as other processes can only read it then."""
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the version does not exist yet, or has been evicted. It does not expire.
+            cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
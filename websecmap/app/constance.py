@@ -1,10 +1,51 @@
-from datetime import datetime
-from typing import List
+import time
+from typing import Any, Dict, List
 
-import pytz
 from constance import config
 
-constance_cache = {}
+from websecmap.app.cache import bump_cache_version, cache_version
+
+"""
+All configuration values are loaded in one query into a snapshot that is shared by everything that runs in a process.
+Reading a value is a dictionary lookup.
+
+Saving a value invalidates the snapshot of the saving process at once. Other processes, such as workers, learn about
+the change through a version counter in the (shared) cache, which they check every few seconds. Without a shared
+cache the snapshot is reloaded once per minute.
+"""
+
+SNAPSHOT_VERSION_KEY = "constance_snapshot_version"
+SNAPSHOT_VERSION_CHECK_INTERVAL = 5
+SNAPSHOT_MAX_AGE = 60
+
+# Replaced as a whole, so other threads never see a half loaded snapshot.
+snapshot = {"values": {}, "version": None, "loaded_on": float("-inf"), "checked_on": float("-inf")}
+
+
+def config_snapshot() -> Dict[str, Any]:
+    global snapshot
+
+    now = time.monotonic()
+    if now - snapshot["checked_on"] < SNAPSHOT_VERSION_CHECK_INTERVAL:
+        return snapshot["values"]
+
+    version = cache_version(SNAPSHOT_VERSION_KEY)
+    if version != snapshot["version"] or now - snapshot["loaded_on"] > SNAPSHOT_MAX_AGE:
+        from constance import admin
+
+        # retrieves everything, pretty quickly
+        snapshot = {"values": admin.get_values(), "version": version, "loaded_on": now, "checked_on": now}
+    else:
+        snapshot = {**snapshot, "checked_on": now}
+
+    return snapshot["values"]
+
+
+def invalidate_config_snapshot(*args, **kwargs):
+    """Connected to the signals of constance and its database backend when the app is ready."""
+    global snapshot
+    snapshot = {**snapshot, "checked_on": float("-inf"), "loaded_on": float("-inf")}
+    bump_cache_version(SNAPSHOT_VERSION_KEY)
 
 
 def get_bulk_values(keys: List[str]):
@@ -15,10 +56,7 @@ def get_bulk_values(keys: List[str]):
     :param keys:
     :return:
     """
-    from constance import admin
-
-    # retrieves everything, pretty quickly
-    values = admin.get_values()
+    values = config_snapshot()
 
     # and now extract the keys we want to have
     return {k: values[k] for k in keys if k in values}
@@ -26,30 +64,20 @@ def get_bulk_values(keys: List[str]):
 
 def constance_cached_value(key):
     """
-    Tries to minimize access to the database for constance. Every time you want a value, you'll get the latest value.
-    This, without running memcached, or using a django cache. The django in memory cache (what this is) is not
-    recommended. You CAN use this cache if you are fine with a variable being retrieved every so often, but not all
-    the time. -> This routine saves about 10.000 roundtrips to the database.
+    Tries to minimize access to the database for constance: the value is read from the configuration snapshot.
 
     That's great but not really needed: it takes 8 roundtrips per url, which is not slow but still slows things down.
     That means about 5000 * 8 database hits per rebuild. = 40.000, which does have an impact.
 
-    This cache holds the value for ten minutes.
-
     :param key:
     :return:
     """
-    now = datetime.now(pytz.utc).timestamp()
-    expired = now - 600  # 10 minute cache, 600 seconds. So changes still affect a rebuild.
-
-    if constance_cache.get(key, None):
-        if constance_cache[key]["time"] > expired:
-            return constance_cache[key]["value"]
+    values = config_snapshot()
+    if key in values:
+        return values[key]
 
-    # add value to cache, or update cache
-    value = getattr(config, key)
-    constance_cache[key] = {"value": value, "time": datetime.now(pytz.utc).timestamp()}
-    return value
+    # unknown settings raise an AttributeError, as before
+    return getattr(config, key)
 
 
 def validate_constance_configuration(CONSTANCE_CONFIG, CONSTANCE_CONFIG_FIELDSETS):
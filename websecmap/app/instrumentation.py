@@ -0,0 +1,140 @@
+"""
+Durations and counts of the phases of reporting and scanning, such as creating a timeline, calculating severities,
+saving reports, dns lookups, http requests and waiting in the queue.
+
+Phases are sent to statsd as the "phase" timer and the "phase_count" counter, with the phase as tag. Optionally every
+phase is also written to a local profile log, a line of json per phase. This is enabled with the environment variables
+INSTRUMENTATION (statsd) and INSTRUMENTATION_PROFILE_LOG (a file name). When disabled, measuring costs a check of a
+setting.
+
+Usage:
+    with phase("url_report.timeline"):
+        timeline = create_timeline(url)
+
+    @timed("severity")
+    def get_severity(scan): ...
+
+    count("severity.cache_miss")
+
+The time tasks wait in a queue is measured as the "queue_wait" phase: the moment of publishing is added to the headers
+of the task message and compared to the moment the worker starts the task. This relies on the clocks of the publisher
+and the worker being in sync.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from celery.signals import before_task_publish, task_prerun
+from django.conf import settings
+from statshog.defaults.django import statsd
+
+log = logging.getLogger(__package__)
+
+profile_log_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return settings.INSTRUMENTATION or bool(settings.INSTRUMENTATION_PROFILE_LOG)
+
+
+class Phase:
+    __slots__ = ("name", "tags", "started")
+
+    def __init__(self, name: str, tags: Dict[str, str]):
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, time.perf_counter() - self.started, self.tags)
+        return False
+
+
+class DisabledPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+disabled_phase = DisabledPhase()
+
+
+def phase(name: str, **tags: str):
+    """Measures the duration of the code in the with-block."""
+    if not enabled():
+        return disabled_phase
+    return Phase(name, tags)
+
+
+def timed(name: Optional[str] = None, **tags: str) -> Callable:
+    """Decorator that measures the duration of every call. The phase is named after the function by default."""
+
+    def decorator(function):
+        phase_name = name or f"{function.__module__}.{function.__name__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return function(*args, **kwargs)
+            with Phase(phase_name, tags):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, amount: int = 1, **tags: str):
+    """Counts occurrences of something in a phase, for example the number of scans in a timeline."""
+    if not enabled():
+        return
+
+    if settings.INSTRUMENTATION:
+        statsd.incr("phase_count", amount, tags={"phase": name, **tags})
+    if settings.INSTRUMENTATION_PROFILE_LOG:
+        write_profile_log({"phase": name, "count": amount, **tags})
+
+
+def record(name: str, duration: float, tags: Dict[str, str]):
+    if settings.INSTRUMENTATION:
+        statsd.timing("phase", duration * 1000, tags={"phase": name, **tags})
+    if settings.INSTRUMENTATION_PROFILE_LOG:
+        write_profile_log({"phase": name, "duration": round(duration, 6), **tags})
+
+
+def write_profile_log(entry: Dict):
+    entry = {"when": time.time(), "pid": os.getpid(), **entry}
+    line = json.dumps(entry, default=str) + "\n"
+    with profile_log_lock:
+        try:
+            with open(settings.INSTRUMENTATION_PROFILE_LOG, "a") as f:
+                f.write(line)
+        except OSError as error:
+            log.debug(f"Could not write to profile log: {error}")
+
+
+@before_task_publish.connect
+def add_published_on(headers=None, **kwargs):
+    if headers is not None and enabled():
+        headers["published_on"] = time.time()
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    published_on = getattr(task.request, "published_on", None) if task else None
+    # tasks that are published without instrumentation, or that are run eagerly, have no moment of publishing.
+    if published_on is None or not enabled():
+        return
+    queue = (task.request.delivery_info or {}).get("routing_key", "")
+    record("queue_wait", max(time.time() - published_on, 0), {"task": task.name, "queue": queue})
@@ -0,0 +1,44 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from websecmap.app.benchmark import benchmarks, compare, previous_result, run_benchmarks, store_result
+from websecmap.app.synthetic import synthetic_world_exists
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    # Example usage: create_synthetic_dataset, then benchmark. Then change something and run benchmark again.
+    help = (
+        "Measures the report pipeline, map data, planner, top and ticker against the current database. Results are "
+        "stored and compared with the previous run on the same database and data size. Everything the benchmarks "
+        "change is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--country", default="NL")
+        parser.add_argument("--layer", default="municipality")
+        parser.add_argument("--map-days", type=int, default=7, help="Days of map data to calculate.")
+        parser.add_argument(
+            "--only", nargs="*", choices=list(benchmarks("NL", "municipality", 1)), help="Run only these benchmarks."
+        )
+        parser.add_argument("--results", default="benchmark_results.jsonl", help="File that stores the results.")
+        parser.add_argument("--dry-run", action="store_true", help="Do not store the results.")
+        parser.add_argument("--force", action="store_true", help="Also run without a synthetic world.")
+
+    def handle(self, *args, **options):
+        if not synthetic_world_exists() and not options["force"]:
+            raise CommandError(
+                "There is no synthetic world in this database, see create_synthetic_dataset. Use --force."
+            )
+
+        result = run_benchmarks(options["country"], options["layer"], options["map_days"], options["only"])
+        previous = previous_result(result, options["results"])
+
+        self.stdout.write(f"Database: {result['database']}, data: {result['size']}.")
+        for line in compare(result, previous):
+            self.stdout.write(line)
+
+        if not options["dry_run"]:
+            store_result(result, options["results"])
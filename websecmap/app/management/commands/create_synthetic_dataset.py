@@ -0,0 +1,61 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from websecmap.app.synthetic import WorldParameters, create_world, plan_world
+from websecmap.organizations.models import Organization
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    # Example usage: create_synthetic_dataset --organizations 400 --urls-per-organization 150
+    help = (
+        "Creates a synthetic world of organizations, urls, endpoints and scans, to measure performance at "
+        "production scale. The same parameters and seed always create the same world. Use an empty database. A "
+        "synthetic world that already exists is replaced."
+    )
+
+    def add_arguments(self, parser):
+        defaults = WorldParameters()
+        parser.add_argument("--organizations", type=int, default=defaults.organizations)
+        parser.add_argument("--urls-per-organization", type=int, default=defaults.urls_per_organization)
+        parser.add_argument("--endpoints-per-url", type=int, default=defaults.endpoints_per_url, choices=range(0, 5))
+        parser.add_argument(
+            "--scans-per-type",
+            type=int,
+            default=defaults.scans_per_type,
+            help="The amount of rating changes per scan type per url/endpoint.",
+        )
+        parser.add_argument("--history-days", type=int, default=defaults.history_days)
+        parser.add_argument(
+            "--explained",
+            type=float,
+            default=defaults.explained,
+            help="The share of latest scans with a bad outcome that is explained.",
+        )
+        parser.add_argument("--country", default=defaults.country)
+        parser.add_argument("--layer", default=defaults.layer)
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument(
+            "--force", action="store_true", help="Also add the world when there already are organizations."
+        )
+
+    def handle(self, *args, **options):
+        if Organization.objects.all().exists() and not options["force"]:
+            raise CommandError("The database is not empty, measurements will not be comparable. Use --force.")
+
+        parameters = WorldParameters(
+            organizations=options["organizations"],
+            urls_per_organization=options["urls_per_organization"],
+            endpoints_per_url=options["endpoints_per_url"],
+            scans_per_type=options["scans_per_type"],
+            history_days=options["history_days"],
+            explained=options["explained"],
+            country=options["country"],
+            layer=options["layer"],
+            seed=options["seed"],
+        )
+
+        created = create_world(plan_world(parameters))
+        self.stdout.write(", ".join(f"{amount} {name}" for name, amount in created.items()))
@@ -0,0 +1,298 @@
+"""
+A synthetic world of organizations, urls, endpoints and scans, to measure performance at production scale.
+
+The world is generated from a seed: the same parameters and seed result in the same organizations, urls, endpoints,
+ratings and explanations. Moments are relative to the end of the history, which is today by default, so reports and
+maps are "current" when the world is measured.
+
+Planning is separated from storing: plan_world creates the world in memory, create_world stores it with bulk inserts.
+Creating a world replaces the synthetic world that already is in the database.
+"""
+import hashlib
+import logging
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytz
+from django.db import transaction
+
+from websecmap.map.models import Configuration
+from websecmap.organizations import normalization
+from websecmap.organizations.models import Coordinate, Organization, OrganizationType, Url
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.scanmanager import store_severity
+
+log = logging.getLogger(__package__)
+
+ORGANIZATION_PREFIX = "Synthetic organization "
+DOMAIN_PREFIX = "synthetic-organization-"
+
+NO_HTTPS = "Site does not redirect to secure url, and has no secure alternative on a standard port."
+MISSING_COUNTERPART = "Redirects to a secure site, while a secure counterpart on the standard port is missing."
+
+# Per scan type: possible (rating, explanation) outcomes, from bad to good.
+OUTCOMES = {
+    "DNSSEC": [
+        ("ERROR", "DNSSEC is incorrectly or not configured (errors found)."),
+        ("SECURE", "DNSSEC seems to be implemented sufficiently."),
+    ],
+    "plain_https": [("0", NO_HTTPS), ("25", MISSING_COUNTERPART), ("100", "Site redirects to a secure url.")],
+    "tls_qualys_encryption_quality": [("F", "Broken encryption."), ("B", "Less than optimal."), ("A", "Good.")],
+    "tls_qualys_certificate_trusted": [("not trusted", "Certificate is not trusted."), ("trusted", "Trusted.")],
+    "http_security_header_strict_transport_security": [("False", "Header not present."), ("True", "Present.")],
+}
+
+URL_SCAN_TYPES = ["DNSSEC"]
+
+# Endpoints in the order they are given to urls, with the scans that are performed on them.
+ENDPOINTS = [
+    ("http", 80, 4, ["plain_https"]),
+    (
+        "https",
+        443,
+        4,
+        [
+            "tls_qualys_encryption_quality",
+            "tls_qualys_certificate_trusted",
+            "http_security_header_strict_transport_security",
+        ],
+    ),
+    ("http", 80, 6, ["plain_https"]),
+    ("https", 443, 6, ["tls_qualys_encryption_quality", "tls_qualys_certificate_trusted"]),
+]
+
+
+@dataclass
+class WorldParameters:
+    organizations: int = 100
+    urls_per_organization: int = 10
+    endpoints_per_url: int = 2
+    # every scan is a change in rating, scans that do not change the rating are not stored.
+    scans_per_type: int = 3
+    history_days: int = 365
+    # the share of latest scans with a bad outcome that is explained.
+    explained: float = 0.05
+    country: str = "NL"
+    layer: str = "municipality"
+    seed: int = 42
+    until: Optional[datetime] = None
+
+    def end(self) -> datetime:
+        if self.until:
+            return self.until
+        return datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass
+class World:
+    parameters: WorldParameters
+    organizations: List[Dict[str, Any]] = field(default_factory=list)
+    urls: List[Dict[str, Any]] = field(default_factory=list)
+    endpoints: List[Dict[str, Any]] = field(default_factory=list)
+    scans: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def plan_world(parameters: WorldParameters) -> World:
+    rng = random.Random(parameters.seed)
+    end = parameters.end()
+    start = end - timedelta(days=parameters.history_days)
+    world = World(parameters)
+
+    for organization_number in range(parameters.organizations):
+        organization = f"{ORGANIZATION_PREFIX}{organization_number}"
+        world.organizations.append({"name": organization, "number": organization_number})
+
+        for url_number in range(parameters.urls_per_organization):
+            # the first url of an organization is its domain, the others are subdomains.
+            domain = f"{DOMAIN_PREFIX}{organization_number}.nl"
+            url = domain if not url_number else f"host{url_number}.{domain}"
+            world.urls.append({"url": url, "organization": organization})
+            world.scans += plan_scans(rng, parameters, start, end, URL_SCAN_TYPES, url=url)
+
+            for protocol, port, ip_version, scan_types in ENDPOINTS[: parameters.endpoints_per_url]:
+                endpoint = (url, protocol, port, ip_version)
+                world.endpoints.append({"url": url, "protocol": protocol, "port": port, "ip_version": ip_version})
+                world.scans += plan_scans(rng, parameters, start, end, scan_types, endpoint=endpoint)
+
+    return world
+
+
+def plan_scans(rng, parameters: WorldParameters, start: datetime, end: datetime, scan_types: List[str], **subject):
+    scans = []
+    seconds = int((end - start).total_seconds())
+    for scan_type in scan_types:
+        moments = sorted(start + timedelta(seconds=rng.randrange(seconds)) for _ in range(parameters.scans_per_type))
+
+        outcome = None
+        for number, moment in enumerate(moments):
+            # every scan changes the rating
+            outcome = rng.choice([option for option in OUTCOMES[scan_type] if option != outcome])
+            latest = number == len(moments) - 1
+            scans.append(
+                {
+                    **subject,
+                    "type": scan_type,
+                    "rating": outcome[0],
+                    "explanation": outcome[1],
+                    "rating_determined_on": moment,
+                    "last_scan_moment": end if latest else moments[number + 1],
+                    "is_the_latest_scan": latest,
+                    # the first outcome is the worst
+                    "explained": latest and outcome == OUTCOMES[scan_type][0] and rng.random() < parameters.explained,
+                }
+            )
+    return scans
+
+
+@transaction.atomic
+def create_world(world: World, batch_size: int = 1000) -> Dict[str, int]:
+    """Stores the world in the database. Returns the number of created objects per type."""
+    parameters = world.parameters
+    start = parameters.end() - timedelta(days=parameters.history_days)
+
+    # objects are related by name below, a previous world would result in duplicate names.
+    delete_world()
+
+    layer, _ = OrganizationType.objects.all().get_or_create(name=parameters.layer)
+    Configuration.objects.all().get_or_create(
+        country=parameters.country,
+        organization_type=layer,
+        defaults={"is_displayed": True, "is_reported": True, "is_scanned": True, "is_the_default_option": True},
+    )
+
+    Organization.objects.bulk_create(
+        [
+            Organization(
+                name=organization["name"],
+                computed_name_slug=f"{DOMAIN_PREFIX}{organization['number']}",
+                type=layer,
+                country=parameters.country,
+                created_on=start,
+            )
+            for organization in world.organizations
+        ],
+        batch_size=batch_size,
+    )
+    # not every database returns the ids of a bulk insert.
+    organizations = dict(
+        Organization.objects.all().filter(name__startswith=ORGANIZATION_PREFIX, type=layer).values_list("name", "id")
+    )
+
+    Coordinate.objects.bulk_create(
+        [
+            coordinate(organizations[organization["name"]], organization["number"], start)
+            for organization in world.organizations
+        ],
+        batch_size=batch_size,
+    )
+
+    new_urls = []
+    for url in world.urls:
+        extracted = normalization.extract(url["url"])
+        new_urls.append(
+            Url(
+                url=url["url"],
+                created_on=start,
+                onboarded=True,
+                onboarding_stage="onboarded",
+                computed_subdomain=extracted.subdomain,
+                computed_domain=extracted.domain,
+                computed_suffix=extracted.suffix,
+            )
+        )
+    Url.objects.bulk_create(new_urls, batch_size=batch_size)
+    urls = dict(Url.objects.all().filter(url__contains=DOMAIN_PREFIX).values_list("url", "id"))
+
+    Url.organization.through.objects.bulk_create(
+        [
+            Url.organization.through(url_id=urls[url["url"]], organization_id=organizations[url["organization"]])
+            for url in world.urls
+        ],
+        batch_size=batch_size,
+    )
+
+    Endpoint.objects.bulk_create(
+        [
+            Endpoint(
+                url_id=urls[endpoint["url"]],
+                protocol=endpoint["protocol"],
+                port=endpoint["port"],
+                ip_version=endpoint["ip_version"],
+                discovered_on=start,
+            )
+            for endpoint in world.endpoints
+        ],
+        batch_size=batch_size,
+    )
+    endpoints = {
+        (url, protocol, port, ip_version): endpoint_id
+        for endpoint_id, url, protocol, port, ip_version in Endpoint.objects.all()
+        .filter(url_id__in=urls.values())
+        .values_list("id", "url__url", "protocol", "port", "ip_version")
+    }
+
+    url_scans, endpoint_scans = [], []
+    for planned in world.scans:
+        if "url" in planned:
+            scan = UrlGenericScan(url_id=urls[planned["url"]])
+            url_scans.append(scan)
+        else:
+            scan = EndpointGenericScan(endpoint_id=endpoints[planned["endpoint"]])
+            endpoint_scans.append(scan)
+
+        scan.type = planned["type"]
+        scan.rating = planned["rating"]
+        scan.explanation = planned["explanation"]
+        scan.evidence = ""
+        scan.rating_determined_on = planned["rating_determined_on"]
+        scan.last_scan_moment = planned["last_scan_moment"]
+        scan.is_the_latest_scan = planned["is_the_latest_scan"]
+        if planned["explained"]:
+            scan.comply_or_explain_is_explained = True
+            scan.comply_or_explain_explanation = "Synthetic explanation."
+            scan.comply_or_explain_explained_by = "Synthetic"
+            scan.comply_or_explain_explained_on = planned["rating_determined_on"]
+            scan.comply_or_explain_explanation_valid_until = planned["last_scan_moment"] + timedelta(days=365)
+        store_severity(scan)
+
+    UrlGenericScan.objects.bulk_create(url_scans, batch_size=batch_size)
+    EndpointGenericScan.objects.bulk_create(endpoint_scans, batch_size=batch_size)
+
+    created = {
+        "organizations": len(organizations),
+        "urls": len(urls),
+        "endpoints": len(endpoints),
+        "url_scans": len(url_scans),
+        "endpoint_scans": len(endpoint_scans),
+    }
+    log.info(f"Created synthetic world: {created}.")
+    return created
+
+
+def delete_world():
+    """Deletes the synthetic world, including everything that relates to it such as scans and reports."""
+    deleted = Url.objects.all().filter(url__contains=DOMAIN_PREFIX).delete()[0]
+    deleted += Organization.objects.all().filter(name__startswith=ORGANIZATION_PREFIX).delete()[0]
+    if deleted:
+        log.info(f"Deleted the previous synthetic world, {deleted} objects.")
+
+
+def synthetic_world_exists() -> bool:
+    return Organization.objects.all().filter(name__startswith=ORGANIZATION_PREFIX).exists()
+
+
+def coordinate(organization_id: int, number: int, start: datetime) -> Coordinate:
+    # organizations are squares, laid out in a grid of 50 columns.
+    left, bottom = 3.3 + (number % 50) * 0.05, 50.7 + (number // 50) * 0.05
+    area = [
+        [[[left, bottom], [left + 0.04, bottom], [left + 0.04, bottom + 0.04], [left, bottom + 0.04], [left, bottom]]]
+    ]
+    return Coordinate(
+        organization_id=organization_id,
+        geojsontype="MultiPolygon",
+        area=area,
+        calculated_area_hash=hashlib.md5(str(area).encode("utf-8")).hexdigest(),  # nosec, not for security
+        created_on=start,
+    )
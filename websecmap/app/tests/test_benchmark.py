@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+import pytz
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from websecmap.app.benchmark import compare, previous_result, run_benchmarks, store_result
+from websecmap.app.synthetic import WorldParameters, create_world, plan_world
+from websecmap.map.models import MapDataCache
+from websecmap.organizations.models import Url
+from websecmap.reporting.models import UrlReport
+from websecmap.scanners.models import EndpointGenericScan, PlannedScan
+
+
+def test_synthetic_world_and_benchmark(db, tmp_path):
+    parameters = WorldParameters(
+        organizations=3,
+        urls_per_organization=4,
+        endpoints_per_url=2,
+        explained=0.5,
+        until=datetime(2021, 1, 1, tzinfo=pytz.utc),
+    )
+
+    # the benchmarks only run on a synthetic world
+    with pytest.raises(CommandError):
+        call_command("benchmark", "--dry-run")
+
+    # the same seed creates the same world
+    world = plan_world(parameters)
+    assert world == plan_world(parameters)
+    assert world != plan_world(WorldParameters(**{**parameters.__dict__, "seed": 1}))
+
+    # creating the world again replaces it, instead of relating objects to duplicates
+    create_world(world)
+    created = create_world(world)
+    # per url: a DNSSEC scan, plain_https on http and 3 scans on https, 3 changes per scan type.
+    assert created == {"organizations": 3, "urls": 12, "endpoints": 24, "url_scans": 36, "endpoint_scans": 144}
+    assert Url.objects.all().count() == 12
+    assert EndpointGenericScan.objects.all().count() == 144
+
+    result = run_benchmarks("NL", "municipality", map_days=1)
+    assert list(result["timings"]) == [
+        "recreate_url_reports",
+        "recreate_organization_reports",
+        "calculate_map_data",
+        "get_map_data",
+        "plan_outdated_scans",
+        "top",
+        "ticker",
+    ]
+    assert result["size"]["endpoint_scans"] == 144
+    assert result["queries"]["get_map_data"] > 0
+
+    # every run starts from the same data
+    assert not UrlReport.objects.all().exists()
+    assert not MapDataCache.objects.all().exists()
+    assert not PlannedScan.objects.all().exists()
+
+    # earlier benchmarks create what is measured, without being measured themselves
+    only = run_benchmarks("NL", "municipality", map_days=1, only=["get_map_data"])
+    assert list(only["timings"]) == ["get_map_data"]
+    assert only["queries"]["get_map_data"] == result["queries"]["get_map_data"]
+
+    # results are compared to the previous run with the same database and data
+    results = str(tmp_path / "results.jsonl")
+    assert previous_result(result, results) is None
+    store_result(result, results)
+    assert previous_result(result, results) == result
+    assert "was" in compare(result, previous_result(result, results))[0]
@@ -0,0 +1,30 @@
+import pytest
+from constance import config
+
+from websecmap.app.constance import constance_cached_value, get_bulk_values, invalidate_config_snapshot
+
+
+@pytest.fixture
+def fresh_snapshot():
+    # the snapshot is shared by the process, the values of this test are rolled back in the database afterwards.
+    invalidate_config_snapshot()
+    yield
+    invalidate_config_snapshot()
+
+
+def test_config_snapshot(db, settings, fresh_snapshot, django_assert_num_queries, django_capture_on_commit_callbacks):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+    # all values are loaded at once
+    with django_assert_num_queries(1):
+        assert constance_cached_value("SCAN_AT_ALL") is True
+        assert get_bulk_values(["PROJECT_COUNTRY", "NOT_A_SETTING"]) == {"PROJECT_COUNTRY": "NL"}
+        assert constance_cached_value("SCANNER_DNSSEC_ENGINE") == "dnscheck"
+
+    # a change is visible at once
+    with django_capture_on_commit_callbacks(execute=True):
+        config.SCAN_AT_ALL = False
+    assert constance_cached_value("SCAN_AT_ALL") is False
+
+    with pytest.raises(AttributeError):
+        constance_cached_value("NOT_A_SETTING")
@@ -0,0 +1,51 @@
+import json
+from types import SimpleNamespace
+
+from websecmap.app import instrumentation
+from websecmap.app.instrumentation import add_published_on, count, phase, record_queue_wait, timed
+
+
+def test_instrumentation(settings, tmp_path, mocker):
+    statsd = mocker.patch.object(instrumentation, "statsd")
+
+    @timed("addition", kind="test")
+    def add(a, b):
+        return a + b
+
+    # disabled: nothing is measured
+    settings.INSTRUMENTATION, settings.INSTRUMENTATION_PROFILE_LOG = False, ""
+    with phase("timeline"):
+        assert add(1, 2) == 3
+    count("moments", 3)
+    headers = {}
+    add_published_on(headers=headers)
+    assert headers == {}
+    assert not statsd.method_calls
+
+    # statsd
+    settings.INSTRUMENTATION = True
+    with phase("timeline"):
+        assert add(1, 2) == 3
+    count("moments", 3)
+    assert [call[0] for call in statsd.method_calls] == ["timing", "timing", "incr"]
+    assert statsd.timing.call_args_list[0][1]["tags"] == {"phase": "addition", "kind": "test"}
+    assert statsd.incr.call_args[0][:2] == ("phase_count", 3)
+
+    # profile log only
+    settings.INSTRUMENTATION, settings.INSTRUMENTATION_PROFILE_LOG = False, str(tmp_path / "profile.jsonl")
+    statsd.reset_mock()
+    with phase("save", table="urlreport"):
+        pass
+    add_published_on(headers=headers)
+    task = SimpleNamespace(
+        name="recreate_url_report", request=SimpleNamespace(delivery_info={"routing_key": "reporting"}, **headers)
+    )
+    record_queue_wait(task=task)
+    assert not statsd.method_calls
+
+    with open(settings.INSTRUMENTATION_PROFILE_LOG) as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["phase"] for entry in entries] == ["save", "queue_wait"]
+    assert entries[0]["table"] == "urlreport"
+    assert entries[1]["queue"] == "reporting"
+    assert all(entry["duration"] >= 0 for entry in entries)
@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime
+from typing import Dict
 
 import pytz
 import simplejson as json
@@ -9,7 +10,7 @@ from constance import config
 from dal import autocomplete
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.db.models.functions import Lower
 from django.db.utils import OperationalError
 from django.http import JsonResponse
@@ -32,6 +33,9 @@ one_hour = 60 * 60
 one_day = 24 * 60 * 60
 ten_minutes = 60 * 10
 
+# the issues that count towards the score of a team.
+SCORED_SEVERITIES = ["high", "medium", "low"]
+
 
 # workaround to start a contest view, has to be rewritten to use the configured default and fallback etc
 def get_default_contest(request):
@@ -152,6 +156,24 @@ def submit_organisation(request):
     )
 
 
+def summed_severity(scans) -> Dict[str, int]:
+    """
+    The severity of scans is stored with the scan, so the sum is made in the database. Scans that were made before
+    the severity was stored are calculated, until store_scan_severities has stored their severity.
+    """
+    stored = scans.filter(impact__isnull=False).aggregate(
+        **{level: Sum(f"severity_{level}") for level in SCORED_SEVERITIES}
+    )
+    summed = {level: stored[level] or 0 for level in SCORED_SEVERITIES}
+
+    for scan in scans.filter(impact__isnull=True).iterator():
+        calculation = get_severity(scan)
+        for level in SCORED_SEVERITIES:
+            summed[level] += calculation[level]
+
+    return summed
+
+
 @cache_page(one_minute)
 def scores(request):
 
@@ -182,7 +204,7 @@ def scores(request):
         will change in a day or two. On the long run it might increase the score a bit when incorrect fixes are applied
         or a new error is found. If the discovered issue is fixed it doesn't deliver additional points.
         """
-        scans = list(
+        endpoint_severity = summed_severity(
             EndpointGenericScan.objects.all().filter(
                 endpoint__url__urlsubmission__added_by_team=team.id,
                 endpoint__url__urlsubmission__has_been_accepted=True,
@@ -191,7 +213,7 @@ def scores(request):
             )
         )
 
-        scans += list(
+        url_severity = summed_severity(
             UrlGenericScan.objects.all().filter(
                 url__urlsubmission__added_by_team=team.id,
                 url__urlsubmission__has_been_accepted=True,
@@ -236,17 +258,7 @@ def scores(request):
             .count()
         )
 
-        final_calculation = {
-            "high": 0,
-            "medium": 0,
-            "low": 0,
-        }
-
-        for scan in scans:
-            temp_calculation = get_severity(scan)
-            final_calculation["high"] += temp_calculation["high"]
-            final_calculation["medium"] += temp_calculation["medium"]
-            final_calculation["low"] += temp_calculation["low"]
+        final_calculation = {level: endpoint_severity[level] + url_severity[level] for level in SCORED_SEVERITIES}
 
         score_multiplier = {
             "low": 100,
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class MapConfig(AppConfig):
-    name = "map"
+    name = "websecmap.map"
+
+    def ready(self):
+        # scans are stored by workers that never load the urls, the feeds have to know about them anyway.
+        import websecmap.map.logic.rss_feeds  # noqa
@@ -5,7 +5,8 @@ from typing import Dict
 from django.utils import timezone
 
 from websecmap.map.logic.coordinates import attach_coordinate, switch_latlng
-from websecmap.organizations.models import Coordinate, Organization, OrganizationType, Url
+from websecmap.organizations import normalization
+from websecmap.organizations.models import Coordinate, Organization, OrganizationType
 from websecmap.scanners.models import ScanProxy
 
 
@@ -114,11 +115,11 @@ def add_urls(organization_id, urls: str):
 
     not_valid = []
     valid = []
-    for url in urls:
-        if not Url.is_valid_url(url):
+    for url, normalized in zip(urls, normalization.normalize_many(urls)):
+        if not normalized:
             not_valid.append(url)
         else:
-            valid.append(url)
+            valid.append(normalized.url)
 
     if not Organization.objects.all().filter(id=organization_id).exists():
         return operation_response(error=True, message="Organization could not be found.")
@@ -1,9 +1,33 @@
+import csv
+import glob
+import hashlib
+import logging
+import os
+import secrets
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
 import pyexcel as p
+import simplejson as json
+from django.conf import settings
+from django.db.models import Count, Max, QuerySet
 from django.utils import timezone
+from django.utils.text import slugify
+from openpyxl import Workbook
 
+from websecmap.app.common import JSEncoder
+from websecmap.celery import app
 from websecmap.map.logic.map_defaults import get_country, get_organization_type
+from websecmap.map.map_configs import filter_map_configs
 from websecmap.organizations.models import Coordinate, Organization, OrganizationType, Url
 
+log = logging.getLogger(__package__)
+
+# Formats that are written row by row, all other formats are created with pyexcel in memory.
+STREAMING_FORMATS = ["csv", "json", "xlsx"]
+
+# Rows that are retrieved from the database and written at the same time.
+CHUNK_SIZE = 2000
+
 
 def create_filename(set_name, country: str = "NL", organization_type="municipality"):
     country = get_country(country)
@@ -43,7 +67,7 @@ def generic_export(queryset, column_names):
     return book
 
 
-def export_urls_only(country: str = "NL", organization_type="municipality"):
+def urls_only_dataset(country: str = "NL", organization_type="municipality") -> Tuple[List[str], QuerySet]:
     # how to reuse the column definition as both headers
     columns = ["id", "url", "not_resolvable", "is_dead", "computed_subdomain", "computed_domain", "computed_suffix"]
     queryset = (
@@ -59,10 +83,10 @@ def export_urls_only(country: str = "NL", organization_type="municipality"):
             "id", "url", "not_resolvable", "is_dead", "computed_subdomain", "computed_domain", "computed_suffix"
         )
     )
-    return generic_export(queryset, columns)
+    return columns, queryset
 
 
-def export_organizations(country: str = "NL", organization_type="municipality"):
+def organizations_dataset(country: str = "NL", organization_type="municipality") -> Tuple[List[str], QuerySet]:
     columns = ["id", "name", "type", "wikidata", "wikipedia", "twitter_handle"]
     query = (
         Organization.objects.all()
@@ -81,16 +105,16 @@ def export_organizations(country: str = "NL", organization_type="municipality"):
     # exporter.Meta.fields = ['id', 'name', 'type', 'wikidata', 'wikipedia', 'twitter_handle']
     # dataset = exporter().export(query)
 
-    return generic_export(query, columns)
+    return columns, query
 
 
-def export_organization_types():
+def organization_types_dataset(country: str = "NL", organization_type="municipality") -> Tuple[List[str], QuerySet]:
     columns = ["id", "name"]
     query = OrganizationType.objects.all().values_list("id", "name")
-    return generic_export(query, columns)
+    return columns, query
 
 
-def export_coordinates(country: str = "NL", organization_type="municipality"):
+def coordinates_dataset(country: str = "NL", organization_type="municipality") -> Tuple[List[str], QuerySet]:
     organizations = Organization.objects.all().filter(
         country=get_country(country), type=get_organization_type(organization_type)
     )
@@ -98,14 +122,14 @@ def export_coordinates(country: str = "NL", organization_type="municipality"):
     columns = ["id", "organization", "geojsontype", "area"]
     query = (
         Coordinate.objects.all()
-        .filter(organization__in=list(organizations), is_dead=False)
+        .filter(organization__in=organizations.values("id"), is_dead=False)
         .values_list("id", "organization", "geojsontype", "area")
     )
 
-    return generic_export(query, columns)
+    return columns, query
 
 
-def export_urls(country: str = "NL", organization_type="municipality"):
+def urls_dataset(country: str = "NL", organization_type="municipality") -> Tuple[List[str], QuerySet]:
     organizations = Organization.objects.all().filter(
         country=get_country(country), type=get_organization_type(organization_type)
     )
@@ -114,8 +138,180 @@ def export_urls(country: str = "NL", organization_type="municipality"):
 
     query = (
         Url.objects.all()
-        .filter(organization__in=list(organizations), is_dead=False, not_resolvable=False)
+        .filter(organization__in=organizations.values("id"), is_dead=False, not_resolvable=False)
         .values_list("id", "url", "organization")
     )
 
-    return generic_export(query, columns)
+    return columns, query
+
+
+DATASETS: Dict[str, Callable[[str, str], Tuple[List[str], QuerySet]]] = {
+    "urls_only": urls_only_dataset,
+    "organizations": organizations_dataset,
+    "organization_types": organization_types_dataset,
+    "coordinates": coordinates_dataset,
+    "urls": urls_dataset,
+}
+
+
+def export_urls_only(country: str = "NL", organization_type="municipality"):
+    columns, queryset = urls_only_dataset(country, organization_type)
+    return generic_export(queryset, columns)
+
+
+def export_organizations(country: str = "NL", organization_type="municipality"):
+    columns, queryset = organizations_dataset(country, organization_type)
+    return generic_export(queryset, columns)
+
+
+def export_organization_types():
+    columns, queryset = organization_types_dataset()
+    return generic_export(queryset, columns)
+
+
+def export_coordinates(country: str = "NL", organization_type="municipality"):
+    columns, queryset = coordinates_dataset(country, organization_type)
+    return generic_export(queryset, columns)
+
+
+def export_urls(country: str = "NL", organization_type="municipality"):
+    columns, queryset = urls_dataset(country, organization_type)
+    return generic_export(queryset, columns)
+
+
+def export_stream(set_name: str, country: str, organization_type: str, file_format: str) -> Iterator[bytes]:
+    """
+    Returns the contents of a dataset in csv, json or xlsx, in chunks so it can be sent while it is being created.
+
+    Every export is stored as a snapshot on disk. The snapshot is sent again until the data changes, or until the
+    next day. The first visitor receives the data while the snapshot is being written. Xlsx files can only be
+    written completely, that snapshot is created before sending.
+    """
+    columns, queryset = DATASETS[set_name](country, organization_type)
+    path = snapshot_path(set_name, country, organization_type, file_format, queryset)
+
+    if os.path.isfile(path):
+        log.debug(f"Sending existing snapshot {path}.")
+        return read_in_chunks(path)
+
+    if file_format == "xlsx":
+        write_xlsx_snapshot(path, columns, queryset)
+        return read_in_chunks(path)
+
+    writers = {"csv": csv_chunks, "json": json_chunks}
+    return write_snapshot_while_streaming(path, writers[file_format](columns, queryset))
+
+
+@app.task(queue="reporting")
+def create_dataset_snapshots(countries: List = None, organization_types: List = None):
+    """Creates snapshots of all datasets of all reported maps, so no visitor has to wait for them."""
+    for config in filter_map_configs(countries=countries, organization_types=organization_types):
+        for set_name in DATASETS:
+            for file_format in STREAMING_FORMATS:
+                # reading the stream creates the snapshot
+                for _ in export_stream(set_name, config["country"], config["organization_type__name"], file_format):
+                    pass
+
+
+def snapshot_path(set_name: str, country: str, organization_type: str, file_format: str, queryset: QuerySet) -> str:
+    # Rows are added and removed, which changes the fingerprint. Changes to the contents of rows are not seen, those
+    # are included the next day, the same as with the previous day long cache.
+    state = queryset.aggregate(rows=Count("pk"), last=Max("pk"))
+    fingerprint = hashlib.md5(f"{state['rows']}-{state['last']}".encode()).hexdigest()[0:12]
+
+    filename = f"{snapshot_prefix(set_name, country, organization_type)}_{timezone.now().date()}_{fingerprint}"
+    return os.path.join(settings.TOOLS["datasets"]["output_dir"], f"{filename}.{file_format}")
+
+
+def snapshot_prefix(set_name: str, country: str, organization_type: str) -> str:
+    return slugify(f"{set_name}_{country}_{organization_type}")
+
+
+def read_in_chunks(path: str, chunk_size: int = 65536) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def write_snapshot_while_streaming(path: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # write to a temporary file first, so nobody is sent a partial snapshot.
+    temporary_path = f"{path}.{secrets.token_hex(4)}.tmp"
+    completed = False
+    try:
+        with open(temporary_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+
+        os.replace(temporary_path, path)
+        completed = True
+        remove_outdated_snapshots(path)
+    finally:
+        # also when the download was aborted
+        if not completed and os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+
+
+def remove_outdated_snapshots(path: str):
+    directory, filename = os.path.split(path)
+    prefix, extension = filename.rsplit("_", 2)[0], os.path.splitext(filename)[1]
+    for outdated in glob.glob(os.path.join(directory, f"{glob.escape(prefix)}_[0-9][0-9][0-9][0-9]-*{extension}")):
+        if outdated != path:
+            log.debug(f"Removing outdated snapshot {outdated}.")
+            os.remove(outdated)
+
+
+def clean_value(value: Any) -> Any:
+    # the same as generic_export, None values will cause an invalid two dimensional array.
+    return value if value is not None else ""
+
+
+def csv_chunks(columns: List[str], queryset: QuerySet) -> Iterator[bytes]:
+    class Buffer:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Buffer())
+    lines = [writer.writerow(columns)]
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        lines.append(writer.writerow([clean_value(value) for value in row]))
+        if len(lines) >= CHUNK_SIZE:
+            yield "".join(lines).encode()
+            lines = []
+
+    yield "".join(lines).encode()
+
+
+def json_chunks(columns: List[str], queryset: QuerySet) -> Iterator[bytes]:
+    # the same structure as pyexcel creates: {"data": [[column, ...], [value, ...], ...]}
+    lines = [f'{{"data": [{json.dumps(columns)}']
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        lines.append(json.dumps([clean_value(value) for value in row], cls=JSEncoder))
+        if len(lines) >= CHUNK_SIZE:
+            yield ", ".join(lines).encode()
+            # the separator between this chunk and the next
+            lines = [""]
+
+    yield (", ".join(lines) + "]}").encode()
+
+
+def write_xlsx_snapshot(path: str, columns: List[str], queryset: QuerySet):
+    # A write only workbook does not keep the rows in memory. It can only be saved once, as a whole.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("data")
+    sheet.append(columns)
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        # lists, such as coordinates, cannot be stored in a cell.
+        sheet.append([value if isinstance(value, (str, int, float)) else str(clean_value(value)) for value in row])
+
+    temporary_path = f"{path}.{secrets.token_hex(4)}.tmp"
+    try:
+        workbook.save(temporary_path)
+        os.replace(temporary_path, path)
+        remove_outdated_snapshots(path)
+    finally:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
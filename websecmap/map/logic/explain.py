@@ -1,101 +1,157 @@
-from datetime import timedelta
-from typing import Any, Dict, Union
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from django.db.models import Count, Q
+import pytz
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
 from django.utils import timezone
 
+from websecmap.app.cache import bump_cache_version, cache_version
 from websecmap.map.logic.map_defaults import get_country, get_organization_type
+from websecmap.organizations.models import Organization, Url
 from websecmap.reporting.severity import get_severity
 from websecmap.scanners import ENDPOINT_SCAN_TYPES, URL_SCAN_TYPES
-from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
 
+# Explaining and removing explanations invalidate the listing at once. Explanations added by other means, such as the
+# explanation bots or the admin, are visible after this timeout.
+EXPLAINS_CACHE_TIMEOUT = 60 * 60
 
-def get_recent_explains(country, organization_type):
-    """
-    Because explains are possible on every scan type, try to get 10 of each, merge them and orders them chronologically.
-    It's not the nicest solution as urlscan might nog be as used as endpointgenericscan.
-    :return:
-    """
+# The order of the scan levels in the listing, for explanations that are given at the same moment.
+LEVELS = ["url", "endpoint"]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
 
-    return get_all_explains(country, organization_type, limit=50)
 
+def get_recent_explains(country, organization_type, cursor: str = ""):
+    """The latest explanations of a map layer, a page at a time. Pass the next cursor to get the next page."""
+    return get_explains(country, organization_type, limit=50, cursor=cursor)
 
-def get_all_explains(country, organization_type, limit=0):
 
-    limit = 999999 if limit == 0 else limit
+def get_all_explains(country, organization_type) -> List[Dict[str, Any]]:
+    return get_explains(country, organization_type)["explains"]
+
+
+def get_explains(country, organization_type, limit: Optional[int] = None, cursor: str = "") -> Dict[str, Any]:
+    """
+    Returns the explanations that are given on the latest scans of a map layer, newest first, as a page of at most
+    limit explanations and the cursor of the next page. The next cursor is empty on the last page.
+
+    The pages are cached until an explanation is added or removed.
+    """
+    # the cursor comes from the query string: only valid cursors are cached, under their own notation.
+    try:
+        after = parse_cursor(cursor) if cursor else None
+    except ValueError:
+        return {"explains": [], "next": ""}
+    cursor = create_cursor(*after_position(after)) if after else ""
 
     country = get_country(country)
     organization_type = get_organization_type(organization_type)
 
-    # some urls are used by a lot of organizations, we only need the distinct explanation, and
-    # the organizations will be matched later.
-    # https://stackoverflow.com/questions/30752268/how-to-filter-objects-for-count-annotation-in-django
+    version = cache_version("explains_version")
+    key = f"explains_{version}_{country}_{organization_type}_{limit}_{cursor}"
+    page = cache.get(key)
+    if page is None:
+        page = list_explains(country, organization_type, limit, after)
+        cache.set(key, page, EXPLAINS_CACHE_TIMEOUT)
+    return page
+
 
+def list_explains(
+    country, organization_type, limit: Optional[int] = None, after: Optional[Tuple[datetime, int, int]] = None
+) -> Dict[str, Any]:
     # we're currently not taking into account what endpoint, URL's and organizations are alive at a certain point.
     # in that sense we're not taking history in account... Only what is relevant _NOW_
-    # This should change, adding some nice complex Q conditions for checking a certain date.
-    # something like: & (  Q(url__organization__is_dead=False, created_on__lte=some_date)
-    #                    | Q(is_dead=True,  created_on__lte=some_date, is_dead_since__gte=some_date)
-    #
-    #                 & (  Q(is_dead=False, created_on__lte=some_date)
-    #                    | Q(is_dead=True,  created_on__lte=some_date, is_dead_since__gte=some_date)
+    organizations = Organization.objects.all().filter(is_dead=False, country=country, type_id=organization_type)
+    urls = Url.objects.all().filter(is_dead=False, not_resolvable=False, organization__in=organizations)
+    listed_organizations = organizations.only("id", "name").order_by("name")
+
+    # One query per scan level, and one for the organizations of all scans of that level.
     ugss = (
-        UrlGenericScan.objects.all()
-        .filter(
-            comply_or_explain_is_explained=True,
-            is_the_latest_scan=True,
-        )
-        .annotate(
-            n_urls=Count(
-                "url",
-                filter=Q(
-                    url__organization__is_dead=False,
-                    url__organization__country=country,
-                    url__organization__type_id=organization_type,
-                    url__is_dead=False,
-                    url__not_resolvable=False,
-                ),
-            )
-        )
-        .filter(n_urls=1)
-        .order_by("-comply_or_explain_explained_on")[0:limit]
+        explained_scans(UrlGenericScan, "url", after)
+        .filter(url__in=urls)
+        .select_related("url")
+        .prefetch_related(Prefetch("url__organization", listed_organizations, to_attr="listed_organizations"))
     )
 
     egss = (
-        EndpointGenericScan.objects.all()
-        .filter(
-            comply_or_explain_is_explained=True,
-            is_the_latest_scan=True,
-        )
-        .annotate(
-            n_urls=Count(
-                "endpoint",
-                filter=Q(
-                    endpoint__is_dead=False,
-                    endpoint__url__not_resolvable=False,
-                    endpoint__url__is_dead=False,
-                    endpoint__url__organization__is_dead=False,
-                    endpoint__url__organization__country=country,
-                    endpoint__url__organization__type_id=organization_type,
-                ),
-            )
-        )
-        .filter(n_urls__gte=1)
-        .order_by("-comply_or_explain_explained_on")[0:limit]
+        explained_scans(EndpointGenericScan, "endpoint", after)
+        .filter(endpoint__in=Endpoint.objects.all().filter(is_dead=False, url__in=urls))
+        .select_related("endpoint__url")
+        .prefetch_related(Prefetch("endpoint__url__organization", listed_organizations, to_attr="listed_organizations"))
+    )
+
+    if limit:
+        # one more than needed, to know if there is a next page
+        ugss, egss = ugss[: limit + 1], egss[: limit + 1]
+
+    scans = [("url", scan) for scan in ugss] + [("endpoint", scan) for scan in egss]
+    scans.sort(key=lambda scan: position(*scan))
+
+    page = scans[:limit] if limit else scans
+    more = limit and len(scans) > limit
+    return {
+        "explains": [get_explanation(level, scan) for level, scan in page],
+        "next": create_cursor(*position(*page[-1])) if more else "",
+    }
+
+
+def explained_scans(model, level: str, after: Optional[Tuple[datetime, int, int]]):
+    # Explanations without a moment can't be ordered and are not listed.
+    scans = model.objects.all().filter(
+        comply_or_explain_is_explained=True,
+        is_the_latest_scan=True,
+        comply_or_explain_explained_on__isnull=False,
     )
 
-    explains = []
+    if after:
+        explained_on, after_level, after_id = after
+        later = Q(comply_or_explain_explained_on__lt=explained_on)
+        if LEVELS.index(level) > after_level:
+            later |= Q(comply_or_explain_explained_on=explained_on)
+        elif LEVELS.index(level) == after_level:
+            later |= Q(comply_or_explain_explained_on=explained_on, id__lt=after_id)
+        scans = scans.filter(later)
+
+    return scans.order_by("-comply_or_explain_explained_on", "-id")
+
+
+def position(level: str, scan) -> Tuple[int, int, int]:
+    """The place of a scan in the listing, sorted from first to last."""
+    return -microseconds(scan.comply_or_explain_explained_on), LEVELS.index(level), -scan.id
+
 
-    for scan in ugss:
-        explains.append(get_explanation("url", scan))
+def after_position(after: Tuple[datetime, int, int]) -> Tuple[int, int, int]:
+    explained_on, level, scan_id = after
+    return -microseconds(explained_on), level, -scan_id
 
-    for scan in egss:
-        explains.append(get_explanation("endpoint", scan))
 
-    # sorting
-    explains = sorted(explains, key=lambda k: (k["explained_on"]), reverse=True)
+def microseconds(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
 
-    return explains
+
+def create_cursor(negative_microseconds: int, level: int, negative_id: int) -> str:
+    return f"{-negative_microseconds}.{level}.{-negative_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[datetime, int, int]:
+    parts = cursor.split(".")
+    if len(cursor) > 64 or len(parts) != 3 or not all(part.isdigit() and part.isascii() for part in parts):
+        raise ValueError(f"Not a cursor: {cursor}")
+
+    moment, level, scan_id = [int(part) for part in parts]
+    if not 0 <= level < len(LEVELS):
+        raise ValueError(f"Unknown level in cursor: {cursor}")
+
+    try:
+        return EPOCH + timedelta(microseconds=moment), level, scan_id
+    except OverflowError:
+        raise ValueError(f"Moment out of range in cursor: {cursor}")
+
+
+def invalidate_explains():
+    bump_cache_version("explains_version")
 
 
 def get_explanation(type, scan):
@@ -114,12 +170,19 @@ def get_explanation(type, scan):
         "original_explanation": calculation["explanation"],
     }
 
+    url = scan.url if type == "url" else scan.endpoint.url
+    # Prefetched with the scans when listing, only the organizations on the map layer are listed then.
+    organizations = getattr(url, "listed_organizations", None)
+    if organizations is None:
+        organizations = url.organization.all()
+    this_explain["organizations"] = [
+        {"id": organization.id, "name": organization.name} for organization in organizations
+    ]
+
     if type == "url":
-        this_explain["organizations"] = scan.url.organization.name
         this_explain["subject"] = str(scan.url.url)
 
     if type == "endpoint":
-        this_explain["organizations"] = list(scan.endpoint.url.organization.all().values("id", "name"))
         this_explain["subject"] = str("%s - %s/%s - IPv%s") % (
             scan.endpoint.url,
             scan.endpoint.protocol,
@@ -158,6 +221,7 @@ def explain(scan_id: int, scan_type: str, explanation: str, explained_by: str, d
     if scan.comply_or_explain_is_explained is True:
         scan.comply_or_explain_explanation = explanation
         scan.save()
+        invalidate_explains()
         return {"error": False, "success": True, "message": "Explanation altered."}
 
     scan.comply_or_explain_is_explained = True
@@ -167,6 +231,7 @@ def explain(scan_id: int, scan_type: str, explanation: str, explained_by: str, d
     scan.comply_or_explain_explanation = explanation
     scan.comply_or_explain_case_handled_by = "Logged in user..."
     scan.save()
+    invalidate_explains()
 
     return {"error": False, "success": True, "message": "Explanation saved. This will be included in the next report."}
 
@@ -180,6 +245,7 @@ def remove_explanation(scan_id: int, scan_type: str) -> Dict[str, Any]:
 
     scan.comply_or_explain_is_explained = False
     scan.save(update_fields=["comply_or_explain_is_explained"])
+    invalidate_explains()
     return {
         "success": True,
         "error": False,
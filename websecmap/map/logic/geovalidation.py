@@ -0,0 +1,251 @@
+"""
+Validates all Point coordinates of a country at once.
+
+All points are loaded with one query and tested against the geofences in numpy arrays. Optionally the real borders
+of a country can be used, given as a GeoJSON (Multi)Polygon. Points that are in the country after switching lat and
+lng are reported as flipped, points with the same location for the same organization as duplicates. Both can be
+repaired in bulk.
+
+Remember that GeoJSON points are stored as [lng, lat].
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.db import transaction
+
+from websecmap.organizations.models import Coordinate
+
+log = logging.getLogger(__package__)
+
+# These are rough bounding boxes, and have little to do with actual borders. It's to find out if a
+# coordinate fits in a certain box, and thus a certain country... in a case where you already know the country.
+GEOFENCES = {
+    "NL": [
+        {
+            "description": "The Netherlands",
+            "topleft": {"lat": 53.814923, "lng": 2.975974},
+            "bottomright": {"lat": 50.598581, "lng": 7.544157},
+        },
+        {
+            # these are close together, but are legally different types of entities at the time of writing
+            "description": "Aruba, Curaçao, Bonaire",
+            "topleft": {"lat": 12.787964, "lng": -70.209741},
+            "bottomright": {"lat": 11.792349, "lng": -67.971954},
+        },
+        {
+            "description": "Saba, Sint Eustatius",
+            "topleft": {"lat": 17.760588, "lng": -63.414997},
+            "bottomright": {"lat": 17.319307, "lng": -62.923775},
+        },
+        {
+            "description": "Sint Maarten",
+            "topleft": {"lat": 18.072169, "lng": -63.245902},
+            "bottomright": {"lat": 17.906288, "lng": -62.956277},
+        },
+    ]
+}
+
+
+def validate_points(
+    country: str = None,
+    borders: Optional[Dict[str, Any]] = None,
+    fix_flipped: bool = False,
+    remove_duplicates: bool = False,
+) -> Dict[str, List[int]]:
+    """
+    Reports (and optionally repairs) the points of the organizations in a country.
+
+    :param country: two letter country code. When omitted all points are checked on duplicates, but not on location.
+    :param borders: GeoJSON geometry of the country, points also have to be inside this geometry.
+    :param fix_flipped: switch lat and lng of points that are in the country after switching.
+    :param remove_duplicates: delete points with the same location for the same organization, the oldest one stays.
+    :return: ids of coordinates per finding: flipped, outside, duplicates and unreadable.
+    """
+    points = load_points(country)
+    lng, lat = points["lng"], points["lat"]
+
+    flipped = np.zeros(len(lng), dtype=bool)
+    outside = np.zeros(len(lng), dtype=bool)
+    if country:
+        inside = points_in_country(lng, lat, country, borders)
+        flipped = ~inside & points_in_country(lat, lng, country, borders)
+        outside = ~inside & ~flipped
+
+    duplicates = np.zeros(len(lng), dtype=bool)
+    if fix_flipped:
+        # the flipped points are repaired, so they are compared at their right location.
+        compared = np.ones(len(lng), dtype=bool)
+        lng, lat = np.where(flipped, lat, lng), np.where(flipped, lng, lat)
+    else:
+        # a flipped point is not a duplicate of the correct one: it could be deleted while the flipped one stays.
+        compared = ~flipped
+
+    keys = np.column_stack([points["organization"], points["is_dead"], lng, lat])[compared]
+    if len(keys):
+        # points are ordered by id, so the first of every location is the oldest.
+        _, first = np.unique(keys, axis=0, return_index=True)
+        compared_duplicates = np.ones(len(keys), dtype=bool)
+        compared_duplicates[first] = False
+        duplicates[compared] = compared_duplicates
+
+    report = {
+        "checked": [int(i) for i in points["id"]],
+        "flipped": [int(i) for i in points["id"][flipped]],
+        "outside": [int(i) for i in points["id"][outside]],
+        "duplicates": [int(i) for i in points["id"][duplicates]],
+        "unreadable": points["unreadable"],
+    }
+
+    if report["outside"]:
+        log.error(
+            f"{len(report['outside'])} coordinates are not in {country} at all, even if we flip their axis. Is your "
+            f"geofence correct? Or are you missing parts of your country? (Overseas territories?) "
+            f"Coordinates: {report['outside']}."
+        )
+
+    if report["unreadable"]:
+        log.error(f"Coordinates {report['unreadable']} are not a [lng, lat] list. Try map_repair_corrupt_coordinates.")
+
+    with transaction.atomic():
+        if fix_flipped and report["flipped"]:
+            switch_latlng_in_bulk(report["flipped"], duplicates=report["duplicates"] if remove_duplicates else [])
+
+        if remove_duplicates and report["duplicates"]:
+            log.info(f"Deleting {len(report['duplicates'])} duplicate coordinates.")
+            Coordinate.objects.all().filter(id__in=report["duplicates"]).delete()
+
+    return report
+
+
+def load_points(country: str = None) -> Dict[str, Any]:
+    coordinates = Coordinate.objects.all().filter(geojsontype="Point")
+    if country:
+        coordinates = coordinates.filter(organization__country=country)
+
+    ids, organizations, dead, lngs, lats, unreadable = [], [], [], [], [], []
+    for coordinate_id, organization_id, is_dead, area in coordinates.order_by("id").values_list(
+        "id", "organization_id", "is_dead", "area"
+    ):
+        point = readable_point(area)
+        if not point:
+            unreadable.append(coordinate_id)
+            continue
+
+        ids.append(coordinate_id)
+        # coordinates without organization are compared with each other, NaN would never be equal.
+        organizations.append(-1 if organization_id is None else organization_id)
+        dead.append(is_dead)
+        lngs.append(point[0])
+        lats.append(point[1])
+
+    return {
+        "id": np.array(ids, dtype=int),
+        "organization": np.array(organizations, dtype=int),
+        "is_dead": np.array(dead, dtype=float),
+        "lng": np.array(lngs, dtype=float),
+        "lat": np.array(lats, dtype=float),
+        "unreadable": unreadable,
+    }
+
+
+def readable_point(area) -> Optional[List[float]]:
+    # corrupt points are stored as a string, see coordinates.repair_corrupted_coordinate
+    if not isinstance(area, (list, tuple)) or len(area) < 2:
+        return None
+
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in area[:2]):
+        return None
+
+    return [float(area[0]), float(area[1])]
+
+
+def points_in_country(
+    lng: np.ndarray, lat: np.ndarray, country: str, borders: Optional[Dict[str, Any]] = None
+) -> np.ndarray:
+    inside = points_in_fences(lng, lat, country)
+    if borders:
+        inside &= points_in_geometry(lng, lat, borders)
+    return inside
+
+
+def points_in_fences(lng: np.ndarray, lat: np.ndarray, country: str) -> np.ndarray:
+    if country not in GEOFENCES:
+        raise ValueError("No geofence defined for your country. Create one and try again.")
+
+    # fences are given as top left and bottom right, which do not have to be the minimum and maximum.
+    boxes = np.array(
+        [
+            [
+                min(fence["topleft"]["lng"], fence["bottomright"]["lng"]),
+                max(fence["topleft"]["lng"], fence["bottomright"]["lng"]),
+                min(fence["topleft"]["lat"], fence["bottomright"]["lat"]),
+                max(fence["topleft"]["lat"], fence["bottomright"]["lat"]),
+            ]
+            for fence in GEOFENCES[country]
+        ]
+    )
+
+    lng, lat = lng[:, None], lat[:, None]
+    return ((lng > boxes[:, 0]) & (lng < boxes[:, 1]) & (lat > boxes[:, 2]) & (lat < boxes[:, 3])).any(axis=1)
+
+
+def points_in_geometry(lng: np.ndarray, lat: np.ndarray, geometry: Dict[str, Any]) -> np.ndarray:
+    """Tests points against a GeoJSON Polygon or MultiPolygon, holes in polygons are respected."""
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        raise ValueError(f"Cannot test points against a {geometry['type']}.")
+
+    inside = np.zeros(len(lng), dtype=bool)
+    for polygon in polygons:
+        outer = np.array(polygon[0], dtype=float)
+
+        # only test the points that are in the bounding box of this polygon.
+        candidates = (
+            ~inside
+            & (lng >= outer[:, 0].min())
+            & (lng <= outer[:, 0].max())
+            & (lat >= outer[:, 1].min())
+            & (lat <= outer[:, 1].max())
+        )
+        if not candidates.any():
+            continue
+
+        in_polygon = points_in_ring(lng[candidates], lat[candidates], outer)
+        for hole in polygon[1:]:
+            in_polygon &= ~points_in_ring(lng[candidates], lat[candidates], np.array(hole, dtype=float))
+
+        inside[candidates] = in_polygon
+
+    return inside
+
+
+def points_in_ring(lng: np.ndarray, lat: np.ndarray, ring: np.ndarray) -> np.ndarray:
+    # even-odd rule: count the edges that are crossed by a ray going east from the point.
+    inside = np.zeros(len(lng), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = ((y1 > lat) != (y2 > lat)) & (lng < (x2 - x1) * (lat - y1) / (y2 - y1) + x1)
+        inside ^= crosses
+    return inside
+
+
+def switch_latlng_in_bulk(coordinate_ids: List[int], duplicates: List[int] = None):
+    # there is no need to repair what is going to be deleted.
+    ids = set(coordinate_ids) - set(duplicates or [])
+    coordinates = list(Coordinate.objects.all().filter(id__in=ids).only("id", "area"))
+
+    for coordinate in coordinates:
+        coordinate.area = [coordinate.area[1], coordinate.area[0]]
+        coordinate.edit_area = {"type": "Point", "coordinates": coordinate.area}
+        # bulk updates do not call save(), where this is normally computed
+        coordinate.calculated_area_hash = hashlib.md5(str(coordinate.area).encode("utf-8")).hexdigest()
+
+    log.info(f"Switching lat and lng of {len(coordinates)} coordinates.")
+    Coordinate.objects.bulk_update(coordinates, ["area", "edit_area", "calculated_area_hash"], batch_size=500)
@@ -1,14 +1,20 @@
 from collections import defaultdict
 
 from django.contrib.humanize.templatetags.humanize import naturaltime
-from django.db.models import Count, Q
+from django.db.models import F, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 
 from websecmap.map.logic.map_defaults import get_country, get_organization_type, remark
 from websecmap.map.report import PUBLISHED_ENDPOINT_SCAN_TYPES, PUBLISHED_URL_SCAN_TYPES
+from websecmap.organizations.models import Url
 from websecmap.reporting.severity import get_severity
 from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
 
+# The number of scans shown per scan type.
+SCANS_PER_TYPE = 6
+
 
 def get_all_latest_scans(country, organization_type):
 
@@ -23,91 +29,96 @@ def get_all_latest_scans(country, organization_type):
 
     # Really get the latest, without double results that apply for multiple organizations.
     # Do not show anything that is dead, on any level.
-    for scan_type in PUBLISHED_ENDPOINT_SCAN_TYPES:
-        scans = (
-            EndpointGenericScan.objects.filter(
-                type=scan_type,
-                is_the_latest_scan=True,
-            )
-            .annotate(
-                n_urls=Count(
-                    "endpoint",
-                    filter=Q(
-                        endpoint__is_dead=False,
-                        endpoint__url__not_resolvable=False,
-                        endpoint__url__is_dead=False,
-                        endpoint__url__organization__is_dead=False,
-                        endpoint__url__organization__country=filtered_country,
-                        endpoint__url__organization__type_id=filtered_organization_type,
-                    ),
-                )
-            )
-            .filter(n_urls__gte=1)
-            .order_by("-rating_determined_on")[0:6]
+    relevant_urls = Url.objects.filter(
+        is_dead=False,
+        not_resolvable=False,
+        organization__is_dead=False,
+        organization__country=filtered_country,
+        organization__type_id=filtered_organization_type,
+    ).values("id")
+
+    endpoint_scans = latest_per_type(
+        EndpointGenericScan.objects.filter(
+            type__in=PUBLISHED_ENDPOINT_SCAN_TYPES,
+            is_the_latest_scan=True,
+            endpoint__is_dead=False,
+            endpoint__url__in=relevant_urls,
+        )
+    ).select_related("endpoint__url")
+
+    for scan in in_published_order(endpoint_scans, PUBLISHED_ENDPOINT_SCAN_TYPES):
+        calculation = get_severity(scan)
+
+        dataset["scans"][scan.type].append(
+            {
+                "url": scan.endpoint.url.url,
+                "service": f"{scan.endpoint.protocol}/{scan.endpoint.port} (IPv{scan.endpoint.ip_version})",
+                "protocol": scan.endpoint.protocol,
+                "port": scan.endpoint.port,
+                "ip_version": scan.endpoint.ip_version,
+                "explanation": calculation.get("explanation", ""),
+                "high": calculation.get("high", 0),
+                "medium": calculation.get("medium", 0),
+                "low": calculation.get("low", 0),
+                "last_scan_humanized": naturaltime(scan.last_scan_moment),
+                "last_scan_moment": scan.last_scan_moment.isoformat(),
+            }
         )
 
-        print(scans.query)
-
-        for scan in scans:
-            calculation = get_severity(scan)
-
-            dataset["scans"][scan_type].append(
-                {
-                    "url": scan.endpoint.url.url,
-                    "service": f"{scan.endpoint.protocol}/{scan.endpoint.port} (IPv{scan.endpoint.ip_version})",
-                    "protocol": scan.endpoint.protocol,
-                    "port": scan.endpoint.port,
-                    "ip_version": scan.endpoint.ip_version,
-                    "explanation": calculation.get("explanation", ""),
-                    "high": calculation.get("high", 0),
-                    "medium": calculation.get("medium", 0),
-                    "low": calculation.get("low", 0),
-                    "last_scan_humanized": naturaltime(scan.last_scan_moment),
-                    "last_scan_moment": scan.last_scan_moment.isoformat(),
-                }
-            )
-
-    for scan_type in PUBLISHED_URL_SCAN_TYPES:
-
-        scans = (
-            UrlGenericScan.objects.filter(
-                type=scan_type,
-                is_the_latest_scan=True,
-            )
-            .annotate(
-                n_urls=Count(
-                    "url",
-                    filter=Q(
-                        url__organization__is_dead=False,
-                        url__organization__country=filtered_country,
-                        url__organization__type_id=filtered_organization_type,
-                        url__is_dead=False,
-                        url__not_resolvable=False,
-                    ),
-                )
-            )
-            .filter(n_urls=1)
-            .order_by("-rating_determined_on")[0:6]
+    url_scans = latest_per_type(
+        UrlGenericScan.objects.filter(
+            type__in=PUBLISHED_URL_SCAN_TYPES,
+            is_the_latest_scan=True,
+            url__in=relevant_urls,
         )
+    ).select_related("url")
+
+    for scan in in_published_order(url_scans, PUBLISHED_URL_SCAN_TYPES):
+        calculation = get_severity(scan)
 
-        for scan in scans:
-            calculation = get_severity(scan)
-
-            # url scans
-            dataset["scans"][scan_type].append(
-                {
-                    "url": scan.url.url,
-                    "service": f"{scan.url.url}",
-                    "protocol": scan_type,
-                    "port": "-",
-                    "ip_version": "-",
-                    "explanation": calculation.get("explanation", ""),
-                    "high": calculation.get("high", 0),
-                    "medium": calculation.get("medium", 0),
-                    "low": calculation.get("low", 0),
-                    "last_scan_humanized": naturaltime(scan.last_scan_moment),
-                    "last_scan_moment": scan.last_scan_moment.isoformat(),
-                }
-            )
+        # url scans
+        dataset["scans"][scan.type].append(
+            {
+                "url": scan.url.url,
+                "service": f"{scan.url.url}",
+                "protocol": scan.type,
+                "port": "-",
+                "ip_version": "-",
+                "explanation": calculation.get("explanation", ""),
+                "high": calculation.get("high", 0),
+                "medium": calculation.get("medium", 0),
+                "low": calculation.get("low", 0),
+                "last_scan_humanized": naturaltime(scan.last_scan_moment),
+                "last_scan_moment": scan.last_scan_moment.isoformat(),
+            }
+        )
 
     return dataset
+
+
+def latest_per_type(scans):
+    """
+    Reduces a queryset of scans to the most recently changed scans of each type, in a single query.
+
+    The scans are numbered per type with a window function. Django can not filter on a window function, so the
+    numbered scans are used as a subquery. This uses the (type, is_the_latest_scan, rating_determined_on) index.
+    """
+    numbered = scans.annotate(
+        newest_first=Window(
+            expression=RowNumber(),
+            partition_by=[F("type")],
+            order_by=[F("rating_determined_on").desc(), F("id").desc()],
+        )
+    ).values("id", "newest_first")
+
+    sql, params = numbered.query.sql_with_params()
+    return scans.model.objects.filter(
+        id__in=RawSQL(
+            f"SELECT numbered.id FROM ({sql}) numbered WHERE numbered.newest_first <= %s",
+            (*params, SCANS_PER_TYPE),
+        )
+    ).order_by("-rating_determined_on", "-id")
+
+
+def in_published_order(scans, published_types):
+    return sorted(scans, key=lambda scan: published_types.index(scan.type))
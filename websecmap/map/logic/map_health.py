@@ -39,6 +39,9 @@ def update_map_health_reports(
 
         organizations_on_map = Organization.objects.all().filter(country=country, type=organization_type_id)
 
+        # The latest report of an organization is the same on many days, its calculation is only read once.
+        latest_calculations: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+
         for days_back in list(reversed(range(0, days))):
             total_outdated = []
             total_good = []
@@ -47,13 +50,17 @@ def update_map_health_reports(
             log.debug(f"Creating health report of {days_back} days back.")
             for organization in organizations_on_map:
                 # log.debug(f"Creating health report of {organization} at {old_date}.")
-                latest_report = get_latest_report_of_organization(organization, old_date)
+                latest_report = get_latest_report_of_organization(organization, old_date, with_calculation=False)
                 if not latest_report:
                     continue
 
                 # log.debug(f"The latest report of {organization} at {old_date} is from {latest_report.at_when}.")
 
-                ratings_outdated, ratings_good = split_ratings_between_good_and_bad(latest_report, OUTDATED_HOURS)
+                if latest_calculations.get(organization.id, (None,))[0] != latest_report.id:
+                    latest_calculations[organization.id] = (latest_report.id, report_calculation(latest_report.id))
+                calculation = latest_calculations[organization.id][1]
+
+                ratings_outdated, ratings_good = split_ratings_between_good_and_bad(calculation, OUTDATED_HOURS)
                 total_outdated += ratings_outdated
                 total_good += ratings_good
 
@@ -91,29 +98,33 @@ def get_outdated_ratings(
         if not latest_report:
             continue
 
-        ratings_outdated, ratings_good = split_ratings_between_good_and_bad(latest_report, expiry_time_hours)
+        ratings_outdated, ratings_good = split_ratings_between_good_and_bad(
+            latest_report.calculation, expiry_time_hours
+        )
         total_outdated += ratings_outdated
 
     return total_outdated
 
 
-def get_latest_report_of_organization(organization, at_when):
-    return (
-        OrganizationReport.objects.all()
-        .filter(organization=organization, at_when__lte=at_when)
-        .order_by("-at_when")
-        .first()
-    )
+def get_latest_report_of_organization(organization, at_when, with_calculation: bool = True):
+    reports = OrganizationReport.objects.all().filter(organization=organization, at_when__lte=at_when)
+    if not with_calculation:
+        reports = reports.counters()
+    return reports.order_by("-at_when").first()
+
+
+def report_calculation(report_id: int) -> Dict[str, Any]:
+    return OrganizationReport.objects.all().filter(id=report_id).calculations()[report_id]
 
 
 def split_ratings_between_good_and_bad(
-    report: OrganizationReport, hours: int = OUTDATED_HOURS
+    calculation: Dict[str, Any], hours: int = OUTDATED_HOURS
 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     now = datetime.now(pytz.utc)
     a_while_ago = now - timedelta(hours=hours)
     infractions = []
     good = []
-    for url in report.calculation["organization"]["urls"]:
+    for url in calculation["organization"]["urls"]:
         # endpoint ratings
         for endpoint in url["endpoints"]:
             for rating in endpoint["ratings"]:
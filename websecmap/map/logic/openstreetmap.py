@@ -7,20 +7,22 @@ import subprocess
 import time
 from datetime import datetime
 from subprocess import CalledProcessError
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
 
+import ijson
 import pytz
 import requests
 import tldextract
+from billiard.pool import Pool
 from constance import config
 from django.conf import settings
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from iso3166 import countries
-from rdp import rdp
 
 from websecmap.app.progressbar import print_progress_bar
 from websecmap.celery import app
+from websecmap.map.logic.simplification import simplify
 from websecmap.map.logic.wikidata import (
     ISO3316_2_COUNTRY_CODE,
     ISO3316_2_COUNTY_SUBDIVISION_CODE,
@@ -34,6 +36,9 @@ log = logging.getLogger(__package__)
 
 DEFAULT_RESAMPLING_RESULUTION = 0.001
 
+# Features are resampled in parallel, a country contains hundreds of large features.
+RESAMPLING_PROCESSES = os.cpu_count() or 1
+
 """
 Todo: Possibility to remove water:
 https://stackoverflow.com/questions/25297811/how-can-i-remove-water-from-openstreetmap-ways
@@ -106,26 +111,13 @@ def import_from_scratch(countries: List[str] = None, organization_types: List[st
                 store_import_message.apply_async([country, organization_type, ex])
                 continue
 
-            for index, feature in enumerate(data["features"]):
-
-                if "properties" not in feature:
-                    continue
-
-                if "name" not in feature["properties"]:
-                    continue
-
-                resolution = get_resampling_resolution(country, organization_type)
-                resampled = resample(feature, resolution)
-                store_new(resampled, country, organization_type, when)
-                message = "Imported %s of %s. %s%% (Currently: %s)" % (
-                    index + 1,
-                    len(data["features"]),
-                    round(((index + 1) / len(data["features"])) * 100, 2),
-                    feature["properties"]["name"],
-                )
+            resolution = get_resampling_resolution(country, organization_type)
+            features = data["features"]
+            for index, feature in enumerate(resample_features(named_features(features), resolution)):
+                store_new(feature, country, organization_type, when)
+                message = progress_message("Imported", index, features, feature["properties"]["name"])
                 store_import_message(country, organization_type, message)
 
-                # can't do multiprocessing.pool, given non global functions.
             store_import_message(
                 country,
                 organization_type,
@@ -177,28 +169,12 @@ def update_coordinates(countries: List[str] = None, organization_types: List[str
                 store_import_message.apply_async([country, organization_type, ex])
                 return
 
-            log.info(f"Received coordinate data. Starting with: {json.dumps(data)[0:200]}")
-
             log.info("Parsing features:")
-            for index, feature in enumerate(data["features"]):
-
-                if "properties" not in feature:
-                    log.debug("Feature misses 'properties' property :)")
-                    continue
-
-                if "name" not in feature["properties"]:
-                    log.debug("This feature does not contain a name: it might be metadata or something else.")
-                    continue
-
-                # slower, but in a task. Still atomic this way.
-                resolution = get_resampling_resolution(country, organization_type)
-                store_updates(resample(feature, resolution), country, organization_type, when)
-                message = "Updated %s of %s. %s%% (Currently: %s)" % (
-                    index + 1,
-                    len(data["features"]),
-                    round(((index + 1) / len(data["features"])) * 100, 2),
-                    feature["properties"]["name"],
-                )
+            resolution = get_resampling_resolution(country, organization_type)
+            features = data["features"]
+            for index, feature in enumerate(resample_features(named_features(features), resolution)):
+                store_updates(feature, country, organization_type, when)
+                message = progress_message("Updated", index, features, feature["properties"]["name"])
                 store_import_message(country, organization_type, message)
 
             store_import_message(country, organization_type, "Update complete")
@@ -206,29 +182,71 @@ def update_coordinates(countries: List[str] = None, organization_types: List[str
     log.info("Resampling and update tasks have been created.")
 
 
+def named_features(features: Iterable[Dict]) -> Iterator[Dict]:
+    for feature in features:
+        if "properties" not in feature:
+            log.debug("Feature misses 'properties' property :)")
+            continue
+
+        if "name" not in feature["properties"]:
+            log.debug("This feature does not contain a name: it might be metadata or something else.")
+            continue
+
+        yield feature
+
+
+def progress_message(verb: str, index: int, features: Iterable[Dict], name: str) -> str:
+    # streamed features have no known length.
+    if not isinstance(features, list):
+        return "%s %s. (Currently: %s)" % (verb, index + 1, name)
+
+    return "%s %s of %s. %s%% (Currently: %s)" % (
+        verb,
+        index + 1,
+        len(features),
+        round(((index + 1) / len(features)) * 100, 2),
+        name,
+    )
+
+
+def resample_features(
+    features: Iterable[Dict], resampling_resolution: float = 0.001, processes: int = RESAMPLING_PROCESSES
+) -> Iterator[Dict]:
+    """
+    Resamples features in parallel, the order of the features is kept. Features are read from the iterable and
+    returned while the import is running, so not all (large) features have to be in memory at the same time.
+    """
+    if processes < 2:
+        for feature in features:
+            yield resample(feature, resampling_resolution)
+        return
+
+    # billiard is used instead of multiprocessing, as that is also allowed to start processes from a celery worker.
+    with Pool(processes) as pool:
+        yield from pool.imap(resample_with_resolution, ((f, resampling_resolution) for f in features), chunksize=2)
+
+
+def resample_with_resolution(arguments):
+    return resample(*arguments)
+
+
 def resample(feature: Dict, resampling_resolution: float = 0.001):
     # downsample the coordinates using the rdp algorithm, mainly to reduce 50 megabyte to a about 150 kilobytes.
-    # The code is a little bit dirty, using these counters. If you can refactor, please do :)
 
     log.info(f"Resampling path for {feature['properties']['name']}")
 
     if feature["geometry"]["type"] == "Polygon":
         log.debug("Original length: %s" % len(feature["geometry"]["coordinates"][0]))
-        i = 0
-        for coordinate in feature["geometry"]["coordinates"]:
-            feature["geometry"]["coordinates"][i] = rdp(coordinate, epsilon=resampling_resolution)
-            i += 1
+        feature["geometry"]["coordinates"] = [
+            simplify(ring, epsilon=resampling_resolution) for ring in feature["geometry"]["coordinates"]
+        ]
         log.debug("Resampled length: %s" % len(feature["geometry"]["coordinates"][0]))
 
     if feature["geometry"]["type"] == "MultiPolygon":
-        i, j = 0, 0
-        for coordinate in feature["geometry"]["coordinates"]:
-            for nested_coordinate in feature["geometry"]["coordinates"][i]:
-                feature["geometry"]["coordinates"][i][j] = rdp(nested_coordinate, epsilon=resampling_resolution)
-                j += 1
-
-            j = 0
-            i += 1
+        feature["geometry"]["coordinates"] = [
+            [simplify(ring, epsilon=resampling_resolution) for ring in polygon]
+            for polygon in feature["geometry"]["coordinates"]
+        ]
 
     return feature
 
@@ -454,8 +472,13 @@ def add_official_websites(organization, wikidata_code):
 
 
 def get_data_from_wambachers_zipfile(filename):
-    with gzip.open(filename, "rt") as f:
-        return json.loads(f.read())
+    # The features are parsed one by one while the file is read, instead of loading the entire document at once.
+    return {"type": "FeatureCollection", "features": features_from_wambachers_zipfile(filename)}
+
+
+def features_from_wambachers_zipfile(filename) -> Iterator[Dict]:
+    with gzip.open(filename, "rb") as f:
+        yield from ijson.items(f, "features.item", use_float=True)
 
 
 def get_osm_data_wambachers(country: str = "NL", organization_type: str = "municipality"):
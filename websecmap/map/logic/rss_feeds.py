@@ -1,17 +1,27 @@
 from datetime import datetime
+from typing import Any, Dict, List, Tuple
 
 import pytz
 from constance import config
 from django.contrib.humanize.templatetags.humanize import naturaltime
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.dispatch import receiver
+from django.utils.translation import get_language
 from django.utils.translation import ugettext as _
 
+from websecmap.app.cache import bump_cache_version, cache_version
 from websecmap.map.logic.map_defaults import remark
 from websecmap.organizations.models import Organization
 from websecmap.reporting.severity import get_severity
 from websecmap.scanners import ENDPOINT_SCAN_TYPES, URL_SCAN_TYPES
 from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.signals import scan_results_stored
+
+# The feed is invalidated when new scans are stored. Rescans with the same result only update the moment of the last
+# scan, which is shown after this timeout.
+LATEST_SCAN_FEED_CACHE_TIMEOUT = 10 * 60
 
 
 class UpdatesOnOrganizationFeed(Feed):
@@ -36,26 +46,7 @@ class UpdatesOnOrganizationFeed(Feed):
         return latest_updates(organization_id).get("scans", [])
 
     def item_title(self, item):
-        rating = (
-            _("Perfect")
-            if not any([item["high"], item["medium"], item["low"]])
-            else _("High")
-            if item["high"]
-            else _("Medium")
-            if item["medium"]
-            else _("Low")
-        )
-
-        badge = (
-            "✅"
-            if not any([item["high"], item["medium"], item["low"]])
-            else "🔴"
-            if item["high"]
-            else "🔶"
-            if item["medium"]
-            else "🍋"
-        )
-
+        badge, rating = severity_badge(item)
         return "%s %s - %s: %s" % (badge, rating, item["url"], item["service"])
 
     def item_description(self, item):
@@ -104,62 +95,86 @@ class LatestScanFeed(Feed):
         else:
             return "/data/feed/"
 
+    def __call__(self, request, *args, **kwargs):
+        # rendering the feed is cached until a scan of this type is stored, see invalidate_latest_scan_feed
+        # titles and descriptions are translated, so the feed is cached per language.
+        key = latest_scan_feed_cache_key(kwargs.get("scan_type", ""), request.get_host(), get_language())
+        response = cache.get(key)
+        if response is None:
+            response = super().__call__(request, *args, **kwargs)
+            cache.set(key, response, LATEST_SCAN_FEED_CACHE_TIMEOUT)
+        return response
+
     # second parameter via magic
     def items(self, scan_type):
-        # print(scan_type)
-        if scan_type in ENDPOINT_SCAN_TYPES:
-            return EndpointGenericScan.objects.filter(type=scan_type).order_by("-last_scan_moment")[0:30]
-
-        if scan_type in URL_SCAN_TYPES:
-            return UrlGenericScan.objects.filter(type=scan_type).order_by("-last_scan_moment")[0:30]
+        return latest_scan_feed_items(scan_type)
 
     def item_title(self, item):
-        calculation = get_severity(item)
-        if not calculation:
-            return ""
-
-        rating = (
-            _("Perfect")
-            if not any([calculation["high"], calculation["medium"], calculation["low"]])
-            else _("High")
-            if calculation["high"]
-            else _("Medium")
-            if calculation["medium"]
-            else _("Low")
-        )
-
-        badge = (
-            "✅"
-            if not any([calculation["high"], calculation["medium"], calculation["low"]])
-            else "🔴"
-            if calculation["high"]
-            else "🔶"
-            if calculation["medium"]
-            else "🍋"
-        )
-
-        if item.type in URL_SCAN_TYPES:
-            # url generic scan:
-            return "%s %s - %s" % (badge, rating, item.url.url)
-        else:
-            # endpoint scan
-            return "%s %s - %s" % (badge, rating, item.endpoint.url.url)
+        badge, rating = severity_badge(item)
+        return "%s %s - %s" % (badge, rating, item["url"])
 
     def item_description(self, item):
-        calculation = get_severity(item)
-        return _(calculation.get("explanation", ""))
+        return _(item["explanation"])
 
     def item_pubdate(self, item):
-        return item.last_scan_moment
+        return item["last_scan_moment"]
 
     # item_link is only needed if NewsItem has no get_absolute_url method.
     def item_link(self, item):
-        if item.type in URL_SCAN_TYPES:
-            # url generic scan:
-            return "%s/#updates/%s/%s" % (config.PROJECT_WEBSITE, item.last_scan_moment, item.url.url)
-        else:
-            # endpoint scan
-            return "%s/#updates/%s/%s" % (config.PROJECT_WEBSITE, item.last_scan_moment, item.endpoint.url.url)
+        return item["link"]
+
+
+def latest_scan_feed_items(scan_type: str) -> List[Dict[str, Any]]:
+    """The severity of every scan is calculated once, the feed only reads the resulting values."""
+    if scan_type in ENDPOINT_SCAN_TYPES:
+        scans = EndpointGenericScan.objects.filter(type=scan_type).select_related("endpoint__url")
+    elif scan_type in URL_SCAN_TYPES:
+        scans = UrlGenericScan.objects.filter(type=scan_type).select_related("url")
+    else:
+        return []
+
+    # every constance setting that is read is a query
+    website = config.PROJECT_WEBSITE
+
+    items = []
+    for scan in scans.order_by("-last_scan_moment")[0:30]:
+        calculation = get_severity(scan)
+        url = scan.url.url if scan_type in URL_SCAN_TYPES else scan.endpoint.url.url
+        items.append(
+            {
+                "url": url,
+                "link": "%s/#updates/%s/%s" % (website, scan.last_scan_moment, url),
+                "explanation": calculation.get("explanation", ""),
+                "high": calculation.get("high", 0),
+                "medium": calculation.get("medium", 0),
+                "low": calculation.get("low", 0),
+                "last_scan_moment": scan.last_scan_moment,
+            }
+        )
+    return items
+
+
+def severity_badge(item: Dict[str, Any]) -> Tuple[str, str]:
+    if item["high"]:
+        return "🔴", _("High")
+    if item["medium"]:
+        return "🔶", _("Medium")
+    if item["low"]:
+        return "🍋", _("Low")
+    return "✅", _("Perfect")
+
+
+def latest_scan_feed_cache_key(scan_type: str, host: str, language: str) -> str:
+    # the version changes when the feed is invalidated, this way the feeds of all hosts and languages are invalidated
+    # at once.
+    version = cache_version(f"latest_scan_feed_version_{scan_type}")
+    return f"latest_scan_feed_{scan_type}_{version}_{host}_{language}"
+
+
+@receiver(scan_results_stored)
+def invalidate_latest_scan_feed(sender, scan_types, **kwargs):
+    for scan_type in scan_types:
+        bump_cache_version(f"latest_scan_feed_version_{scan_type}")
 
 
 def latest_updates(organization_id):
@@ -188,14 +203,14 @@ def latest_updates(organization_id):
 
     # semi-union, given not all columns are the same. (not python/django-esque solution)
     generic_endpoint_scans = list(
-        EndpointGenericScan.objects.filter(
-            endpoint__url__organization=organization, type__in=ENDPOINT_SCAN_TYPES
-        ).order_by("-rating_determined_on")[0:60]
+        EndpointGenericScan.objects.filter(endpoint__url__organization=organization, type__in=ENDPOINT_SCAN_TYPES)
+        .select_related("endpoint__url")
+        .order_by("-rating_determined_on")[0:60]
     )
     url_endpoint_scans = list(
-        UrlGenericScan.objects.filter(url__organization=organization, type__in=URL_SCAN_TYPES).order_by(
-            "-rating_determined_on"
-        )[0:60]
+        UrlGenericScan.objects.filter(url__organization=organization, type__in=URL_SCAN_TYPES)
+        .select_related("url")
+        .order_by("-rating_determined_on")[0:60]
     )
 
     scans = generic_endpoint_scans + url_endpoint_scans
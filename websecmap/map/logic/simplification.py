@@ -0,0 +1,71 @@
+"""
+Simplifies lines and polygon rings using the Ramer-Douglas-Peucker algorithm.
+
+This gives exactly the same results as the iterative algorithm of the rdp package, with the same meaning of epsilon:
+a point is kept when its distance to the line between the points around it is larger than epsilon. Instead of
+calculating the distance of every point in a python loop, all distances of a segment are calculated at once using
+numpy. This makes simplifying the borders of a country, which consist of millions of points, many times faster.
+"""
+
+from typing import List, Sequence, Union
+
+import numpy as np
+
+
+def simplify(points: Union[Sequence, np.ndarray], epsilon: float = 0) -> Union[List, np.ndarray]:
+    """
+    Returns the points that are needed to describe the line within epsilon.
+
+    :param points: a list of points, for example [[lng, lat], [lng, lat], ...], or an numpy array with the same shape.
+    :param epsilon: the maximum distance a removed point may have to the simplified line.
+    :return: simplified points, as list when a list was given, otherwise as numpy array.
+    """
+    if isinstance(points, np.ndarray):
+        return points[simplification_mask(points, epsilon)]
+
+    array = np.array(points, dtype=float)
+    return array[simplification_mask(array, epsilon)].tolist()
+
+
+def simplification_mask(points: np.ndarray, epsilon: float = 0) -> np.ndarray:
+    """Returns a boolean array that tells which points are kept."""
+    mask = np.ones(len(points), dtype=bool)
+    if len(points) < 3:
+        return mask
+
+    segments = [(0, len(points) - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+
+        distances = distances_to_line(points[start + 1 : end], points[start], points[end])
+        index = int(np.argmax(distances))
+
+        if distances[index] > epsilon:
+            index += start + 1
+            segments.append((start, index))
+            segments.append((index, end))
+        else:
+            mask[start + 1 : end] = False
+
+    return mask
+
+
+def distances_to_line(points: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Perpendicular distance of each point to the (infinite) line through start and end."""
+    direction = end - start
+    length = np.linalg.norm(direction)
+    relative = points - start
+
+    # a closed ring starts and ends at the same point, then the distance to that point is used.
+    if length == 0:
+        return np.linalg.norm(relative, axis=1)
+
+    if points.shape[1] == 2:
+        # the same calculation as the rdp package, so borderline points are treated the same.
+        return np.abs(direction[0] * -relative[:, 1] - direction[1] * -relative[:, 0]) / length
+
+    unit = direction / length
+    projections = np.outer(relative @ unit, unit)
+    return np.linalg.norm(relative - projections, axis=1)
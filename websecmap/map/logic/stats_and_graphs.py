@@ -4,15 +4,14 @@ from typing import Dict
 
 import pytz
 from dateutil.relativedelta import relativedelta
+from django.db.models import F, Q
 from django.utils import timezone
 
 from websecmap.map.logic.map_defaults import get_country, get_default_country, get_default_layer, get_organization_type
 from websecmap.map.models import Configuration, HighLevelStatistic, OrganizationReport, VulnerabilityStatistic
-from websecmap.organizations.models import Organization
-from websecmap.reporting.severity import get_severity
-from websecmap.scanners import POLICY, URL_SCAN_TYPES
-from websecmap.scanners.impact import get_impact
-from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
+from websecmap.organizations.models import Organization, Url
+from websecmap.reporting.models import UrlReportSeverity
+from websecmap.scanners import POLICY
 import logging
 
 log = logging.getLogger(__package__)
@@ -78,6 +77,7 @@ def get_organization_vulnerability_timeline(organization_id: int):
         OrganizationReport.objects.all()
         .filter(organization=organization_id, at_when__gte=one_year_ago)
         .order_by("at_when")
+        .counters()
     )
 
     stats = []
@@ -225,65 +225,31 @@ def what_to_improve(country: str, organization_type: str, issue_type: str):
         log.debug(f"No policy found for {issue_type}")
         return []
 
-    country = get_country(country)
-    organization_type = get_organization_type(organization_type)
-
-    if issue_type in URL_SCAN_TYPES:
-        return what_to_improve_ugs(country, organization_type, issue_type, policy)
-    else:
-        return what_to_improve_epgs(country, organization_type, issue_type, policy)
-
-
-def what_to_improve_ugs(country: str, organization_type: str, issue_type: str, policy):
-    scans = UrlGenericScan.objects.all().filter(
-        type=issue_type,
-        is_the_latest_scan=True,
-        comply_or_explain_is_explained=False,
-        rating__in=policy["high"] + policy["medium"],
-        url__is_dead=False,
-        url__not_resolvable=False,
-        url__organization__country=country,
-        url__organization__type=organization_type,
-    )[0:1000]
-
-    return [
-        {
-            # "organization_id": scan.url.organization.pk,
-            # "organization_name": scan.url.organization.name,
-            "url_url": scan.url.url,
-            "severity": get_impact(get_severity(scan)),
-            "last_scan_moment": scan.last_scan_moment,
-            "rating_determined_on": scan.rating_determined_on,
-        }
-        for scan in scans
-        if get_impact(get_severity(scan)) in ["high", "medium"]
-    ]
-
+    urls = Url.objects.all().filter(
+        is_dead=False,
+        not_resolvable=False,
+        organization__country=get_country(country),
+        organization__type=get_organization_type(organization_type),
+    )
 
-def what_to_improve_epgs(country: str, organization_type: str, issue_type: str, policy):
-    scans = EndpointGenericScan.objects.all().filter(
-        type=issue_type,
-        is_the_latest_scan=True,
-        comply_or_explain_is_explained=False,
-        rating__in=policy["high"] + policy["medium"],
-        endpoint__is_dead=False,
-        endpoint__url__is_dead=False,
-        endpoint__url__not_resolvable=False,
-        endpoint__url__organization__country=country,
-        endpoint__url__organization__type=organization_type,
-    )[0:500]
+    # The newest url report contains the latest scans of living endpoints, with issues summed per scan type.
+    # Explained issues do not have to be improved.
+    severities = (
+        UrlReportSeverity.objects.all()
+        .filter(url_report__is_the_newest=True, scan_type=issue_type, url__in=urls)
+        .filter(Q(high__gt=F("explained_high")) | Q(medium__gt=F("explained_medium")))
+        .select_related("url")
+        .order_by("-high", "-medium", "url__url")[0:1000]
+    )
 
     return [
         {
-            # "organization_id": scan.endpoint.url.organization.pk,
-            # "organization_name": scan.endpoint.url.organization.name,
-            "url_url": scan.endpoint.url.url,
-            "severity": get_impact(get_severity(scan)),
-            "last_scan_moment": scan.last_scan_moment,
-            "rating_determined_on": scan.rating_determined_on,
+            "url_url": severity.url.url,
+            "severity": "high" if severity.high > severity.explained_high else "medium",
+            "last_scan_moment": severity.last_scan_moment,
+            "rating_determined_on": severity.rating_determined_on,
         }
-        for scan in scans
-        if get_impact(get_severity(scan)) in ["high", "medium"]
+        for severity in severities
     ]
 
 
@@ -0,0 +1,109 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from websecmap.map.logic.openstreetmap import get_data_from_wambachers_zipfile, resample, resample_features
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    # Example usage: map_benchmark_resampling --features 350 --points 7000 --reference 3
+    help = (
+        "Measures how long it takes to read and resample a synthetic, country sized, FeatureCollection. "
+        "The collection is generated from a fixed seed, so measurements can be compared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--features", type=int, default=350, help="Number of regions, NL has about 350.")
+        parser.add_argument("--points", type=int, default=7000, help="Number of points in the border of a region.")
+        parser.add_argument("--resolution", type=float, default=0.001, help="Resampling resolution (epsilon).")
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--reference",
+            type=int,
+            default=0,
+            help="Also resample this many features with the rdp package, to compare with. This is slow.",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "synthetic.json.gz")
+            with gzip.open(filename, "wt") as f:
+                json.dump(synthetic_feature_collection(options["features"], options["points"]), f)
+            self.stdout.write(f"Synthetic collection: {os.path.getsize(filename) / 1024 / 1024:.1f} MB compressed.")
+
+            started = time.monotonic()
+            features = list(get_data_from_wambachers_zipfile(filename)["features"])
+            self.report("streaming parse", started, len(features))
+
+            if options["reference"]:
+                self.benchmark_reference(features[: options["reference"]], options["resolution"])
+
+            started = time.monotonic()
+            points = sum(
+                len(ring)
+                for feature in resample_features(copy_features(features), options["resolution"], processes=1)
+                for polygon in feature["geometry"]["coordinates"]
+                for ring in polygon
+            )
+            self.report("vectorized, 1 process", started, len(features))
+
+            started = time.monotonic()
+            list(resample_features(copy_features(features), options["resolution"], processes=options["processes"]))
+            self.report(f"vectorized, {options['processes']} processes", started, len(features))
+
+            self.stdout.write(f"Points after resampling: {points} of {options['features'] * options['points']}.")
+
+    def benchmark_reference(self, features, resolution):
+        from rdp import rdp
+
+        started = time.monotonic()
+        for feature in copy_features(features):
+            for polygon in feature["geometry"]["coordinates"]:
+                for ring in polygon:
+                    rdp(ring, epsilon=resolution)
+        self.report("rdp package", started, len(features))
+
+        started = time.monotonic()
+        for feature in copy_features(features):
+            resample(feature, resolution)
+        self.report("vectorized, same features", started, len(features))
+
+    def report(self, label, started, features):
+        duration = time.monotonic() - started
+        self.stdout.write(f"{label}: {duration:.2f} seconds for {features} features.")
+
+
+def copy_features(features):
+    # resampling changes features in place.
+    return [json.loads(json.dumps(feature)) for feature in features]
+
+
+def synthetic_feature_collection(features: int, points: int, seed: int = 42):
+    """Regions are noisy circles laid out in a grid, every region is a MultiPolygon with one ring."""
+    random = np.random.default_rng(seed)
+    columns = int(np.ceil(np.sqrt(features)))
+    angles = np.linspace(0, 2 * np.pi, points)
+
+    collection = {"type": "FeatureCollection", "features": []}
+    for index in range(features):
+        center = np.array([3.3 + (index % columns) * 0.1, 50.7 + (index // columns) * 0.1])
+        radius = 0.05 * (1 + 0.02 * random.standard_normal(points).cumsum() / np.sqrt(points))
+        ring = np.round(center + np.c_[radius * np.cos(angles), radius * np.sin(angles)], 7)
+        ring[-1] = ring[0]
+        collection["features"].append(
+            {
+                "type": "Feature",
+                "properties": {"name": f"Region {index}"},
+                "geometry": {"type": "MultiPolygon", "coordinates": [[ring.tolist()]]},
+            }
+        )
+
+    return collection
@@ -0,0 +1,21 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from websecmap.map.logic.datasets import create_dataset_snapshots
+from websecmap.map.management.commands.custom_commands import is_iso
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    help = "Creates the csv, json and xlsx snapshots of the downloadable datasets of all reported maps."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--country", type=is_iso, help="2 character iso code of country", required=False)
+        parser.add_argument("--organization_type", type=str, help="name of the organization type", required=False)
+
+    def handle(self, *args, **options):
+        countries = [options["country"]] if options["country"] else None
+        organization_types = [options["organization_type"]] if options["organization_type"] else None
+        create_dataset_snapshots(countries=countries, organization_types=organization_types)
@@ -2,7 +2,7 @@ import logging
 
 from django.core.management.base import BaseCommand
 
-from websecmap.map.logic.coordinates import dedupe_coordinates
+from websecmap.map.logic.geovalidation import validate_points
 
 log = logging.getLogger(__package__)
 
@@ -10,4 +10,4 @@ log = logging.getLogger(__package__)
 class Command(BaseCommand):
     def handle(self, *args, **options):
 
-        dedupe_coordinates()
+        validate_points(remove_duplicates=True)
@@ -2,9 +2,8 @@ import logging
 
 from django.core.management.base import BaseCommand
 
-from websecmap.map.logic.coordinates import move_coordinates_to_country
+from websecmap.map.logic.geovalidation import GEOFENCES, validate_points
 from websecmap.map.models import Configuration
-from websecmap.organizations.models import Coordinate
 
 log = logging.getLogger(__package__)
 
@@ -18,5 +17,8 @@ class Command(BaseCommand):
         log.debug(countries)
 
         for country in countries:
-            coordinates = Coordinate.objects.all().filter(geojsontype="Point", organization__country=country)
-            move_coordinates_to_country(coordinates, country)
+            if country not in GEOFENCES:
+                log.warning(f"No geofence defined for {country}, skipping.")
+                continue
+
+            validate_points(country, fix_flipped=True)
@@ -0,0 +1,40 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand
+
+from websecmap.map.logic.geovalidation import validate_points
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    # Example usage: map_validate_coordinates --country NL --borders nl.geojson --fix-flipped --remove-duplicates
+    help = "Checks all points of a country in one go, reports and optionally repairs flipped and duplicate points."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--country", help="Country code. Eg: NL, DE, EN", required=True)
+        parser.add_argument(
+            "--borders", help="A GeoJSON file with the (Multi)Polygon or Feature of the borders of the country."
+        )
+        parser.add_argument("--fix-flipped", action="store_true", help="Switch lat and lng of flipped points.")
+        parser.add_argument("--remove-duplicates", action="store_true", help="Delete duplicate points.")
+
+    def handle(self, *args, **options):
+        borders = None
+        if options["borders"]:
+            with open(options["borders"]) as f:
+                borders = json.load(f)
+            # a feature is also accepted
+            borders = borders.get("geometry", borders)
+
+        report = validate_points(
+            options["country"],
+            borders=borders,
+            fix_flipped=options["fix_flipped"],
+            remove_duplicates=options["remove_duplicates"],
+        )
+
+        self.stdout.write(f"Checked {len(report['checked'])} points.")
+        for finding in ["flipped", "outside", "duplicates", "unreadable"]:
+            self.stdout.write(f"{finding}: {len(report[finding])} {report[finding]}")
@@ -9,21 +9,26 @@ import pytz
 import simplejson as json
 from celery import group
 from deepdiff import DeepDiff
-from django.db.models import Count
+from django.db.models import Count, Q, Sum
 
+from websecmap.app.instrumentation import phase, timed
 from websecmap.celery import Task, app
 from websecmap.map.logic.map import get_map_data, get_reports_by_ids
 from websecmap.map.logic.map_health import update_map_health_reports
 from websecmap.map.map_configs import filter_map_configs
 from websecmap.map.models import HighLevelStatistic, MapDataCache, OrganizationReport, VulnerabilityStatistic
 from websecmap.organizations.models import Organization, OrganizationType, Url
+from websecmap.reporting.models import UrlReport
 from websecmap.reporting.report import (
     START_DATE,
     aggegrate_url_rating_scores,
     get_allowed_to_report,
     get_latest_urlratings_fast,
+    latest_url_reports,
     recreate_url_reports,
     relevant_urls_at_timepoint,
+    relevant_urls_at_timepoint_queryset,
+    severities_per_scan_type,
     significant_moments,
 )
 from websecmap.scanners import ENDPOINT_SCAN_TYPES, URL_SCAN_TYPES
@@ -187,254 +192,34 @@ def calculate_vulnerability_statistics(days: int = 366, countries: List = None,
                 at_when=when, country=country, organization_type=OrganizationType(pk=organization_type_id)
             ).delete()
 
-            # about 1 second per query, while it seems to use indexes.
-            # Also moved the calculation field here also from another table, which greatly improves joins on Mysql.
-            # see map_data for more info.
-
-            # this query removes the double urls (see below) and makes the joins straightforward. But it's way slower.
-            # In the end this would be the query we should use... but can't right now
-            # sql = """SELECT MAX(map_urlrating.id) as id, map_urlrating2.calculation FROM map_urlrating
-            #        INNER JOIN url ON map_urlrating.url_id = url.id
-            #        INNER JOIN url_organization on url.id = url_organization.url_id
-            #        INNER JOIN organization ON url_organization.organization_id = organization.id
-            #        INNER JOIN map_urlrating as map_urlrating2 ON map_urlrating2.id = map_urlrating.id
-            #         WHERE organization.type_id = '%(OrganizationTypeId)s'
-            #         AND organization.country = '%(country)s'
-            #         AND map_urlrating.`when` <= '%(when)s'
-            #         GROUP BY map_urlrating.url_id
-            #     """ % {"when": when, "OrganizationTypeId": get_organization_type(organization_type),
-            #            "country": get_country(country)}
-
-            # parse the query here instead of outside the function to save a second or so.
-            # The ID is included for convenience of the rawquery.
-            # This query will deliver double ratings for urls that are doubly listed, which is dubious.
-            # this happens because multiple organizations can have the same URL.
-            # It's fair that there are more issues if more organizations share the same url?
-
-            # you also have to include a filter on reagions that are not shown on the map anymore,
-            # those are mostly dead organizations... that's why this query works on map data...
-
-            # gets all url-ratings, even on urls that are dead / not relevant at a certain time period.
-            # this doesn't really work out it seems... as you dont know what url ratings are relevant when
-            sql = """SELECT reporting_urlreport.id as id, reporting_urlreport.id as my_id,
-                            reporting_urlreport.total_endpoints,
-                            reporting_urlreport2.calculation as calculation, url.id as url_id2
-                   FROM reporting_urlreport
-                   INNER JOIN
-                   (SELECT MAX(id) as id2 FROM reporting_urlreport or2
-                   WHERE at_when <= '%(when)s' GROUP BY url_id) as x
-                   ON x.id2 = reporting_urlreport.id
-                   INNER JOIN url ON reporting_urlreport.url_id = url.id
-                   INNER JOIN url_organization on url.id = url_organization.url_id
-                   INNER JOIN organization ON url_organization.organization_id = organization.id
-                   INNER JOIN reporting_urlreport as reporting_urlreport2
-                        ON reporting_urlreport2.id = reporting_urlreport.id
-                    WHERE organization.type_id = '%(OrganizationTypeId)s'
-                    AND organization.country = '%(country)s'
-                    AND reporting_urlreport.total_endpoints > 0
-                    ORDER BY reporting_urlreport.url_id
-                """ % {
-                "when": when,
-                "OrganizationTypeId": organization_type_id,
-                "country": country,
-            }
-
-            # There is a cartesian product on organization, for the simple reason that organizations sometimes
-            # use the same url. The filter on organization cannot be changed to left outer join, because it might
-            # remove relevant organizations.... it has to be a left outer join with the  WHERE filter included then.
-            # Left joining doesnt' solve it because the link of url_organization. We might get a random organization
-            # for the urlrating that fits it. But there should only be one organization per urlrating? No. Because
-            # url ratings are shared amongst organization. That's why it works on the map, but not here.
-
-            # So we're doing something else: filter out the url_ratings we've already processed in the python
-            # code, which is slow and ugly. But for the moment it makes sense as the query is very complicated otherwise
-
-            # so instead use the map data as a starter and dig down from that data.
-
-            sql = """
-                    SELECT
-                        map_organizationreport.id
-                    FROM map_organizationreport
-                    INNER JOIN
-
-
-                      (SELECT stacked_organization.id as stacked_organization_id
-                      FROM organization stacked_organization
-                      WHERE (
-                        stacked_organization.created_on <= '%(when)s'
-                        AND stacked_organization.is_dead = 0
-                        AND stacked_organization.type_id=%(OrganizationTypeId)s
-                        AND stacked_organization.country='%(country)s'
-                        )
-                      OR (
-                      '%(when)s' BETWEEN stacked_organization.created_on AND stacked_organization.is_dead_since
-                        AND stacked_organization.is_dead = 1
-                        AND stacked_organization.type_id=%(OrganizationTypeId)s
-                        AND stacked_organization.country='%(country)s'
-                      )) as organization_stack
-                      ON organization_stack.stacked_organization_id = map_organizationreport.organization_id
-
-
-                    INNER JOIN
-                      organization on organization.id = stacked_organization_id
-                    INNER JOIN
-                      organizations_organizationtype on organizations_organizationtype.id = organization.type_id
-                    INNER JOIN
-
-
-
-                      (SELECT MAX(stacked_coordinate.id) as stacked_coordinate_id, area, geoJsonType, organization_id
-                      FROM coordinate stacked_coordinate
-                      INNER JOIN organization filter_organization
-                        ON (stacked_coordinate.organization_id = filter_organization.id)
-                      WHERE (
-                        stacked_coordinate.created_on <= '%(when)s'
-                        AND stacked_coordinate.is_dead = 0
-                        AND filter_organization.country='%(country)s'
-                        AND filter_organization.type_id=%(OrganizationTypeId)s
-                        )
-                      OR
-                        ('%(when)s' BETWEEN stacked_coordinate.created_on AND stacked_coordinate.is_dead_since
-                        AND stacked_coordinate.is_dead = 1
-                        AND filter_organization.country='%(country)s'
-                        AND filter_organization.type_id=%(OrganizationTypeId)s
-                        ) GROUP BY calculated_area_hash, organization_id
-                      ) as coordinate_stack
-                      ON coordinate_stack.organization_id = map_organizationreport.organization_id
-
-
-                    INNER JOIN
-
-
-                      (SELECT MAX(map_organizationreport.id) as stacked_organizationrating_id
-                      FROM map_organizationreport
-                      INNER JOIN organization filter_organization2
-                        ON (filter_organization2.id = map_organizationreport.organization_id)
-                      WHERE at_when <= '%(when)s'
-                      AND filter_organization2.country='%(country)s'
-                      AND filter_organization2.type_id=%(OrganizationTypeId)s
-                      GROUP BY organization_id
-                      ) as stacked_organizationrating
-                      ON stacked_organizationrating.stacked_organizationrating_id = map_organizationreport.id
-
-                    WHERE organization.type_id = '%(OrganizationTypeId)s' AND organization.country= '%(country)s'
-                    GROUP BY coordinate_stack.area, organization.name
-                    ORDER BY map_organizationreport.at_when ASC
-                    """ % {
-                "when": when,
-                "OrganizationTypeId": organization_type_id,
-                "country": country,
-            }
-
-            organizationratings = OrganizationReport.objects.raw(sql)
-
-            needed_reports = []
-            for organizationrating in organizationratings:
-                needed_reports.append(str(organizationrating.pk))
-
-            reports = get_reports_by_ids(needed_reports)
-
-            direct_reports = []
-            for report in reports:
-                direct_reports.append(json.loads(reports[report]))
-
-            number_of_endpoints = 0
-            number_of_urls = 0
-            # log.debug(sql)
-
-            # some urls are in multiple organizaitons, make sure that it's only shown once.
-            processed_urls = []
-
-            for direct_report in direct_reports:
-
-                # log.debug("Processing rating of %s " %
-                #     organizationrating.calculation["organization"].get("name", "UNKOWN"))
-
-                urlratings = direct_report["organization"].get("urls", [])
-
-                number_of_urls += len(urlratings)
-
-                # group by vulnerability type
-                for urlrating in urlratings:
+            # The issues of every url report are stored per scan type, so this is a sum over the latest url report
+            # of the urls that were relevant at that moment. Urls of multiple organizations are only counted once.
+            organizations = Organization.objects.all().filter(
+                Q(created_on__lte=when, is_dead=False) | Q(created_on__lte=when, is_dead=True, is_dead_since__gte=when),
+                type_id=organization_type_id,
+                country=country,
+            )
+            urls = relevant_urls_at_timepoint_queryset(Url.objects.all().filter(organization__in=organizations), when)
+            url_reports = latest_url_reports(when, urls)
+
+            for scan_type, severity in severities_per_scan_type(url_reports).items():
+                measurement[scan_type] = {
+                    "high": severity["high"],
+                    "medium": severity["medium"],
+                    "low": severity["low"],
+                    "ok_urls": severity["ok_urls"],
+                    "ok_endpoints": severity["ok_endpoints"],
+                    "applicable_endpoints": severity["applicable_endpoints"],
+                    "applicable_urls": severity["applicable_urls"],
+                }
+                scan_types.add(scan_type)
 
-                    # prevent the same urls counting double or more...
-                    if urlrating["url"] in processed_urls:
-                        # log.debug("Removed url because it's already in the report: %s" % urlrating["url"])
-                        continue
+                for key in ["high", "medium", "low", "ok_urls", "ok_endpoints"]:
+                    measurement["total"][key] += severity[key]
 
-                    processed_urls.append(urlrating["url"])
-
-                    # log.debug("Url: %s" % (urlrating["url"]))
-
-                    number_of_endpoints += len(urlrating["endpoints"])
-
-                    # print(connection.queries)
-                    # exit()
-
-                    # www.kindpakket.groningen.nl is missing
-                    # url reports
-                    for rating in urlrating["ratings"]:
-
-                        # log.debug("- type: %s H: %s, M: %s, L: %s" %
-                        #     (rating['type'], rating['high'], rating['medium'], rating['low']))
-
-                        if rating["type"] not in measurement:
-                            measurement[rating["type"]] = {
-                                "high": 0,
-                                "medium": 0,
-                                "low": 0,
-                                "ok_urls": 0,
-                                "ok_endpoints": 0,
-                                "applicable_endpoints": 0,
-                                "applicable_urls": 0,
-                            }
-
-                        # if rating['type'] not in scan_types:
-                        scan_types.add(rating["type"])
-
-                        measurement[rating["type"]]["high"] += rating["high"]
-                        measurement[rating["type"]]["medium"] += rating["medium"]
-                        measurement[rating["type"]]["low"] += rating["low"]
-                        measurement[rating["type"]]["ok_urls"] += rating["ok"]
-                        measurement[rating["type"]]["applicable_urls"] += 1
-
-                        measurement["total"]["high"] += rating["high"]
-                        measurement["total"]["medium"] += rating["medium"]
-                        measurement["total"]["low"] += rating["low"]
-                        measurement["total"]["ok_urls"] += rating["ok"]
-
-                    # endpoint reports
-                    for endpoint in urlrating["endpoints"]:
-
-                        for rating in endpoint["ratings"]:
-                            if rating["type"] not in measurement:
-                                measurement[rating["type"]] = {
-                                    "high": 0,
-                                    "medium": 0,
-                                    "low": 0,
-                                    "ok_urls": 0,
-                                    "ok_endpoints": 0,
-                                    "applicable_endpoints": 0,
-                                    "applicable_urls": 0,
-                                }
-
-                            # debugging, perhaps it appears that the latest scan is not set properly
-                            # if rating['type'] == 'ftp' and rating['high']:
-                            #     log.debug("High ftp added for %s" % urlrating["url"])
-
-                            # if rating['type'] not in scan_types:
-                            scan_types.add(rating["type"])
-
-                            measurement[rating["type"]]["high"] += rating["high"]
-                            measurement[rating["type"]]["medium"] += rating["medium"]
-                            measurement[rating["type"]]["low"] += rating["low"]
-                            measurement[rating["type"]]["ok_endpoints"] += rating["ok"]
-                            measurement[rating["type"]]["applicable_endpoints"] += 1
-
-                            measurement["total"]["high"] += rating["high"]
-                            measurement["total"]["medium"] += rating["medium"]
-                            measurement["total"]["low"] += rating["low"]
-                            measurement["total"]["ok_endpoints"] += rating["ok"]
+            totals = UrlReport.objects.all().filter(id__in=url_reports).aggregate(Count("id"), Sum("total_endpoints"))
+            number_of_urls = totals["id__count"]
+            number_of_endpoints = totals["total_endpoints__sum"] or 0
 
             # store these results per scan type, and only retrieve this per scan type...
             for scan_type in scan_types:
@@ -509,9 +294,10 @@ def calculate_map_data(days: int = 366, countries: List = None, organization_typ
                         scan_type,
                     )
                 )
-                data = get_map_data(
-                    map_configuration["country"], map_configuration["organization_type__name"], days_back, scan_type
-                )
+                with phase("map_data.calculate"):
+                    data = get_map_data(
+                        map_configuration["country"], map_configuration["organization_type__name"], days_back, scan_type
+                    )
 
                 try:
                     cached = MapDataCache()
@@ -520,7 +306,8 @@ def calculate_map_data(days: int = 366, countries: List = None, organization_typ
                     cached.filters = [scan_type]
                     cached.at_when = when
                     cached.dataset = data
-                    cached.save()
+                    with phase("map_data.save"):
+                        cached.save()
                 except OperationalError as a:
                     # The public user does not have permission to run insert statements....
                     log.exception(a)
@@ -750,6 +537,7 @@ def calculate_high_level_stats(days: int = 1, countries: List = None, organizati
             s.save()
 
 
+@timed("organization_report")
 def create_organization_report_on_moment(organization: Organization, when: datetime = None):
     """
     # also callable as admin action
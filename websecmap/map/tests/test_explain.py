@@ -0,0 +1,64 @@
+import pytest
+from django.core.cache import caches
+
+from websecmap.map.logic.explain import explain, get_explains, get_recent_explains, parse_cursor, remove_explanation
+from websecmap.organizations.models import Organization, OrganizationType, Url
+from websecmap.scanners.models import Endpoint
+from websecmap.scanners.scanmanager import store_endpoint_scan_result, store_url_scan_result
+
+
+def test_explain_listing(db, settings, django_assert_max_num_queries, django_capture_on_commit_callbacks):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    no_https = "Site does not redirect to secure url, and has no secure alternative on a standard port."
+
+    municipality, _ = OrganizationType.objects.all().get_or_create(name="municipality")
+    organization = Organization.objects.create(name="Faalonië", type=municipality, country="NL")
+    elsewhere = Organization.objects.create(name="Elders", type=municipality, country="DE")
+
+    for number in range(12):
+        url = Url.objects.create(url=f"site{number}.example")
+        url.organization.add(organization, elsewhere)
+        endpoint = Endpoint.objects.create(url=url, protocol="http", port=80, ip_version=4)
+        store_endpoint_scan_result("plain_https", endpoint.id, "0", no_https)
+        store_url_scan_result("DNSSEC", url.id, "ERROR", "DNSSEC is incorrectly or not configured (errors found).")
+
+    for scan_type, scan_id in [("plain_https", id) for id in range(1, 13)] + [("DNSSEC", id) for id in range(1, 13)]:
+        assert explain(scan_id, scan_type, "Not applicable", "Hans")["success"]
+
+    # the number of queries does not depend on the number of explanations
+    with django_assert_max_num_queries(6):
+        page = get_recent_explains("NL", "municipality")
+    assert len(page["explains"]) == 24
+    assert page["next"] == ""
+    assert page["explains"][0]["organizations"] == [{"id": organization.id, "name": "Faalonië"}]
+    assert page["explains"][0]["original_severity"] == "high"
+
+    # pages do not overlap and contain all explanations
+    pages, cursor = [], ""
+    while True:
+        page = get_explains("NL", "municipality", limit=5, cursor=cursor)
+        pages.append(page["explains"])
+        cursor = page["next"]
+        if not cursor:
+            break
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 4]
+    listed = [(explain["scan_type"], explain["subject"]) for page in pages for explain in page]
+    assert len(set(listed)) == 24
+    explained_on = [explain["explained_on"] for page in pages for explain in page]
+    assert explained_on == sorted(explained_on, reverse=True)
+
+    # invalid cursors are not cached
+    for invalid in ["not a cursor", " 1.0.1", "1.2.1", "9" * 30 + ".0.1"]:
+        with pytest.raises(ValueError):
+            parse_cursor(invalid)
+        with django_assert_max_num_queries(0):
+            assert get_explains("NL", "municipality", limit=5, cursor=invalid)["explains"] == []
+    assert not [key for key in caches["default"]._cache if "explains" in key and " " in key]
+
+    # the listing is cached until an explanation is removed or added
+    with django_assert_max_num_queries(2):
+        get_recent_explains("NL", "municipality")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        remove_explanation(1, "plain_https")
+    assert len(get_recent_explains("NL", "municipality")["explains"]) == 23
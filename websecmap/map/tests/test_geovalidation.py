@@ -0,0 +1,80 @@
+import numpy as np
+
+from websecmap.map.logic.geovalidation import points_in_geometry, validate_points
+from websecmap.organizations.models import Coordinate, Organization
+
+AMSTERDAM = [4.895168, 52.370216]
+ORANJESTAD = [-70.034600, 12.523765]
+NEW_YORK = [-74.005974, 40.712776]
+
+
+def point(organization, area):
+    return Coordinate.objects.create(organization=organization, geojsontype="Point", area=area)
+
+
+def test_validate_points(db):
+    amsterdam = Organization.objects.create(name="Amsterdam", country="NL")
+    aruba = Organization.objects.create(name="Aruba", country="NL")
+    elsewhere = Organization.objects.create(name="Elsewhere", country="NL")
+
+    correct = point(amsterdam, AMSTERDAM)
+    duplicate = point(amsterdam, AMSTERDAM)
+    flipped = point(aruba, ORANJESTAD[::-1])
+    # this one is a duplicate once the flipped one is repaired
+    flipped_duplicate = point(aruba, ORANJESTAD)
+    outside = point(elsewhere, NEW_YORK)
+    unreadable = point(elsewhere, "[4.8264312999999675, 52.3454862]")
+
+    report = validate_points("NL")
+    assert report["flipped"] == [flipped.id]
+    assert report["outside"] == [outside.id]
+    # without repairing the flipped point, it is not compared to the correct one
+    assert report["duplicates"] == [duplicate.id]
+    assert report["unreadable"] == [unreadable.id]
+    assert len(report["checked"]) == 5
+
+    # nothing changed
+    assert Coordinate.objects.all().count() == 6
+
+    # the correct point is never removed in favour of the flipped one
+    report = validate_points("NL", remove_duplicates=True)
+    assert report["duplicates"] == [duplicate.id]
+    assert set(Coordinate.objects.all().values_list("id", flat=True)) == {
+        correct.id,
+        flipped.id,
+        flipped_duplicate.id,
+        outside.id,
+        unreadable.id,
+    }
+
+    validate_points("NL", fix_flipped=True, remove_duplicates=True)
+    assert set(Coordinate.objects.all().values_list("id", flat=True)) == {
+        correct.id,
+        flipped.id,
+        outside.id,
+        unreadable.id,
+    }
+
+    flipped.refresh_from_db()
+    assert flipped.area == ORANJESTAD
+    assert flipped.edit_area == {"type": "Point", "coordinates": ORANJESTAD}
+
+    report = validate_points("NL")
+    assert report["flipped"] == report["duplicates"] == []
+
+
+def test_points_in_geometry():
+    # a square with a square hole in it
+    geometry = {
+        "type": "Polygon",
+        "coordinates": [
+            [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+            [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]],
+        ],
+    }
+    lng = np.array([1, 5, 11, 9.5, -1])
+    lat = np.array([1, 5, 5, 9.5, 5])
+    assert points_in_geometry(lng, lat, geometry).tolist() == [True, False, False, True, False]
+
+    multipolygon = {"type": "MultiPolygon", "coordinates": [geometry["coordinates"], [[[20, 0], [30, 0], [25, 5]]]]}
+    assert points_in_geometry(np.array([25, 5]), np.array([1, 5]), multipolygon).tolist() == [True, False]
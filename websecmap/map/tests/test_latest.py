@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from websecmap.map.logic.latest import get_all_latest_scans
+from websecmap.organizations.models import Organization, OrganizationType, Url
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
+
+
+def test_get_all_latest_scans(db, django_assert_max_num_queries):
+    municipality, _ = OrganizationType.objects.all().get_or_create(name="municipality")
+    organization = Organization.objects.create(name="Faalonië", type=municipality, country="NL")
+    # urls that belong to multiple organizations are only shown once
+    other_organization = Organization.objects.create(name="Other", type=municipality, country="NL")
+    moment = datetime(2021, 1, 1, tzinfo=pytz.utc)
+
+    no_https = "Site does not redirect to secure url, and has no secure alternative on a standard port."
+    for day in range(8):
+        url = Url.objects.create(url=f"site{day}.example")
+        url.organization.add(organization, other_organization)
+        endpoint = Endpoint.objects.create(url=url, protocol="https", port=443, ip_version=4, is_dead=day == 7)
+        for scan_type in ["plain_https", "ftp"]:
+            # older scans are not the latest anymore
+            for is_the_latest_scan, age in [(False, 100), (True, 0)]:
+                EndpointGenericScan.objects.create(
+                    endpoint=endpoint,
+                    type=scan_type,
+                    rating="",
+                    explanation=no_https,
+                    is_the_latest_scan=is_the_latest_scan,
+                    rating_determined_on=moment + timedelta(days=day - age),
+                )
+
+        UrlGenericScan.objects.create(
+            url=url,
+            type="DNSSEC",
+            rating="ERROR",
+            explanation="",
+            is_the_latest_scan=True,
+            rating_determined_on=moment + timedelta(days=day),
+        )
+
+    with django_assert_max_num_queries(4):
+        dataset = get_all_latest_scans("NL", "municipality")
+
+    assert list(dataset["scans"].keys()) == ["ftp", "plain_https", "DNSSEC"]
+
+    # the newest 6, of endpoints that are alive
+    assert [scan["url"] for scan in dataset["scans"]["plain_https"]] == [
+        f"site{day}.example" for day in range(6, 0, -1)
+    ]
+    assert dataset["scans"]["plain_https"][0]["high"] == 1
+    assert [scan["url"] for scan in dataset["scans"]["DNSSEC"]] == [f"site{day}.example" for day in range(7, 1, -1)]
+
+    # nothing is shown for other countries
+    assert get_all_latest_scans("DE", "municipality")["scans"] == {}
@@ -1,10 +1,13 @@
 # Create your tests here.
+import json
 import logging
 
 # from unittest import mock
+from django.conf import settings
 from django.utils import timezone
+from openpyxl import load_workbook
 
-from websecmap.map.logic.datasets import export_urls_only
+from websecmap.map.logic.datasets import export_stream, export_urls_only
 from websecmap.organizations.models import Organization, OrganizationType, Url
 
 log = logging.getLogger(__package__)
@@ -73,3 +76,45 @@ def test_map_datasets(db):
     assert book["data"][1, 1] == "test.nl"
     assert book["data"][2, 1] == "test2.nl"
     assert book["data"][3, 1] == "test3.nl"
+
+
+def test_streaming_export(db, tmp_path, monkeypatch):
+    monkeypatch.setitem(settings.TOOLS, "datasets", {"output_dir": str(tmp_path)})
+
+    organization_type, created = OrganizationType.objects.all().get_or_create(name="municipality")
+    organization = Organization.objects.create(name="test", type=organization_type, country="NL")
+    for name in ["test.nl", "test2.nl"]:
+        Url.objects.create(url=name).organization.add(organization)
+
+    csv = b"".join(export_stream("urls", "NL", "municipality", "csv")).decode()
+    assert csv.splitlines()[1:] == [f"{url.id},{url.url},{organization.id}" for url in Url.objects.order_by("id")]
+
+    # the same structure as the in memory export
+    exported = json.loads(b"".join(export_stream("urls_only", "NL", "municipality", "json")))
+    book = json.loads(export_urls_only("NL", "municipality").get_json())
+    assert exported == book
+
+    xlsx = tmp_path / "export.xlsx"
+    xlsx.write_bytes(b"".join(export_stream("urls", "NL", "municipality", "xlsx")))
+    rows = list(load_workbook(xlsx)["data"].values)
+    assert rows[0] == ("id", "url", "organization")
+    assert [row[1] for row in rows[1:]] == ["test.nl", "test2.nl"]
+
+    # a snapshot is reused
+    snapshots = sorted(path.name for path in tmp_path.glob("urls_nl_municipality_*.csv"))
+    assert len(snapshots) == 1
+    (tmp_path / snapshots[0]).write_text("from the snapshot")
+    assert b"".join(export_stream("urls", "NL", "municipality", "csv")) == b"from the snapshot"
+
+    # until the data changes, then the old snapshot is replaced
+    Url.objects.create(url="test3.nl").organization.add(organization)
+    assert "test3.nl" in b"".join(export_stream("urls", "NL", "municipality", "csv")).decode()
+    assert len(list(tmp_path.glob("urls_nl_municipality_*.csv"))) == 1
+
+    # an aborted download does not leave a snapshot behind
+    Url.objects.create(url="test4.nl").organization.add(organization)
+    stream = export_stream("urls", "NL", "municipality", "json")
+    next(stream)
+    stream.close()
+    assert list(tmp_path.glob("*.tmp")) == []
+    assert len(list(tmp_path.glob("urls_nl_municipality_*.json"))) == 0
@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from websecmap.app.synthetic import WorldParameters, create_world, plan_world
+from websecmap.map.logic.map_health import get_outdated_ratings, update_map_health_reports
+from websecmap.map.logic.stats_and_graphs import get_organization_vulnerability_timeline
+from websecmap.map.models import MapHealthReport, OrganizationReport
+from websecmap.map.report import PUBLISHED_SCAN_TYPES, recreate_organization_reports
+from websecmap.organizations.models import Organization, Url
+from websecmap.reporting.models import UrlReport, report_columns
+from websecmap.reporting.report import recreate_url_report
+
+
+def reads_calculation(queries):
+    return [query["sql"] for query in queries if query["sql"].startswith("SELECT") and "calculation" in query["sql"]]
+
+
+def test_report_projections(db):
+    create_world(plan_world(WorldParameters(organizations=2, urls_per_organization=2)))
+    for url_id in Url.objects.all().values_list("id", flat=True):
+        recreate_url_report(url_id)
+    organizations = list(Organization.objects.all())
+    recreate_organization_reports([organization.id for organization in organizations])
+
+    assert "calculation" not in report_columns(UrlReport, "reporting_urlreport")
+    assert "reporting_urlreport.calculation" in report_columns(UrlReport, "reporting_urlreport", True)
+    report = OrganizationReport.objects.all().first()
+    assert OrganizationReport.objects.all().filter(id=report.id).calculations() == {report.id: report.calculation}
+
+    with CaptureQueriesContext(connection) as queries:
+        assert get_organization_vulnerability_timeline(organizations[0].id)
+        # rebuilding a url report reads the numbers of the existing reports
+        recreate_url_report(Url.objects.all().first().id)
+    assert not reads_calculation(queries)
+
+    # the calculation of a report is read once, not on every day it is the latest report
+    with CaptureQueriesContext(connection) as queries:
+        update_map_health_reports(PUBLISHED_SCAN_TYPES, days=3)
+    assert MapHealthReport.objects.all().count() == 3
+    assert len(reads_calculation(queries)) == len(organizations)
+
+    # the outdated ratings always need the calculation, they are read with the report
+    with CaptureQueriesContext(connection) as queries:
+        get_outdated_ratings(organizations)
+    assert len(queries) == len(reads_calculation(queries)) == len(organizations)
@@ -0,0 +1,49 @@
+from constance import config
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from websecmap.organizations.models import Url
+from websecmap.scanners.models import Endpoint
+from websecmap.scanners.scanmanager import store_endpoint_scan_result
+
+
+def test_latest_scan_feed(db, client, settings, django_assert_max_num_queries, django_capture_on_commit_callbacks):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    no_https = "Site does not redirect to secure url, and has no secure alternative on a standard port."
+
+    for number in range(10):
+        url = Url.objects.create(url=f"site{number}.example")
+        endpoint = Endpoint.objects.create(url=url, protocol="http", port=80, ip_version=4)
+        store_endpoint_scan_result("plain_https", endpoint.id, "0", no_https)
+
+    # the first read of a setting stores its default
+    assert config.PROJECT_WEBSITE == ""
+    # the first request of a process loads the urls and views, with a few queries
+    client.get("/data/feed/DNSSEC")
+
+    # the number of queries does not depend on the number of items: a setting and the scans
+    with django_assert_max_num_queries(2):
+        feed = client.get("/data/feed/plain_https").content.decode()
+    assert feed.count("🔴 High - site") == 10
+
+    # the rendered feed is reused
+    with django_assert_max_num_queries(0):
+        assert client.get("/data/feed/plain_https").content.decode() == feed
+
+    # the feed is cached per language
+    with CaptureQueriesContext(connection) as queries:
+        client.get("/data/feed/plain_https", HTTP_ACCEPT_LANGUAGE="nl")
+    assert queries
+
+    # the same result again only updates the moment of the last scan, that does not invalidate the feed
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        store_endpoint_scan_result("plain_https", endpoint.id, "0", no_https)
+    assert not callbacks
+    with django_assert_max_num_queries(0):
+        assert client.get("/data/feed/plain_https").content.decode() == feed
+
+    # until a new scan is stored
+    with django_capture_on_commit_callbacks(execute=True):
+        store_endpoint_scan_result("plain_https", endpoint.id, "1", "Redirects to a secure site, while a secure ...")
+    feed = client.get("/data/feed/plain_https").content.decode()
+    assert "✅ Perfect - site9.example" in feed
@@ -0,0 +1,68 @@
+import gzip
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from websecmap.map.logic.openstreetmap import get_data_from_wambachers_zipfile, resample, resample_features
+from websecmap.map.logic.simplification import simplify
+
+path = Path(__file__).parent
+
+
+def noisy_ring(points, seed):
+    random = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, points)
+    radius = 1 + 0.05 * random.standard_normal(points)
+    ring = np.round(np.c_[radius * np.cos(angles), radius * np.sin(angles)], 7)
+    ring[-1] = ring[0]
+    return ring.tolist()
+
+
+def test_simplify_same_as_rdp_package():
+    rdp = pytest.importorskip("rdp").rdp
+
+    for points in [2, 3, 10, 500]:
+        for epsilon in [0, 0.001, 0.01, 0.1, 1]:
+            ring = noisy_ring(points, seed=points)
+            assert simplify(ring, epsilon) == rdp(ring, epsilon=epsilon)
+
+    # an open line, and a line where all points are on the line.
+    line = [[0, 0], [1, 0.5], [2, -0.5], [3, 0], [4, 0]]
+    assert simplify(line, 0.4) == rdp(line, epsilon=0.4)
+    assert simplify([[0, 0], [1, 1], [2, 2], [3, 3]]) == [[0, 0], [3, 3]]
+
+    # numpy arrays stay numpy arrays
+    assert isinstance(simplify(np.array(line), 0.4), np.ndarray)
+
+
+def test_streaming_wambachers_zipfile():
+    filename = f"{path}/openstreetmap/AL_county.gz"
+    with gzip.open(filename, "rt") as f:
+        expected = json.load(f)["features"]
+
+    assert list(get_data_from_wambachers_zipfile(filename)["features"]) == expected
+
+
+def test_resample_features_in_parallel():
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"name": f"Region {index}"},
+            "geometry": {"type": "MultiPolygon", "coordinates": [[noisy_ring(300, seed=index)]]},
+        }
+        for index in range(6)
+    ]
+    polygon = {"type": "Feature", "properties": {"name": "Polygon"}, "geometry": {"type": "Polygon", "coordinates": []}}
+    polygon["geometry"]["coordinates"] = [noisy_ring(300, seed=10), noisy_ring(50, seed=11)]
+    features.append(polygon)
+
+    serial = [resample(json.loads(json.dumps(feature)), 0.01) for feature in features]
+    parallel = list(resample_features(json.loads(json.dumps(features)), 0.01, processes=2))
+
+    assert parallel == serial
+    assert [feature["properties"]["name"] for feature in parallel] == [
+        feature["properties"]["name"] for feature in features
+    ]
+    assert len(parallel[0]["geometry"]["coordinates"][0][0]) < 300
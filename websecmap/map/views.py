@@ -7,7 +7,7 @@ import django_excel as excel
 import pytz
 from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils.text import slugify
 from django.utils.translation import ugettext as _
@@ -72,25 +72,45 @@ def empty_response():
     return JsonResponse({}, encoder=JSEncoder)
 
 
-def generic_download(filename, data, file_type):
-    supported_types = {
-        "xlsx": {"content_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
-        "ods": {"content_type": "application/vnd.oasis.opendocument.spreadsheet"},
-        "csv": {"content_type": "text/csv"},
-        "json": {"content_type": "text/json"},
-        "mediawiki": {"content_type": "text/plain"},
-        "latex": {"content_type": "text/plain"},
-    }
+SUPPORTED_FILE_TYPES = {
+    "xlsx": {"content_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "ods": {"content_type": "application/vnd.oasis.opendocument.spreadsheet"},
+    "csv": {"content_type": "text/csv"},
+    "json": {"content_type": "text/json"},
+    "mediawiki": {"content_type": "text/plain"},
+    "latex": {"content_type": "text/plain"},
+}
 
-    if file_type in supported_types:
+
+def generic_download(filename, data, file_type):
+    if file_type in SUPPORTED_FILE_TYPES:
         http_response = excel.make_response(data, file_type)
         http_response["Content-Disposition"] = "attachment; filename=%s.%s" % (slugify(filename), file_type)
-        http_response["Content-type"] = supported_types[file_type]["content_type"]
+        http_response["Content-type"] = SUPPORTED_FILE_TYPES[file_type]["content_type"]
         return http_response
 
     return JsonResponse({}, encoder=JSEncoder)
 
 
+def dataset_download(set_name, country, organization_type, file_type):
+    """Large datasets are streamed from a snapshot, other formats are created in memory by pyexcel."""
+    if file_type not in SUPPORTED_FILE_TYPES:
+        return empty_response()
+
+    filename = create_filename(set_name, country, organization_type)
+
+    if file_type not in datasets.STREAMING_FORMATS:
+        columns, queryset = datasets.DATASETS[set_name](country, organization_type)
+        return generic_download(filename, datasets.generic_export(queryset, columns), file_type)
+
+    http_response = StreamingHttpResponse(
+        datasets.export_stream(set_name, country, organization_type, file_type),
+        content_type=SUPPORTED_FILE_TYPES[file_type]["content_type"],
+    )
+    http_response["Content-Disposition"] = "attachment; filename=%s.%s" % (slugify(filename), file_type)
+    return http_response
+
+
 def defaults(request):
     return JsonResponse(get_defaults(), encoder=JSEncoder, safe=False)
 
@@ -103,49 +123,37 @@ def layers(request, country):
 def export_urls_only(
     request, country: str = DEFAULT_COUNTRY, organization_type=DEFAULT_LAYER, file_format: str = DEFAULT_FILE_FORMAT
 ):
-    data = datasets.export_urls_only(country, organization_type)
-    filename = create_filename("urls_only", country, organization_type)
-
-    return generic_download(filename, data, file_format)
+    return dataset_download("urls_only", country, organization_type, file_format)
 
 
 @cache_page(one_day)
 def export_organizations(
     request, country: str = DEFAULT_COUNTRY, organization_type=DEFAULT_LAYER, file_format: str = DEFAULT_FILE_FORMAT
 ):
-    data = datasets.export_organizations(country, organization_type)
-    filename = create_filename("organizations", country, organization_type)
-    return generic_download(filename, data, file_format)
+    return dataset_download("organizations", country, organization_type, file_format)
 
 
 @cache_page(one_day)
 def export_organization_types(
     request, country: str = DEFAULT_COUNTRY, organization_type=DEFAULT_LAYER, file_format: str = DEFAULT_FILE_FORMAT
 ):
-    data = datasets.export_organization_types()
-    filename = create_filename("organization_types", country, organization_type)
-    return generic_download(filename, data, file_format)
+    return dataset_download("organization_types", country, organization_type, file_format)
 
 
 @cache_page(one_day)
 def export_coordinates(
     request, country: str = DEFAULT_COUNTRY, organization_type=DEFAULT_LAYER, file_format: str = DEFAULT_FILE_FORMAT
 ):
-    data = datasets.export_coordinates(country, organization_type)
-    filename = create_filename("coordinates", country, organization_type)
-    return generic_download(filename, data, file_format)
+    return dataset_download("coordinates", country, organization_type, file_format)
 
 
 @cache_page(one_day)
 def export_urls(
     request, country: str = DEFAULT_COUNTRY, organization_type=DEFAULT_LAYER, file_format: str = DEFAULT_FILE_FORMAT
 ):
-    data = datasets.export_urls(country, organization_type)
-    filename = create_filename("urls", country, organization_type)
-    return generic_download(filename, data, file_format)
+    return dataset_download("urls", country, organization_type, file_format)
 
 
-@cache_page(one_hour)
 def export_explains(
     request, country: str = DEFAULT_COUNTRY, organization_type=DEFAULT_LAYER, file_format: str = DEFAULT_FILE_FORMAT
 ):
@@ -641,10 +649,10 @@ def all_latest_scans(request, country: str = DEFAULT_COUNTRY, organization_type=
     return JsonResponse(dataset, encoder=JSEncoder)
 
 
-@cache_page(ten_minutes)
 def explain_list(request, country, organization_type):
-    data = get_recent_explains(country, organization_type)
-    return JsonResponse(data, encoder=JSEncoder, safe=False)
+    # cached until explanations change
+    data = get_recent_explains(country, organization_type, request.GET.get("cursor", ""))
+    return JsonResponse(data, encoder=JSEncoder)
 
 
 @cache_page(ten_minutes)
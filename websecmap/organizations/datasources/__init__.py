@@ -27,11 +27,11 @@ from typing import List
 import googlemaps
 import pytz
 import requests
-import tldextract
 from constance import config
 from django.conf import settings
 
 from websecmap.app.progressbar import print_progress_bar
+from websecmap.organizations import normalization
 from websecmap.organizations.models import Coordinate, Organization, OrganizationType, Url, Dataset
 from websecmap.scanners.scanner.http import resolves
 
@@ -261,7 +261,7 @@ def save_websites(organization, websites: List[str]):
     for website in websites:
 
         website = website.lower()
-        extract = tldextract.extract(website)
+        extract = normalization.extract(website)
 
         # has to have a valid suffix at least
         if not extract.suffix:
@@ -350,6 +350,12 @@ def save_organization_type(name):
 
 def save_url(website, failmap_organization):
 
+    normalized = normalization.normalize(website)
+    if not normalized:
+        log.debug("Url %s is not valid." % website)
+        return
+    website = normalized.url
+
     # don't save non resolving urls.
     if not resolves(website):
         return
@@ -0,0 +1,36 @@
+import logging
+from datetime import datetime
+
+import pytz
+from django.core.management.base import BaseCommand
+
+from websecmap.organizations.management.commands.create_dataset import Command as CreateDatasetCommand
+from websecmap.organizations.management.commands.support.bulkdataset import dump
+from websecmap.organizations.management.commands.support.datasethelpers import check_referential_integrity
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the same dataset as create_dataset, in a format that can be written and loaded many times faster. "
+        "The dataset is a directory with a compressed file per model. Load it with load_bulk_dataset."
+    )
+
+    DIRECTORY = "websecmap_bulk_dataset_{}"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "app_labels", nargs="*", help="Apps or models to export, by default the set of create_dataset."
+        )
+        parser.add_argument("-o", "--output", help="Directory to write the dataset to.")
+
+    def handle(self, *args, **options):
+        # verify data is properly exportable
+        check_referential_integrity()
+
+        directory = options["output"] or self.DIRECTORY.format(datetime.now(pytz.utc).strftime("%Y%m%d_%H%M%S"))
+        manifest = dump(directory, options["app_labels"] or list(CreateDatasetCommand.APP_LABELS))
+
+        rows = sum(entry["rows"] for entry in manifest["models"])
+        self.stdout.write(f"Written {rows} rows of {len(manifest['models'])} models to {directory}.")
@@ -0,0 +1,42 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from websecmap.organizations.management.commands.support.bulkdataset import load
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a dataset made with create_bulk_dataset. Foreign keys are checked after all data has been inserted, "
+        "everything is loaded in a single transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory of the dataset.")
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Remove existing data in the tables of the dataset first. This is refused when tables outside the "
+            "dataset refer to that data.",
+        )
+        parser.add_argument(
+            "--skip-integrity-check",
+            action="store_true",
+            help="Do not check the foreign keys after loading, only use this with datasets you trust.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            manifest = load(
+                options["directory"], replace=options["replace"], check_integrity=not options["skip_integrity_check"]
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = sum(entry["rows"] for entry in manifest["models"])
+        duration = time.monotonic() - started
+        self.stdout.write(f"Loaded {rows} rows of {len(manifest['models'])} models in {duration:.1f}s.")
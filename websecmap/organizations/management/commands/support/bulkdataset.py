@@ -0,0 +1,276 @@
+"""
+A dataset format that can be written and read in bulk, as an alternative to dumpdata/loaddata.
+
+A dataset is a directory with a manifest and a gzip compressed file per model. Every line in such a file is a JSON
+list with the values of one row, in primary key order:
+
+    websecmap_bulk_dataset_20210801_120000/
+        manifest.json
+        organizations.OrganizationType.ndjson.gz
+        organizations.Organization.ndjson.gz
+        ...
+
+The manifest lists the models in dependency order, with the names of their columns and the number of rows. Loading
+inserts the rows with bulk inserts, in that order, while checking foreign keys is postponed until all data is loaded.
+"""
+
+import base64
+import datetime as dt
+import gzip
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Set, Type
+
+import pytz
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+
+log = logging.getLogger(__package__)
+
+FORMAT_VERSION = 1
+
+# Rows that are read from the database, or inserted into it, at the same time.
+BATCH_SIZE = 5000
+
+# Fields that are written as text, and have to be converted back when loading.
+CONVERTED_FIELDS = (
+    models.DateTimeField,
+    models.DateField,
+    models.TimeField,
+    models.DecimalField,
+    models.DurationField,
+    models.UUIDField,
+    models.BinaryField,
+)
+
+
+class DatasetEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # the django encoder drops the microseconds of times, which would change the data.
+        if isinstance(o, (dt.datetime, dt.time)):
+            return o.isoformat()
+        if isinstance(o, (bytes, memoryview)):
+            return base64.b64encode(bytes(o)).decode()
+        return super().default(o)
+
+
+def resolve_models(labels: List[str]) -> List[Type[models.Model]]:
+    """
+    Turns labels such as "organizations.Url" and "game" into models, including the tables of many to many relations.
+    The models are sorted so that every model comes after the models it refers to.
+    """
+    selected = []
+    for label in labels:
+        if "." in label:
+            selected.append(apps.get_model(label))
+        else:
+            selected.extend(apps.get_app_config(label).get_models())
+
+    with_relations = []
+    for model in selected:
+        if model._meta.proxy or model in with_relations:
+            continue
+        with_relations.append(model)
+        for field in model._meta.local_many_to_many:
+            if field.remote_field.through._meta.auto_created:
+                with_relations.append(field.remote_field.through)
+
+    return sort_by_dependencies(with_relations)
+
+
+def sort_by_dependencies(model_list: List[Type[models.Model]]) -> List[Type[models.Model]]:
+    dependencies = {
+        model: {
+            field.related_model
+            for field in model._meta.concrete_fields
+            if field.is_relation and field.related_model in model_list and field.related_model is not model
+        }
+        for model in model_list
+    }
+
+    ordered = []
+    done: Set[Type[models.Model]] = set()
+    while len(ordered) < len(model_list):
+        ready = [model for model in model_list if model not in done and dependencies[model] <= done]
+        if not ready:
+            # circular references, these are still fine as foreign keys are checked at the end.
+            ready = [model for model in model_list if model not in done][0:1]
+            log.warning(f"Circular reference found at {ready[0]._meta.label}.")
+
+        for model in ready:
+            ordered.append(model)
+            done.add(model)
+
+    return ordered
+
+
+def referring_models(model_list: List[Type[models.Model]]) -> List[Type[models.Model]]:
+    """Models that are not in model_list and have a relation to a model in model_list, such as many to many tables."""
+    return [
+        model
+        for model in apps.get_models(include_auto_created=True)
+        if model not in model_list
+        and not model._meta.proxy
+        and any(field.is_relation and field.related_model in model_list for field in model._meta.concrete_fields)
+    ]
+
+
+def dump(directory: str, labels: List[str]) -> Dict[str, Any]:
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_on": dt.datetime.now(pytz.utc).isoformat(),
+        "models": [],
+    }
+
+    for model in resolve_models(labels):
+        columns = [field.attname for field in model._meta.concrete_fields]
+        filename = f"{model._meta.label}.ndjson.gz"
+
+        progress = Progress("Dumping", model._meta.label)
+        with gzip.open(os.path.join(directory, filename), "wt", compresslevel=6) as f:
+            rows = model._default_manager.order_by("pk").values_list(*columns)
+            for row in rows.iterator(chunk_size=BATCH_SIZE):
+                f.write(json.dumps(row, cls=DatasetEncoder))
+                f.write("\n")
+                progress.add(1)
+        progress.done()
+
+        manifest["models"].append(
+            {"model": model._meta.label, "file": filename, "columns": columns, "rows": progress.rows}
+        )
+
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load(directory: str, replace: bool = False, check_integrity: bool = True) -> Dict[str, Any]:
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Dataset format {manifest['format_version']} is not supported.")
+
+    loaded_models = [apps.get_model(entry["model"]) for entry in manifest["models"]]
+
+    with transaction.atomic():
+        with connection.constraint_checks_disabled():
+            not_empty = [model._meta.label for model in loaded_models if model._default_manager.exists()]
+            if not_empty and not replace:
+                raise ValueError(f"These tables already contain data: {', '.join(not_empty)}.")
+
+            # foreign keys are not checked while deleting, rows outside the dataset would silently refer to nothing.
+            referring = [model for model in referring_models(loaded_models) if model._default_manager.exists()]
+            if referring:
+                labels = ", ".join(model._meta.label for model in referring)
+                raise ValueError(f"These tables are not in the dataset and refer to data that is replaced: {labels}.")
+
+            # remove in reverse order, so nothing refers to removed rows. A raw delete does not load every row first.
+            for model in reversed(loaded_models):
+                model._default_manager.all()._raw_delete(model._default_manager.db)
+
+            for model, entry in zip(loaded_models, manifest["models"]):
+                load_model(model, entry, os.path.join(directory, entry["file"]))
+
+        if check_integrity:
+            log.info("Checking foreign keys.")
+            connection.check_constraints(table_names=[model._meta.db_table for model in loaded_models])
+
+    # new rows should not receive an id that has been loaded.
+    with connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(no_style(), loaded_models):
+            cursor.execute(statement)
+
+    return manifest
+
+
+def load_model(model: Type[models.Model], entry: Dict[str, Any], path: str):
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    missing = [column for column in entry["columns"] if column not in fields]
+    if missing:
+        raise ValueError(f"{model._meta.label} does not have the columns {missing} anymore.")
+
+    converters = {
+        index: fields[column].to_python
+        for index, column in enumerate(entry["columns"])
+        if isinstance(fields[column], CONVERTED_FIELDS)
+    }
+    # the fast way of creating instances is possible when the dataset has the same columns as the model.
+    positional = entry["columns"] == list(fields.keys())
+
+    progress = Progress("Loading", model._meta.label, entry["rows"])
+    with loaded_dates_kept(model):
+        batch = []
+        for values in read_rows(path):
+            for index, converter in converters.items():
+                if values[index] is not None:
+                    values[index] = converter(values[index])
+
+            batch.append(model(*values) if positional else model(**dict(zip(entry["columns"], values))))
+            if len(batch) >= BATCH_SIZE:
+                model._default_manager.bulk_create(batch)
+                progress.add(len(batch))
+                batch = []
+
+        if batch:
+            model._default_manager.bulk_create(batch)
+            progress.add(len(batch))
+    progress.done()
+
+
+@contextmanager
+def loaded_dates_kept(model: Type[models.Model]):
+    """Bulk inserts set auto_now(_add) fields to the current time, while loaddata keeps the value in the dataset."""
+    fields = [field for field in model._meta.concrete_fields if getattr(field, "auto_now", False)]
+    fields_add = [field for field in model._meta.concrete_fields if getattr(field, "auto_now_add", False)]
+    try:
+        for field in fields + fields_add:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field in fields:
+            field.auto_now = True
+        for field in fields_add:
+            field.auto_now_add = True
+
+
+def read_rows(path: str) -> Iterator[List[Any]]:
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class Progress:
+    """Logs the progress and speed of dumping or loading a model every few seconds."""
+
+    interval = 5
+
+    def __init__(self, action: str, label: str, total: int = None):
+        self.action = action
+        self.label = label
+        self.total = total
+        self.rows = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def add(self, rows: int):
+        self.rows += rows
+        if time.monotonic() - self.last_report > self.interval:
+            self.last_report = time.monotonic()
+            total = f" of {self.total}" if self.total is not None else ""
+            log.info(f"{self.action} {self.label}: {self.rows}{total} rows, {self.speed():.0f} rows/s.")
+
+    def speed(self) -> float:
+        return self.rows / max(time.monotonic() - self.started, 0.001)
+
+    def done(self):
+        duration = time.monotonic() - self.started
+        log.info(f"{self.action} {self.label}: {self.rows} rows in {duration:.1f}s, {self.speed():.0f} rows/s.")
@@ -4,19 +4,24 @@
 import hashlib
 import logging
 from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+from typing import List
 
 import pytz
-import tldextract
 from django.core.exceptions import ValidationError
 from django.db import models, transaction, IntegrityError
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from jsonfield import JSONField
-from validators import domain
+
+from websecmap.organizations import normalization
 
 log = logging.getLogger(__package__)
 
+# The amount of new subdomains that are resolved at the same time when adding subdomains in bulk.
+BULK_RESOLVE_CONCURRENCY = 10
+
 
 class OrganizationType(models.Model):
     name = models.CharField(max_length=255, verbose_name=_("layer"))
@@ -371,8 +376,7 @@ class Url(models.Model):
 
         # handle computed values
 
-        result = tldextract.extract(self.url)
-        log.debug(result)
+        result = normalization.extract(self.url)
         self.computed_subdomain = result.subdomain
         self.computed_domain = result.domain
         self.computed_suffix = result.suffix
@@ -435,36 +439,84 @@ class Url(models.Model):
 
         return u
 
+    def add_subdomains_bulk(self, subdomains: List[str], internal_notes: str = "") -> List[int]:
+        """
+        Adds many subdomains at once, with the same rules as add_subdomain: the new url has to be valid, must not
+        exist yet and has to resolve. The new urls are added to the organizations of this url.
+
+        Instead of a few queries per subdomain, existing urls are looked up in one query and the new urls and their
+        organization relations are inserted with a single bulk insert each. Resolving is done concurrently.
+
+        Note that bulk inserts do not call save() or send post_save signals, computed fields are set here.
+
+        :return: ids of the created urls, for example to onboard them.
+        """
+        # import here to prevent circular/cyclic imports, this module imports Url.
+        from websecmap.scanners.scanner.http import resolves
+
+        candidates = set()
+        for subdomain in subdomains:
+            subdomain = (subdomain or "").strip().lower().rstrip(".")
+            if subdomain.startswith("*."):
+                subdomain = subdomain[2:]
+            if not subdomain:
+                continue
+
+            new_url = f"{subdomain}.{self.url}".lower()
+            if not Url.is_valid_url(new_url):
+                log.debug("Subdomain not valid: %s" % new_url)
+                continue
+            candidates.add(new_url)
+
+        existing = set(Url.objects.all().filter(url__in=candidates).values_list("url", flat=True))
+        candidates = sorted(candidates - existing)
+        if not candidates:
+            return []
+
+        with ThreadPool(min(BULK_RESOLVE_CONCURRENCY, len(candidates))) as pool:
+            resolving = [url for url, resolved in zip(candidates, pool.map(resolves, candidates)) if resolved]
+        log.debug(f"{len(resolving)} of {len(candidates)} new subdomains of {self.url} resolve.")
+        if not resolving:
+            return []
+
+        new_urls = []
+        for new_url in resolving:
+            extract = normalization.extract(new_url)
+            new_urls.append(
+                Url(
+                    url=new_url,
+                    internal_notes=internal_notes or None,
+                    computed_subdomain=extract.subdomain,
+                    computed_domain=extract.domain,
+                    computed_suffix=extract.suffix,
+                )
+            )
+
+        organization_ids = list(self.organization.all().values_list("id", flat=True))
+
+        with transaction.atomic():
+            Url.objects.bulk_create(new_urls, batch_size=500)
+
+            # not every database returns the ids of a bulk insert.
+            created_ids = list(
+                Url.objects.all().filter(url__in=resolving).exclude(url__in=existing).values_list("id", flat=True)
+            )
+
+            Url.organization.through.objects.bulk_create(
+                [
+                    Url.organization.through(url_id=url_id, organization_id=organization_id)
+                    for url_id in created_ids
+                    for organization_id in organization_ids
+                ],
+                batch_size=500,
+            )
+
+        log.info(f"Added {len(created_ids)} subdomains of {self.url} to {len(organization_ids)} organizations.")
+        return created_ids
+
     @staticmethod
     def is_valid_url(url: str):
-
-        # empty strings, etc
-        if not url:
-            log.debug("Domain is empty, so not valid.")
-            return False
-
-        extract = tldextract.extract(url)
-        if not extract.suffix:
-            log.debug("Domain has no suffix, so not valid.")
-            return False
-
-        # Validators catches 'most' invalid urls, but there are some issues and exceptions that are not really likely
-        # to cause any major issues in our software. The other alternative is another library with other quircks.
-        # see: https://github.com/kvesteri/validators/
-        # Note that this library does not account for 'idna' / punycode encoded domains, so you have to convert
-        # them yourself. luckily:
-        # 'аренда.орг' -> 'xn--80aald4bq.xn--c1avg'
-        # 'google.com' -> 'google.com'
-        try:
-            valid_domain = domain(url.encode("idna").decode())
-            if valid_domain is not True:
-                return False
-        except UnicodeError:
-            # encoding with 'idna' codec failed (UnicodeError: label empty or too long)
-            # .apple.com for example: this label is incorrect as it starts with a dot. You should sanitize this
-            # beforehand.
-            return False
-        return True
+        return normalization.is_valid_url(url)
 
     @staticmethod
     def add(url: str):
@@ -0,0 +1,86 @@
+"""
+Splitting and validating domain names, for every url that is saved, imported or discovered.
+
+Extraction uses the public suffix list that is shipped with tldextract, so nothing is downloaded or written to disk
+when the first url is extracted. Results are memoized: importers and subdomain discovery see the same domains over
+and over again.
+"""
+import logging
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional
+
+import tldextract
+from tldextract.tldextract import ExtractResult
+from validators import domain
+
+log = logging.getLogger(__package__)
+
+# The amount of distinct urls of which the extraction and validation are remembered.
+CACHE_SIZE = 100000
+
+# Offline: the bundled snapshot of the public suffix list is used instead of fetching the list over the network.
+offline_extract = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=None)
+
+
+class NormalizedUrl(NamedTuple):
+    url: str
+    subdomain: str
+    domain: str
+    suffix: str
+
+    @property
+    def registered_domain(self) -> str:
+        return f"{self.domain}.{self.suffix}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def extract(url: str) -> ExtractResult:
+    """Same as tldextract.extract, on the offline public suffix list."""
+    return offline_extract(url)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def is_valid_url(url: str) -> bool:
+    # empty strings, etc
+    if not url:
+        log.debug("Domain is empty, so not valid.")
+        return False
+
+    if not extract(url).suffix:
+        log.debug("Domain has no suffix, so not valid.")
+        return False
+
+    # Validators catches 'most' invalid urls, but there are some issues and exceptions that are not really likely
+    # to cause any major issues in our software. The other alternative is another library with other quircks.
+    # see: https://github.com/kvesteri/validators/
+    # Note that this library does not account for 'idna' / punycode encoded domains, so you have to convert
+    # them yourself. luckily:
+    # 'аренда.орг' -> 'xn--80aald4bq.xn--c1avg'
+    # 'google.com' -> 'google.com'
+    try:
+        return domain(url.encode("idna").decode()) is True
+    except UnicodeError:
+        # encoding with 'idna' codec failed (UnicodeError: label empty or too long)
+        # .apple.com for example: this label is incorrect as it starts with a dot. You should sanitize this
+        # beforehand.
+        return False
+
+
+def normalize(url: str) -> Optional[NormalizedUrl]:
+    """
+    Lowercases and strips a domain name, including the trailing dot of fully qualified names. Returns the parts of
+    the domain, or None if it is not a valid domain.
+    """
+    url = (url or "").strip().lower().rstrip(".")
+    if not is_valid_url(url):
+        return None
+
+    extracted = extract(url)
+    return NormalizedUrl(url, extracted.subdomain, extracted.domain, extracted.suffix)
+
+
+def normalize_many(urls: Iterable[str]) -> List[Optional[NormalizedUrl]]:
+    """Normalizes a list of urls, in the same order. Every distinct url is only normalized once."""
+    urls = list(urls)
+    normalized = {url: normalize(url) for url in set(urls)}
+    return [normalized[url] for url in urls]
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+import pytz
+from django.core.management import CommandError, call_command
+
+from websecmap.organizations.models import Organization, OrganizationType, Url
+from websecmap.reporting.models import UrlReport
+from websecmap.scanners.models import Endpoint, EndpointGenericScan
+
+LABELS = ["organizations.OrganizationType", "organizations.Organization", "organizations.Url", "scanners"]
+
+
+def test_bulk_dataset_roundtrip(db, tmp_path):
+    organization_type, _ = OrganizationType.objects.all().get_or_create(name="municipality")
+    organization = Organization.objects.create(name="Faaloniae", type=organization_type, country="NL")
+    url = Url.objects.create(url="faalonia.example")
+    url.organization.add(organization)
+    endpoint = Endpoint.objects.create(url=url, protocol="https", port=443, ip_version=4)
+    EndpointGenericScan.objects.create(
+        endpoint=endpoint,
+        type="tls_qualys_encryption_quality",
+        rating="A",
+        explanation="Good",
+        evidence="",
+        # microseconds have to survive the roundtrip
+        last_scan_moment=datetime(2021, 1, 1, 10, 30, 15, 123456, tzinfo=pytz.utc),
+        rating_determined_on=datetime(2021, 1, 1, 10, 30, 15, 123456, tzinfo=pytz.utc),
+    )
+
+    def snapshot():
+        return {
+            "organizations": list(Organization.objects.all().values()),
+            "urls": list(Url.objects.all().values()),
+            "memberships": list(Url.organization.through.objects.all().values()),
+            "endpoints": list(Endpoint.objects.all().values()),
+            "scans": list(EndpointGenericScan.objects.all().values()),
+        }
+
+    before = snapshot()
+    call_command("create_bulk_dataset", *LABELS, output=str(tmp_path))
+    assert (tmp_path / "manifest.json").exists()
+    assert (tmp_path / "organizations.Url.ndjson.gz").exists()
+
+    # data is only loaded in empty tables, unless asked otherwise
+    with pytest.raises(CommandError):
+        call_command("load_bulk_dataset", str(tmp_path))
+
+    EndpointGenericScan.objects.all().delete()
+    Endpoint.objects.all().delete()
+    Url.objects.all().delete()
+    Organization.objects.all().delete()
+    OrganizationType.objects.all().delete()
+
+    call_command("load_bulk_dataset", str(tmp_path))
+    assert snapshot() == before
+
+    call_command("load_bulk_dataset", str(tmp_path), replace=True)
+    assert snapshot() == before
+
+    # the sequences continue after the loaded ids
+    assert Url.objects.create(url="new.faalonia.example").id > url.id
+
+    # data outside the dataset that refers to replaced data prevents replacing
+    UrlReport.objects.create(url=url, at_when=datetime(2021, 1, 1, tzinfo=pytz.utc), calculation={})
+    with pytest.raises(CommandError, match="reporting.UrlReport"):
+        call_command("load_bulk_dataset", str(tmp_path), replace=True)
+    assert UrlReport.objects.all().count() == 1
@@ -1,5 +1,6 @@
 import websecmap
-from websecmap.organizations.models import Url
+from websecmap.organizations import normalization
+from websecmap.organizations.models import Organization, Url
 
 
 def test_add_subdomain(db):
@@ -32,3 +33,38 @@ def test_is_valid_url():
     # Works for domains that are actual domains:
     assert Url.is_valid_url("google.com") is True
     assert Url.is_valid_url("аренда.орг") is True
+
+
+def test_add_subdomains_bulk(db, monkeypatch):
+    monkeypatch.setattr(websecmap.scanners.scanner.http, "resolves", lambda url: not url.startswith("offline."))
+
+    organizations = [Organization.objects.create(name=name) for name in ["first", "second"]]
+    parent = Url.objects.create(url="example.nl")
+    parent.organization.add(*organizations)
+    Url.objects.create(url="existing.example.nl")
+
+    created = parent.add_subdomains_bulk(["WWW", "*.apps", "www", "existing", "offline", "-invalid", "", "mail."])
+
+    new_urls = Url.objects.all().filter(id__in=created).order_by("url")
+    assert [url.url for url in new_urls] == ["apps.example.nl", "mail.example.nl", "www.example.nl"]
+    for url in new_urls:
+        assert url.computed_subdomain == url.url.split(".")[0]
+        assert url.computed_domain == "example"
+        assert set(url.organization.all()) == set(organizations)
+
+    # adding the same names again does nothing
+    assert parent.add_subdomains_bulk(["www", "apps"]) == []
+    assert Url.objects.all().count() == 5
+
+
+def test_normalize_many():
+    normalization.extract.cache_clear()
+    normalization.is_valid_url.cache_clear()
+
+    normalized = normalization.normalize_many(["WWW.Example.co.uk.", "www.example.co.uk", ".espacenet.com", "", "nl"])
+    assert normalized[0] == normalized[1] == ("www.example.co.uk", "www", "example", "co.uk")
+    assert normalized[0].registered_domain == "example.co.uk"
+    assert normalized[2:] == [None, None, None]
+
+    # the same url is only extracted once
+    assert normalization.extract.cache_info().misses == 3
@@ -77,3 +77,12 @@ class UrlRatingAdmin(ImportExportModelAdmin, admin.ModelAdmin):
     ordering = ["-at_when"]
 
     save_as = True
+
+
+@admin.register(models.UrlReportSeverity)
+class UrlReportSeverityAdmin(admin.ModelAdmin):
+    list_display = ("url", "scan_type", "high", "medium", "low", "ok_urls", "ok_endpoints", "at_when")
+    search_fields = ("url__url", "scan_type")
+    list_filter = ("scan_type",)
+    raw_id_fields = ("url_report", "url")
+    ordering = ["-at_when"]
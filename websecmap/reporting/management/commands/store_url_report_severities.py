@@ -0,0 +1,40 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from websecmap.reporting.models import UrlReport, UrlReportSeverity
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores the severities per scan type of url reports that were made before these were stored automatically. "
+        "Can be stopped and started again, only reports without severities are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last_id = 0
+        processed = 0
+        while True:
+            reports = list(
+                UrlReport.objects.all()
+                .filter(id__gt=last_id, severities__isnull=True)
+                .only("id", "url_id", "at_when", "calculation")
+                .order_by("id")[0 : options["batch_size"]]
+            )
+            if not reports:
+                break
+
+            with transaction.atomic():
+                UrlReportSeverity.objects.bulk_create(
+                    [severity for report in reports for severity in UrlReportSeverity.from_url_report(report)]
+                )
+
+            last_id = reports[-1].id
+            processed += len(reports)
+            log.info(f"Stored severities of {processed} url reports, up to report {last_id}.")
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.13 on 2026-10-19 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("organizations", "0060_auto_20200908_1055"),
+        ("reporting", "0010_urlreport_is_the_newest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UrlReportSeverity",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("at_when", models.DateTimeField()),
+                ("scan_type", models.CharField(max_length=60)),
+                ("high", models.IntegerField(default=0, help_text="High issues, including explained ones.")),
+                ("medium", models.IntegerField(default=0)),
+                ("low", models.IntegerField(default=0)),
+                ("explained_high", models.IntegerField(default=0)),
+                ("explained_medium", models.IntegerField(default=0)),
+                ("explained_low", models.IntegerField(default=0)),
+                ("ok_urls", models.IntegerField(default=0)),
+                ("ok_endpoints", models.IntegerField(default=0)),
+                ("applicable_urls", models.IntegerField(default=0, help_text="The number of ratings on the url.")),
+                (
+                    "applicable_endpoints",
+                    models.IntegerField(default=0, help_text="The number of ratings on endpoints."),
+                ),
+                ("rating_determined_on", models.DateTimeField(help_text="The newest rating of this type.", null=True)),
+                ("last_scan_moment", models.DateTimeField(null=True)),
+                ("url", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="organizations.url")),
+                (
+                    "url_report",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="severities", to="reporting.urlreport"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Url Report Severity",
+                "verbose_name_plural": "Url Report Severities",
+            },
+        ),
+    ]
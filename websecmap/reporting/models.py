@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from jsonfield import JSONField
@@ -5,6 +8,34 @@ from jsonfield import JSONField
 from websecmap.organizations.models import Url
 
 
+class ReportQuerySet(models.QuerySet):
+    """
+    Url and organization reports store their numbers in columns, and a calculation with all scans. The calculation
+    can be megabytes per report, while most readers only need the numbers. Those readers use counters(), readers that
+    need the calculation ask for it explicitly.
+    """
+
+    def counters(self):
+        """The reports without their calculation. Reading the calculation of such a report costs a query per report."""
+        return self.defer("calculation")
+
+    def calculations(self) -> Dict[int, Any]:
+        """Only the calculations of the reports, by id."""
+        return dict(self.values_list("id", "calculation"))
+
+
+def report_columns(model, table: str, with_calculation: bool = False) -> str:
+    """
+    The columns of a report table for a raw query, without the calculation unless asked for. Columns missing from a
+    raw query are read with a query per report when used, so all other columns are included.
+    """
+    return ", ".join(
+        f"{table}.{field.column}"
+        for field in model._meta.concrete_fields
+        if with_calculation or field.name != "calculation"
+    )
+
+
 class AllIssuesCombined(models.Model):
     """
     This counts ALL issues of all endpoint genericscan and urlgenericscan for a series of URL or a URL report.
@@ -252,6 +283,8 @@ class SeriesOfUrlsReportMixin(
         "of this organization. This can be a lot."
     )  # calculations of the independent urls... and perhaps others?
 
+    objects = ReportQuerySet.as_manager()
+
     def __str__(self):
         if any([self.high, self.medium, self.low]):
             return "🔴%s 🔶%s 🍋%s | %s" % (
@@ -309,6 +342,8 @@ class UrlReport(
         blank=True,
     )
 
+    objects = ReportQuerySet.as_manager()
+
     class Meta:
         managed = True
         verbose_name = _("Url Report")
@@ -322,5 +357,99 @@ class UrlReport(
             self.at_when.date(),
         )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        # changing only the newest flag does not change the severities.
+        update_fields = kwargs.get("update_fields", None)
+        if update_fields is None or "calculation" in update_fields:
+            self.store_severities()
+
+    def store_severities(self):
+        UrlReportSeverity.objects.all().filter(url_report=self).delete()
+        UrlReportSeverity.objects.bulk_create(UrlReportSeverity.from_url_report(self))
+
+
+class UrlReportSeverity(models.Model):
+    """
+    The issues of a UrlReport summed per scan type. This is stored when a UrlReport is saved.
+
+    Statistics over many urls, such as improvements and vulnerability graphs, are sums over these rows. Otherwise the
+    calculation of every UrlReport would have to be read and decoded. The url and date of the report are copied, so
+    the latest report of a url is found without reading the reports.
+    """
+
+    url_report = models.ForeignKey(UrlReport, on_delete=models.CASCADE, related_name="severities")
+    url = models.ForeignKey(Url, on_delete=models.CASCADE)
+    at_when = models.DateTimeField()
+    scan_type = models.CharField(max_length=60)
+
+    high = models.IntegerField(default=0, help_text="High issues, including explained ones.")
+    medium = models.IntegerField(default=0)
+    low = models.IntegerField(default=0)
+    explained_high = models.IntegerField(default=0)
+    explained_medium = models.IntegerField(default=0)
+    explained_low = models.IntegerField(default=0)
+
+    ok_urls = models.IntegerField(default=0)
+    ok_endpoints = models.IntegerField(default=0)
+    applicable_urls = models.IntegerField(default=0, help_text="The number of ratings on the url.")
+    applicable_endpoints = models.IntegerField(default=0, help_text="The number of ratings on endpoints.")
+
+    rating_determined_on = models.DateTimeField(null=True, help_text="The newest rating of this type.")
+    last_scan_moment = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = _("Url Report Severity")
+        verbose_name_plural = _("Url Report Severities")
+
+    def __str__(self):
+        return "%s %s,%s,%s - %s" % (self.scan_type, self.high, self.medium, self.low, self.at_when.date())
+
+    @staticmethod
+    def from_url_report(url_report: UrlReport) -> List["UrlReportSeverity"]:
+        calculation = url_report.calculation or {}
+        ratings = [("url", rating) for rating in calculation.get("ratings", [])] + [
+            ("endpoint", rating) for endpoint in calculation.get("endpoints", []) for rating in endpoint["ratings"]
+        ]
+
+        severities = {}
+        for level, rating in ratings:
+            if rating["type"] not in severities:
+                severities[rating["type"]] = UrlReportSeverity(
+                    url_report=url_report,
+                    url_id=url_report.url_id,
+                    at_when=url_report.at_when,
+                    scan_type=rating["type"],
+                )
+            severity = severities[rating["type"]]
+
+            severity.high += rating["high"]
+            severity.medium += rating["medium"]
+            severity.low += rating["low"]
+            if rating.get("is_explained", False):
+                severity.explained_high += rating["high"]
+                severity.explained_medium += rating["medium"]
+                severity.explained_low += rating["low"]
+
+            if level == "url":
+                severity.ok_urls += rating["ok"]
+                severity.applicable_urls += 1
+            else:
+                severity.ok_endpoints += rating["ok"]
+                severity.applicable_endpoints += 1
+
+            severity.rating_determined_on = newest(severity.rating_determined_on, rating.get("since", ""))
+            severity.last_scan_moment = newest(severity.last_scan_moment, rating.get("last_scan", ""))
+
+        return list(severities.values())
+
+
+def newest(moment: Optional[datetime], isoformat: str) -> Optional[datetime]:
+    if not isoformat:
+        return moment
+    other = datetime.fromisoformat(isoformat)
+    return other if moment is None or other > moment else moment
+
 
 # todo: we can make a vulnerabilitystatistic per organization type or per tag. But not per country, list etc.
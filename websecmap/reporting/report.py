@@ -2,15 +2,16 @@ import logging
 from collections import defaultdict
 from copy import copy, deepcopy
 from datetime import datetime
-from typing import List, Union
+from typing import Dict, List, Union
 
 import pytz
-from django.db.models import Q
+from django.db.models import Max, Q, Sum
 
 from websecmap.app.constance import constance_cached_value
+from websecmap.app.instrumentation import count, phase
 from websecmap.celery import app
 from websecmap.organizations.models import Url
-from websecmap.reporting.models import UrlReport
+from websecmap.reporting.models import UrlReport, UrlReportSeverity, report_columns
 from websecmap.reporting.severity import get_severity
 from websecmap.scanners import ALL_SCAN_TYPES, ENDPOINT_SCAN_TYPES, URL_SCAN_TYPES
 from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
@@ -66,7 +67,8 @@ def recreate_url_report(url_id):
     # Creating a timeline and rating it is much faster than doing an individual calculation.
     # Mainly because it gets all data in just a few queries and then builds upon that.
     # Returns chronologically ordered url reports:
-    url_reports: List[Union[UrlReport, None]] = create_url_reports(url)
+    with phase("url_report.calculate"):
+        url_reports: List[Union[UrlReport, None]] = create_url_reports(url)
 
     # in cases where there is nothing to report at all.
     if not url_reports:
@@ -75,43 +77,44 @@ def recreate_url_report(url_id):
 
     # log.debug(url_reports)
 
-    # No new reports: the amount of items in the timeline(+rules) is the same as the existing reports.
-    amount_of_existing_reports = UrlReport.objects.all().filter(url=url_id).count()
-    if amount_of_existing_reports == len(url_reports):
-        log.debug(f"There are no new reports for {url.url}. Updating the latest one to contain latest scan info.")
-        # latest and last() are equivalent because of the sequential nature of adding reports to the database.
-        # Comparison on an integer is faster, so we're using last().
-        latest_report = UrlReport.objects.all().filter(url=url_id).last()
-        if not latest_report.is_the_newest:
-            # A bug introduced before made dead / not_resolvable ursl not the latest:
-            if not url.is_dead and not url.not_resolvable:
-                # Do not create exception in this case. But note it in the logs that something is wrong.
-                # This needs to be adressed manually probably for each case till a bug is found.
-                log.error(
-                    "Attempting to delete not the latest report, this should not occur!",
-                    extra={"url": url.url, "report_id": latest_report.id},
-                )
-        latest_report.delete()
-        # [1, 2, 3][-1:].pop()
-        new_latest_report = url_reports[-1:].pop()
-        new_latest_report.save()
-    else:
-        # There are new reports, at least one. See how many are new and add them.
-        # As there can be many scans a day, there will probably be many reports created that day.
-        amount_of_new_reports = len(url_reports) - amount_of_existing_reports
-        log.debug(f"Adding {amount_of_new_reports} to {url.url}.")
-
-        # The current latest report isn't the latest anymore:
-        latest_report = UrlReport.objects.all().filter(url=url_id).last()
-        if latest_report:
-            latest_report.is_the_newest = False
-            latest_report.save()
-
-        # the last N new_reports are probably actually new and should be added to the database. All prior reports
-        # are kept as is. Should only save the few new scans of today.
-        new_reports = url_reports[-amount_of_new_reports:]
-        for new_report in new_reports:
-            new_report.save()
+    with phase("url_report.save"):
+        # No new reports: the amount of items in the timeline(+rules) is the same as the existing reports.
+        amount_of_existing_reports = UrlReport.objects.all().filter(url=url_id).count()
+        if amount_of_existing_reports == len(url_reports):
+            log.debug(f"There are no new reports for {url.url}. Updating the latest one to contain latest scan info.")
+            # latest and last() are equivalent because of the sequential nature of adding reports to the database.
+            # Comparison on an integer is faster, so we're using last().
+            latest_report = UrlReport.objects.all().filter(url=url_id).counters().last()
+            if not latest_report.is_the_newest:
+                # A bug introduced before made dead / not_resolvable ursl not the latest:
+                if not url.is_dead and not url.not_resolvable:
+                    # Do not create exception in this case. But note it in the logs that something is wrong.
+                    # This needs to be adressed manually probably for each case till a bug is found.
+                    log.error(
+                        "Attempting to delete not the latest report, this should not occur!",
+                        extra={"url": url.url, "report_id": latest_report.id},
+                    )
+            latest_report.delete()
+            # [1, 2, 3][-1:].pop()
+            new_latest_report = url_reports[-1:].pop()
+            new_latest_report.save()
+        else:
+            # There are new reports, at least one. See how many are new and add them.
+            # As there can be many scans a day, there will probably be many reports created that day.
+            amount_of_new_reports = len(url_reports) - amount_of_existing_reports
+            log.debug(f"Adding {amount_of_new_reports} to {url.url}.")
+
+            # The current latest report isn't the latest anymore:
+            latest_report = UrlReport.objects.all().filter(url=url_id).counters().last()
+            if latest_report:
+                latest_report.is_the_newest = False
+                latest_report.save(update_fields=["is_the_newest"])
+
+            # the last N new_reports are probably actually new and should be added to the database. All prior reports
+            # are kept as is. Should only save the few new scans of today.
+            new_reports = url_reports[-amount_of_new_reports:]
+            for new_report in new_reports:
+                new_report.save()
 
     # Old logic of just deleting everything and saving it (not even in bulk)
     # UrlReport.objects.all().filter(url=url).delete()
@@ -416,7 +419,9 @@ def latest_moment_of_datetime(datetime_: datetime):
 
 
 def create_url_reports(url: Url) -> List[UrlReport]:
-    timeline = create_timeline(url)
+    with phase("url_report.timeline"):
+        timeline = create_timeline(url)
+    count("url_report.moments", len(timeline))
     url_reports: List[Union[UrlReport, None]] = []
 
     """
@@ -1182,10 +1187,13 @@ def get_latest_urlratings_fast(urls: List[Url], when):
     chunks = in_chunks(urls, 100)
     results = []
     for chunk in chunks:
-        # get all columns, instead of naming each of the 20 columns separately, and having the chance that you missed
-        # one and then django performs a separate lookup query for that value (a few times).
+        # get all columns of the report, instead of naming each of the 20 columns separately, and having the chance
+        # that you missed one and then django performs a separate lookup query for that value (a few times).
+        # The calculation is needed to aggregate the url reports into an organization report.
         sql = (
-            """SELECT *
+            """SELECT """
+            + report_columns(UrlReport, "reporting_urlreport", with_calculation=True)
+            + """
                     FROM reporting_urlreport
                     INNER JOIN
                       (SELECT MAX(id) as id2 FROM reporting_urlreport or2
@@ -1216,7 +1224,14 @@ def relevant_urls_at_timepoint(queryset, when: datetime):
     # if you want to see what's going on, see relevant_urls_at_timepoint
     # removed the IN query to gain some extra speed
     # returned a flat list of pk's, since we don't do anything else with these urls. It's not particulary faster.
-    both = (
+    both = relevant_urls_at_timepoint_queryset(queryset, when)
+    # print(both.query)
+    return list(set(both))
+
+
+def relevant_urls_at_timepoint_queryset(queryset, when: datetime):
+    """The query of relevant_urls_at_timepoint, which can be used as a subquery. It can contain the same id twice."""
+    return (
         queryset.filter(
             # resolvable_in_the_past
             Q(created_on__lte=when, not_resolvable=True, not_resolvable_since__gte=when)
@@ -1237,5 +1252,43 @@ def relevant_urls_at_timepoint(queryset, when: datetime):
         )
         .values_list("id", flat=True)
     )
-    # print(both.query)
-    return list(set(both))
+
+
+def latest_url_reports(when: datetime, urls=None):
+    """
+    Subquery with the id of the latest url report of every url at a moment, optionally limited to some urls.
+    These are the same reports as get_latest_urlratings_fast returns, without reading them.
+    """
+    reports = UrlReport.objects.all().filter(at_when__lte=when)
+    if urls is not None:
+        reports = reports.filter(url__in=urls)
+    return reports.order_by().values("url_id").annotate(latest=Max("id")).values("latest")
+
+
+def severities_per_scan_type(url_reports) -> Dict[str, Dict[str, int]]:
+    """
+    Sums the issues of url reports per scan type, using the stored UrlReportSeverity.
+
+    :param url_reports: ids or a subquery of url reports, for example from latest_url_reports.
+    :return: {scan_type: {"high": 1, "medium": 0, "low": 0, "ok_urls": 1, ...}}
+    """
+    fields = [
+        "high",
+        "medium",
+        "low",
+        "explained_high",
+        "explained_medium",
+        "explained_low",
+        "ok_urls",
+        "ok_endpoints",
+        "applicable_urls",
+        "applicable_endpoints",
+    ]
+    sums = (
+        UrlReportSeverity.objects.all()
+        .filter(url_report__in=url_reports)
+        .order_by("scan_type")
+        .values("scan_type")
+        .annotate(**{f"sum_{field}": Sum(field) for field in fields})
+    )
+    return {row["scan_type"]: {field: row[f"sum_{field}"] for field in fields} for row in sums}
@@ -7,11 +7,13 @@ This file contains (or should) verbose explantion of why points are given.
 import json
 import logging
 from datetime import datetime
-from typing import Union, Any, Dict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Union
 
 import pytz
 from django.conf import settings
 
+from websecmap.app.instrumentation import timed
 from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
 
 log = logging.getLogger(__package__)
@@ -667,9 +669,84 @@ calculation_methods = {
 }
 
 
-# @lru_cache(maxsize=128)
+# The scan fields, besides the type, that determine the outcome of each calculation method. The rating_determined_on
+# and last_scan_moment are copied to every calculation, and so is the evidence as technical details of internet.nl.
+CALCULATION_INPUTS = {
+    get_security_header_calculation: ["rating", "explanation"],
+    plain_https: ["explanation"],
+    ftp: ["rating", "explanation"],
+    DNSSEC: ["rating", "explanation"],
+    tls_qualys_certificate_trusted: ["rating", "explanation"],
+    tls_qualys_encryption_quality: ["rating", "explanation"],
+    dummy_calculated_values: [],
+    internet_nl_requirement_tilde_value_format: ["rating", "explanation"],
+    internet_nl_generic_boolean_value: ["rating", "explanation"],
+    internet_nl_score: ["rating", "evidence"],
+}
+
+
+class SeverityTable:
+    """
+    Remembers the outcome of the calculation methods per distinct input. Most scans share their inputs with many
+    other scans: there are only so many ratings and explanations. The remembered calculations are shared between
+    scans, and are therefore read only.
+
+    The table is emptied when it is full, as some inputs, such as internet.nl scores, are almost unique per scan.
+    """
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self.calculations: Dict[tuple, Mapping[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, scan: Union[EndpointGenericScan, UrlGenericScan]) -> Mapping[str, Any]:
+        calculation_method = calculation_methods.get(scan.type, None)
+        if not calculation_method:
+            raise ValueError("No calculation available for this scan type: %s" % scan.type)
+
+        key = (scan.type, *[getattr(scan, field) for field in CALCULATION_INPUTS[calculation_method]])
+        calculation = self.calculations.get(key, None)
+        if calculation is not None:
+            self.hits += 1
+            return calculation
+
+        self.misses += 1
+        calculation = calculation_method(scan)
+        if not calculation:
+            raise ValueError(f"No calculation created for scan {scan.type}")
+
+        if len(self.calculations) >= self.max_size:
+            self.calculations.clear()
+        self.calculations[key] = MappingProxyType(calculation)
+        return self.calculations[key]
+
+    def statistics(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.calculations)}
+
+    def clear(self):
+        self.calculations.clear()
+        self.hits, self.misses = 0, 0
+
+
+severity_table = SeverityTable()
+
+
+@timed("severity")
 def get_severity(scan: Union[EndpointGenericScan, UrlGenericScan]) -> Dict[str, Any]:
-    # Can be probably more efficient by adding some methods to scan.
+    calculation = dict(severity_table.lookup(scan))
+
+    # The moments and evidence differ per scan, even when the outcome is the same.
+    calculation["since"] = scan.rating_determined_on.isoformat()
+    calculation["last_scan"] = scan.last_scan_moment.isoformat()
+    if "technical_details" in calculation:
+        calculation["technical_details"] = scan.evidence
+
+    return add_comply_or_explain(calculation, scan)
+
+
+def calculate_severity(scan: Union[EndpointGenericScan, UrlGenericScan]) -> Dict[str, Any]:
+    """Same as get_severity, without the severity table. Used to verify the table."""
     if not calculation_methods.get(scan.type, None):
         raise ValueError("No calculation available for this scan type: %s" % scan.type)
 
@@ -678,6 +755,10 @@ def get_severity(scan: Union[EndpointGenericScan, UrlGenericScan]) -> Dict[str,
     if not calculation:
         raise ValueError(f"No calculation created for scan {scan.type}")
 
+    return add_comply_or_explain(calculation, scan)
+
+
+def add_comply_or_explain(calculation: Dict[str, Any], scan: Union[EndpointGenericScan, UrlGenericScan]):
     # handle comply or explain
     # only when an explanation is given AND the explanation is still valid when creating the report.
     calculation["is_explained"] = scan.comply_or_explain_is_explained
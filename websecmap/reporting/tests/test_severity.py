@@ -1,6 +1,16 @@
 from datetime import datetime
+from itertools import product
 
-from websecmap.reporting.severity import standard_calculation_for_internet_nl
+import pytz
+import pytest
+
+from websecmap.reporting.severity import (
+    calculate_severity,
+    calculation_methods,
+    get_severity,
+    severity_table,
+    standard_calculation_for_internet_nl,
+)
 from websecmap.scanners.models import EndpointGenericScan
 
 
@@ -51,3 +61,53 @@ def test_internet_nl_standard_calculation(db):
         "error_in_test": False,
         "test_result": 0,
     }
+
+
+def test_severity_table_is_identical_to_calculation():
+    severity_table.clear()
+
+    ratings = [
+        *["True", "False", "Unreachable", "RESTRICTED", "UNKNOWN", "SOAP", "Using CSP", "0", "1"],
+        *["outdated", "insecure", "unknown", "ERROR", "trusted", "not trusted", "scan_error", "F", "B", "A+"],
+        *["passed", "failed", "warning", "info", "not_tested", "error", "not_applicable", "untestable", "no_mx"],
+        *["required~failed", "recommended~failed", "optional~failed", "observed_state~passed", "required~passed"],
+        *["100", "95", "75", "12"],
+    ]
+    explanations = [
+        "Site does not redirect to secure url, and has no secure alternative on a standard port.",
+        "Security Header not present: Strict-Transport-Security, yet offers no insecure http service.",
+        '{"translation": "detail web tls version label"}',
+        "",
+    ]
+
+    compared = 0
+    for moment in [datetime(2020, 1, 1, tzinfo=pytz.utc), datetime(2021, 1, 1, tzinfo=pytz.utc)]:
+        for scan_type, rating, explanation in product(calculation_methods.keys(), ratings, explanations):
+            scan = EndpointGenericScan(
+                pk=compared,
+                type=scan_type,
+                rating=rating,
+                explanation=explanation,
+                evidence=f"evidence of {compared}",
+                rating_determined_on=moment,
+                last_scan_moment=moment,
+                comply_or_explain_is_explained=compared % 2 == 0,
+                comply_or_explain_explanation_valid_until=moment,
+            )
+            try:
+                expected = calculate_severity(scan)
+            except (ValueError, KeyError):
+                # unsupported ratings stay unsupported
+                with pytest.raises((ValueError, KeyError)):
+                    get_severity(scan)
+                continue
+
+            assert get_severity(scan) == expected
+            assert list(get_severity(scan).keys()) == list(expected.keys())
+            compared += 1
+
+    # the same inputs are only calculated once, also when scanned at another moment
+    statistics = severity_table.statistics()
+    assert compared > 1000
+    assert statistics["hits"] >= compared
+    assert statistics["size"] <= compared / 2
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytz
+from django.utils import timezone
+
+from websecmap.map.logic.improvements import get_improvements
+from websecmap.map.logic.stats_and_graphs import what_to_improve
+from websecmap.map.models import Configuration, VulnerabilityStatistic
+from websecmap.map.report import calculate_vulnerability_statistics
+from websecmap.organizations.models import Organization, OrganizationType, Url
+from websecmap.reporting.models import UrlReport, UrlReportSeverity
+from websecmap.reporting.report import latest_url_reports, recreate_url_report, severities_per_scan_type
+from websecmap.scanners.models import Endpoint, EndpointGenericScan
+
+
+def create_scanned_url(organization, name, scans):
+    url = Url.objects.create(url=name)
+    url.organization.add(organization)
+    Url.objects.all().filter(id=url.id).update(created_on=datetime(2020, 1, 1, tzinfo=pytz.utc))
+    endpoint = Endpoint.objects.create(
+        url=url, protocol="https", port=443, ip_version=4, discovered_on=datetime(2020, 1, 1, tzinfo=pytz.utc)
+    )
+
+    for rating, moment, is_explained in scans:
+        EndpointGenericScan.objects.create(
+            endpoint=endpoint,
+            type="tls_qualys_encryption_quality",
+            rating=rating,
+            explanation="",
+            rating_determined_on=moment,
+            last_scan_moment=moment,
+            comply_or_explain_is_explained=is_explained,
+            comply_or_explain_explanation_valid_until=datetime(2030, 1, 1, tzinfo=pytz.utc) if is_explained else None,
+        )
+
+    recreate_url_report(url.id)
+
+
+def test_url_report_severities(db):
+    municipality, _ = OrganizationType.objects.all().get_or_create(name="municipality")
+    organization = Organization.objects.create(name="Faalonië", type=municipality, country="NL")
+    january, february = datetime(2020, 1, 10, tzinfo=pytz.utc), datetime(2020, 2, 10, tzinfo=pytz.utc)
+
+    create_scanned_url(organization, "fixed.example", [("F", january, False), ("A", february, False)])
+    create_scanned_url(organization, "explained.example", [("F", january, True)])
+    create_scanned_url(organization, "broken.example", [("F", february, False)])
+
+    # every report has its severities stored
+    assert UrlReportSeverity.objects.count() == UrlReport.objects.count() == 4
+
+    severities = severities_per_scan_type(latest_url_reports(datetime(2020, 1, 31, tzinfo=pytz.utc)))
+    assert severities["tls_qualys_encryption_quality"]["high"] == 2
+    assert severities["tls_qualys_encryption_quality"]["explained_high"] == 1
+    assert severities["tls_qualys_encryption_quality"]["applicable_endpoints"] == 2
+
+    severities = severities_per_scan_type(latest_url_reports(datetime(2020, 3, 1, tzinfo=pytz.utc)))
+    assert severities["tls_qualys_encryption_quality"]["high"] == 2
+    assert severities["tls_qualys_encryption_quality"]["ok_endpoints"] == 1
+
+    # explained and fixed issues do not have to be improved
+    improve = what_to_improve("NL", "municipality", "tls_qualys_encryption_quality")
+    assert [(item["url_url"], item["severity"]) for item in improve] == [("broken.example", "high")]
+    assert improve[0]["rating_determined_on"] == february
+
+    # from the end of january till now, one url has been fixed and another one broke.
+    weeks = (timezone.now() - datetime(2020, 1, 31, tzinfo=pytz.utc)).days // 7
+    changes = get_improvements("NL", "municipality", 0, weeks)
+    assert changes["tls_qualys_encryption_quality"]["old"]["high"] == 2
+    assert changes["tls_qualys_encryption_quality"]["new"]["high"] == 2
+    assert changes["overall"]["improvements"]["high"] == 0
+
+    # the vulnerability graphs are sums over the same severities
+    Configuration.objects.create(country="NL", organization_type=municipality, is_reported=True)
+    calculate_vulnerability_statistics(days=1)
+    statistic = VulnerabilityStatistic.objects.get(scan_type="tls_qualys_encryption_quality")
+    assert (statistic.high, statistic.ok, statistic.endpoints, statistic.urls) == (2, 1, 3, 0)
+    total = VulnerabilityStatistic.objects.get(scan_type="total")
+    assert (total.high, total.urls, total.endpoints) == (2, 3, 3)
@@ -466,3 +466,11 @@ class PlannedScanStatisticAdmin(ImportExportModelAdmin, admin.ModelAdmin):
     list_display = ("at_when", "data")
     list_filter = ["at_when"][::-1]
     fields = ("at_when", "data")
+
+
+@admin.register(models.CertificateTransparencyCache)
+class CertificateTransparencyCacheAdmin(ImportExportModelAdmin, admin.ModelAdmin):
+    list_display = ("url", "last_certificate_id", "last_discovery")
+    search_fields = ("url__url",)
+    list_filter = ["last_discovery"]
+    fields = ("url", "last_certificate_id", "known_subdomains", "pending_subdomains", "last_discovery")
@@ -1,93 +1,138 @@
+import logging
 from datetime import timedelta
+from typing import Any, Callable, Dict, List
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
 
 from websecmap.scanners.models import Endpoint, EndpointGenericScan, Screenshot
-import logging
 
 log = logging.getLogger(__package__)
 
+"""
+Endpoints are sometimes created again while the same endpoint already exists or existed recently. For example during
+a dns outage: the endpoint dies and a new, identical, endpoint is discovered when the dns is restored. These identical
+endpoints are merged into the oldest endpoint, which receives the scans and screenshots of the newer endpoints and
+the life state (is_dead, is_dead_since, is_dead_reason) of the newest one.
 
-def deduplicate_all_endpoints_sequentially(days: int = 60):
-    """
-    This iterates over all endpoints from new to old and removes the newest stuff if the older endpoint exists.
-    This assumes that you can have gaps between endpoint detection of N days, those gaps will be closed.
+Identical endpoints share the url, protocol, port and ip_version. All endpoints are read in a single ordered query
+and grouped per identity. Which endpoints in a group are merged is decided by a rule, which makes it possible to use
+the same mechanism for both deduplication and cleaning short outages. The merges are performed with a few updates per
+batch of merges, each batch in its own transaction.
+"""
 
-    It will move stuff to the older endpoint and delete the newest endpoint.
+IDENTITY = ["url_id", "protocol", "port", "ip_version"]
+STATE = ["is_dead", "is_dead_since", "is_dead_reason"]
 
-    It's not the fastest algorithm, but it's easy to understand and maintain. That helps a lot :)
+
+def deduplicate_endpoints(days: int = 60, dry_run: bool = False, batch_size: int = 100) -> List[Dict[str, Any]]:
+    """
+    Merges every endpoint into the older identical endpoint, if that was discovered at most N days earlier. This
+    closes gaps of N days in endpoint detection.
 
     Days: the amount of days between the current endpoint and the last endpoint. This is the maximum gap that will
     be merged.
     """
 
-    # Iterate over all endpoints from new to old. So all endpoints exist. id descending, newest first.
-    for endpoint in Endpoint.objects.all().order_by("-discovered_on"):
-        log.info(f"Attempting to deduplicate: {endpoint}")
-        # Always fetch the latest endpoint state, because it might have been changed by an update.
-        fresh_endpoint = Endpoint.objects.all().filter(id=endpoint.id).first()
-        if not fresh_endpoint:
-            continue
-        reduce_if_duplicate_endpoint(fresh_endpoint, days)
-    log.info("done")
+    def recently_discovered(merge, endpoint):
+        return endpoint["discovered_on"] - merge["newest"]["discovered_on"] <= timedelta(days=days)
 
+    return merge_identical_endpoints(recently_discovered, dry_run, batch_size)
 
-def reduce_if_duplicate_endpoint(endpoint: Endpoint, days: int = 60):
-    # Do just one pass: if there is an older endpoint, remove the current one and switch to the older one.
-    # Copy the state of the current one to the older one so it's probably alive.
-    older_endpoint = get_older_duplicate_endpoint(endpoint, within_days=days)
-    if not older_endpoint:
-        log.info(f"No older endpoint exists for {endpoint} in the last {days} days.")
-        return
 
-    log.info(f"Going to transfer data from {endpoint} to {older_endpoint}.")
-    # Move all the older stuff to the older endpoint, but set the older endpoint to the current state.
-    # This will make the endpoint alive, probably, as that is most likely to be the current state.
-    # Afterwards this endpoint becomes useless and can be deleted.
-    # When transitioning all scans of this endpoint, there might be duplicates, where the older might
-    # have explanations already.
-    transfer_endpoint_data(fromm=endpoint, to=older_endpoint)
-    transfer_endpoint_state(fromm=endpoint, to=older_endpoint)
-    # deduplicate_scans(older_endpoint)
-    delete_endpoint(endpoint)
+def merge_short_outages(days: int = 7, dry_run: bool = False, batch_size: int = 100) -> List[Dict[str, Any]]:
+    """
+    Merges endpoints into a dead identical endpoint, if they were discovered within N days after that endpoint died.
+    No scanner takes more than a week: dead on january 14 means that identical endpoints discovered before january 21
+    are actually the same endpoint.
+    """
 
+    def discovered_after_outage(merge, endpoint):
+        state = merge["newest"]
+        if not state["is_dead"] or not state["is_dead_since"]:
+            return False
+        return state["is_dead_since"] <= endpoint["discovered_on"] <= state["is_dead_since"] + timedelta(days=days)
 
-def delete_endpoint(endpoint: Endpoint):
-    endpoint.delete()
+    return merge_identical_endpoints(discovered_after_outage, dry_run, batch_size)
 
 
-def transfer_endpoint_data(fromm: Endpoint, to: Endpoint):
-    updated = EndpointGenericScan.objects.all().filter(endpoint=fromm).update(endpoint=to)
-    log.info(updated)
-    Screenshot.objects.all().filter(endpoint=fromm).update(endpoint=to)
+def merge_identical_endpoints(
+    belongs_to: Callable[[dict, dict], bool], dry_run: bool = False, batch_size: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    Plans and performs the merges. Returns a report of merges: the endpoint that is kept and the ones merged into it.
+    With dry_run the report is created, but nothing is changed.
+    """
+    merges = plan_merges(belongs_to)
 
+    log.info(f"Found {sum(len(merge['merged']) for merge in merges)} endpoints to merge into {len(merges)} endpoints.")
 
-def transfer_endpoint_state(fromm: Endpoint, to: Endpoint):
-    to.is_dead = fromm.is_dead
-    to.is_dead_since = fromm.is_dead_since
-    to.is_dead_reason = fromm.is_dead_reason
-    to.save()
+    report = [{"into": merge["into"], "merged": merge["merged"], "state": merge["state"]} for merge in merges]
+    if dry_run:
+        return report
 
+    for start in range(0, len(report), batch_size):
+        perform_merges(report[start : start + batch_size])
+        log.debug(f"Merged {min(start + batch_size, len(report))}/{len(report)}.")
 
-def get_older_duplicate_endpoint(endpoint, within_days: int = 60):
-    # Determine if there is an older duplicate endpoint. If that exists, then return it.
+    return report
 
-    # No discovery date, doesn't make sense, can't deal with that.
-    if endpoint.discovered_on is None:
-        return None
 
-    return (
+def plan_merges(belongs_to: Callable[[dict, dict], bool]) -> List[Dict[str, Any]]:
+    # Endpoints without a discovery date can't be compared in time and are left alone.
+    endpoints = (
         Endpoint.objects.all()
-        .filter(
-            url=endpoint.url,
-            protocol=endpoint.protocol,
-            port=endpoint.port,
-            ip_version=endpoint.ip_version,
-            # can only be newer than N days
-            discovered_on__gte=endpoint.discovered_on - timedelta(days=within_days),
-            # has to be older, can't be newer than yourself.
-            discovered_on__lte=endpoint.discovered_on,
-        )
-        .exclude(pk=endpoint.pk)
-        # id descending, so the newest one first.
-        .order_by("-discovered_on")
-        .first()
+        .filter(discovered_on__isnull=False)
+        .order_by(*IDENTITY, "discovered_on", "id")
+        .values("id", "discovered_on", *IDENTITY, *STATE)
+    )
+
+    merges = []
+    identity, open_merges = None, []
+    for endpoint in endpoints.iterator():
+        if [endpoint[field] for field in IDENTITY] != identity:
+            identity, open_merges = [endpoint[field] for field in IDENTITY], []
+
+        # From old to new: an endpoint joins the first (oldest) earlier endpoint it belongs to.
+        merge = next((merge for merge in open_merges if belongs_to(merge, endpoint)), None)
+        if not merge:
+            open_merges.append({"into": endpoint["id"], "merged": [], "newest": endpoint})
+            continue
+
+        merge["merged"].append(endpoint["id"])
+        merge["newest"] = endpoint
+        if len(merge["merged"]) == 1:
+            merges.append(merge)
+
+    for merge in merges:
+        merge["state"] = {field: merge["newest"][field] for field in STATE}
+
+    return merges
+
+
+@transaction.atomic
+def perform_merges(merges: List[Dict[str, Any]]):
+    into = Case(
+        *[When(endpoint_id__in=merge["merged"], then=Value(merge["into"])) for merge in merges],
+        output_field=IntegerField(),
+    )
+    merged = [endpoint_id for merge in merges for endpoint_id in merge["merged"]]
+
+    EndpointGenericScan.objects.all().filter(endpoint_id__in=merged).update(endpoint_id=into)
+    Screenshot.objects.all().filter(endpoint_id__in=merged).update(endpoint_id=into)
+
+    # The kept endpoint gets the state of the newest endpoint, which is most likely the current state.
+    Endpoint.objects.bulk_update(
+        [Endpoint(id=merge["into"], **merge["state"]) for merge in merges], fields=STATE, batch_size=500
+    )
+
+    Endpoint.objects.all().filter(id__in=merged).delete()
+
+
+def describe_merges(merges: List[Dict[str, Any]], dry_run: bool = False) -> str:
+    lines = [f"Endpoint {merge['into']} <- {', '.join(str(merged) for merged in merge['merged'])}" for merge in merges]
+    lines.append(
+        f"{'Would merge' if dry_run else 'Merged'} {sum(len(merge['merged']) for merge in merges)} endpoints "
+        f"into {len(merges)} endpoints."
     )
+    return "\n".join(lines)
@@ -1,31 +1,40 @@
 import json
-import os
 from collections import defaultdict
+from datetime import datetime
+from itertools import groupby
 from logging import getLogger
+from typing import Any, Dict, Iterator, Tuple
 
 from constance import config
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
 from websecmap.map.report import PUBLISHED_ENDPOINT_SCAN_TYPES, PUBLISHED_URL_SCAN_TYPES
+from websecmap.organizations.models import Url
 from websecmap.reporting.severity import get_severity
-from websecmap.scanners.models import Endpoint, EndpointGenericScan
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
 
 log = getLogger(__package__)
 
+IMPACTS = ["high", "medium", "low", "good"]
 
-def report_impact_to_commandline():
-    print(json.dumps(calculate_impact(), indent=2))
 
+def report_impact_to_commandline(**kwargs):
+    print(json.dumps(calculate_impact(**kwargs), indent=2))
 
-# todo: add DNSSEC(!)
 
-
-def calculate_impact():
+def calculate_impact(
+    country: str = None, layer: str = "municipality", since: datetime = None, until: datetime = None
+) -> Dict[str, Any]:
     """
     Based on scans: the first and the last measurement, calculates numbers on how much has changed. It takes
-    into account how much endpoints / urls are deleted. This script is slow, but also simple. This simplicty
-    makes it easy to understand and maintain.
-    It does not understand organizations and other hierarchy (yet).
-    https://stackoverflow.com/questions/59006602/dyld-library-not-loaded-usr-local-opt-openssl-lib-libssl-1-0-0-dylib
+    into account how much endpoints / urls are deleted. It does not understand organizations and other hierarchy (yet).
+
+    Only alive endpoints and urls of the organizations in the country and layer are taken into account. The first
+    measurement is the state at the start of the period: the newest scan before since, or the oldest scan in the
+    period. The last measurement is the newest scan in the period. Explained scans are counted as good.
+
     Impact:
     {
         "metadata": {
@@ -52,6 +61,9 @@ def calculate_impact():
         }
     }
     """
+    country = country or config.PROJECT_COUNTRY
+    log.debug(f"Calculating impact for country: {country}, layer: {layer}, since: {since}, until: {until}.")
+
     impact = {
         "metadata": {
             # how many changes are recorded for these endpoints
@@ -65,114 +77,129 @@ def calculate_impact():
             "degradations": 0,
         },
         "scan_types": defaultdict(dict),
-        "total": {
-            "high": {"high": 0, "medium": 0, "low": 0, "good": 0},
-            "medium": {"high": 0, "medium": 0, "low": 0, "good": 0},
-            "low": {"high": 0, "medium": 0, "low": 0, "good": 0},
-            "good": {"high": 0, "medium": 0, "low": 0, "good": 0},
-        },
+        "total": transition_matrix(),
     }
-    published_scans = PUBLISHED_ENDPOINT_SCAN_TYPES + PUBLISHED_URL_SCAN_TYPES
-    # we'll ignore explanations
-    for scan_type in published_scans:
-        impact["scan_types"][scan_type] = {
-            "high": {"high": 0, "medium": 0, "low": 0, "good": 0},
-            "medium": {"high": 0, "medium": 0, "low": 0, "good": 0},
-            "low": {"high": 0, "medium": 0, "low": 0, "good": 0},
-            "good": {"high": 0, "medium": 0, "low": 0, "good": 0},
-        }
-    # count down id's, so there is some feeling on how long it will take.
-    log.debug(f"Calculating impact for country: {config.PROJECT_COUNTRY}.")
+
     # do not take endpoints that are "switching" on and off, only alive endpoints and urls
-    all_endpoints = (
-        Endpoint.objects.all()
-        .filter(
-            is_dead=False,
-            url__is_dead=False,
-            url__not_resolvable=False,
-            url__organization__country=config.PROJECT_COUNTRY,
-            url__organization__type__name="municipality",
-        )
-        .only("id")
-        .order_by("-id")
-    )
-    number_of_changes = (
-        EndpointGenericScan.objects.all()
-        .filter(
-            endpoint__is_dead=False,
-            endpoint__url__is_dead=False,
-            endpoint__url__not_resolvable=False,
-            endpoint__url__organization__country=config.PROJECT_COUNTRY,
-            endpoint__url__organization__type__name="municipality",
-        )
-        .only("id")
-    )
-    number_of_unique_changes = len(list(set(number_of_changes)))
-    impact["metadata"]["recorded_changes"] = number_of_unique_changes
-    number_of_current_scans = (
-        EndpointGenericScan.objects.all()
-        .filter(
-            endpoint__is_dead=False,
-            endpoint__url__is_dead=False,
-            endpoint__url__not_resolvable=False,
-            endpoint__url__organization__country=config.PROJECT_COUNTRY,
-            endpoint__url__organization__type__name="municipality",
-            is_the_latest_scan=True,
-        )
-        .only("id")
+    urls = Url.objects.all().filter(
+        is_dead=False, not_resolvable=False, organization__country=country, organization__type__name=layer
     )
-    unique_number_of_current_scans = len(list(set(number_of_current_scans)))
-    impact["metadata"]["amount_of_current_scans"] = unique_number_of_current_scans
+    endpoints = Endpoint.objects.all().filter(is_dead=False, url__in=urls.values("id"))
+
     # duplication because some urls are shared multiple times over organizations, for example rijksoverheid.nl
-    all_endpoints = list(set(all_endpoints))
-    amount_of_endpoints = len(all_endpoints)
-    impact["metadata"]["endpoints"] = amount_of_endpoints
-    for index, endpoint in enumerate(all_endpoints):
-        # log.debug(f"Endpoint {endpoint.id}")
-        for scan_type in published_scans:
-            # note that the "last" scan is the "oldest" scan (by id). The first scan is the newest.
-            first_scan = EndpointGenericScan.objects.all().filter(endpoint=endpoint, type=scan_type).last()
-            # possible that this scan type was not available for this endpoint:
-            if not first_scan:
-                continue
-            last_scan = EndpointGenericScan.objects.all().filter(endpoint=endpoint, type=scan_type).first()
-            # fully possible the first and last scan are the same. This does not show impact, skip it as it
-            # only creates double numbers and total amounts:
-            if first_scan == last_scan:
-                continue
-            severity_first = get_severity(first_scan)
-            severity_last = get_severity(last_scan)
-            # we also don't need to see the same severity, as nothing practically changed
-            if severity_first == severity_last:
-                continue
-            impact_first = get_impact(severity_first)
-            impact_last = get_impact(severity_last)
+    # is prevented by using subqueries instead of joins.
+    scans_per_model = [
+        EndpointGenericScan.objects.all().filter(
+            endpoint__in=endpoints.values("id"), type__in=PUBLISHED_ENDPOINT_SCAN_TYPES
+        ),
+        UrlGenericScan.objects.all().filter(url__in=urls.values("id"), type__in=PUBLISHED_URL_SCAN_TYPES),
+    ]
+
+    for scan_type in PUBLISHED_ENDPOINT_SCAN_TYPES + PUBLISHED_URL_SCAN_TYPES:
+        impact["scan_types"][scan_type] = transition_matrix()
+
+    for scans in scans_per_model:
+        if until:
+            scans = scans.filter(rating_determined_on__lte=until)
+
+        counts = scans.aggregate(
+            recorded_changes=Count("id", filter=Q(rating_determined_on__gte=since)) if since else Count("id"),
+            amount_of_current_scans=Count("id", filter=Q(is_the_latest_scan=True)),
+        )
+        for key, amount in counts.items():
+            impact["metadata"][key] += amount
+
+        for scan_type, impact_first, impact_last in first_and_last_impacts(scans, since):
+            # fully possible the first and last scan are the same or have the same severity. This does not show
+            # impact, skip it as it only creates double numbers and total amounts:
             if impact_first == impact_last:
                 continue
-            # log.debug(f"Adding 1 to: {scan_type}, {get_impact(severity_first)}, {get_impact(severity_last)}")
-            # print(f"scan_type {scan_type} on endpoint {endpoint.id} "
-            #       f"{'improved' if is_improved(impact_first, impact_last) else 'degraded'} from "
-            #       f"{impact_first} to {impact_last}.")
+
             impact["scan_types"][scan_type][impact_first][impact_last] += 1
+            impact["total"][impact_first][impact_last] += 1
             impact["metadata"]["changes"] += 1
             if is_improved(impact_first, impact_last):
                 impact["metadata"]["improvements"] += 1
             else:
                 impact["metadata"]["degradations"] += 1
-        # also shows on the first round, with the first analysis, so the first round is not all 0's:
-        if index % 1000 == 0:
-            os.system("clear")
-            print(f"{round(index/amount_of_endpoints, 2) * 100}% = {index}/{amount_of_endpoints}.")
-            print(json.dumps(impact, indent=2))
-    # now create a total:
-    gradations = ["high", "medium", "low", "good"]
-    for scan_type in published_scans:
-        for gradation in gradations:
-            for subgradations in gradations:
-                impact["total"][gradation][subgradations] += impact["scan_types"][scan_type][gradation][subgradations]
+
+    impact["metadata"]["endpoints"] = endpoints.count()
     return impact
 
 
+def transition_matrix() -> Dict[str, Dict[str, int]]:
+    return {first: {last: 0 for last in IMPACTS} for first in IMPACTS}
+
+
+def first_and_last_impacts(scans, since: datetime = None) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yields the type and the impact of the first and the last scan of every type of every endpoint or url, with a
+    single query.
+
+    The scans are numbered per endpoint or url, per type and per period: before since, and since. The newest scan
+    before since is the first measurement, when there is none the oldest scan since is. The newest scan since is the
+    last measurement. Django can not filter on a window function, so the numbered scans are used as a subquery.
+    """
+    subject = "endpoint_id" if scans.model == EndpointGenericScan else "url_id"
+    is_before = Value(0, output_field=IntegerField())
+    if since:
+        is_before = Case(When(rating_determined_on__lt=since, then=Value(1)), default=is_before)
+    numbered = scans.annotate(
+        is_before=is_before,
+        newest_first=Window(
+            expression=RowNumber(),
+            partition_by=[F(subject), F("type"), F("is_before")],
+            order_by=[F("rating_determined_on").desc(), F("id").desc()],
+        ),
+        oldest_first=Window(
+            expression=RowNumber(),
+            partition_by=[F(subject), F("type"), F("is_before")],
+            order_by=[F("rating_determined_on").asc(), F("id").asc()],
+        ),
+    ).values("id", "is_before", "newest_first", "oldest_first")
+
+    sql, params = numbered.query.sql_with_params()
+    measurements = (
+        scans.model.objects.all()
+        .filter(
+            id__in=RawSQL(
+                f"SELECT numbered.id FROM ({sql}) numbered "
+                "WHERE numbered.newest_first = 1 OR (numbered.oldest_first = 1 AND numbered.is_before = 0)",
+                params,
+            )
+        )
+        .annotate(is_before=is_before)
+        .order_by(subject, "type", "-is_before", "rating_determined_on", "id")
+    )
+    # The impact is stored with the scan, only older scans might still have to be calculated: then the whole scan is
+    # read, so the severity is calculated without a query per scan. See the store_scan_severities command.
+    if not scans.filter(impact__isnull=True).exists():
+        measurements = measurements.only(
+            "id", subject, "type", "rating_determined_on", "impact", "comply_or_explain_is_explained"
+        )
+
+    for (_, scan_type), subject_scans in groupby(
+        measurements.iterator(), key=lambda scan: (getattr(scan, subject), scan.type)
+    ):
+        subject_scans = list(subject_scans)
+        # ordered: the newest scan before since, then the oldest and newest scan since.
+        if subject_scans[-1].is_before:
+            # nothing changed in this period
+            continue
+        yield scan_type, get_scan_impact(subject_scans[0]), get_scan_impact(subject_scans[-1])
+
+
+def get_scan_impact(scan) -> str:
+    if scan.comply_or_explain_is_explained:
+        return "good"
+
+    if scan.impact is None:
+        return get_impact(get_severity(scan))
+
+    # scans without a severity calculation have no impact
+    return scan.impact or "good"
+
+
 def get_impact(severity):
     if severity["is_explained"]:
         return "good"
@@ -2,7 +2,7 @@ import logging
 
 from django.core.management.base import BaseCommand
 
-from websecmap.scanners.duplicates import deduplicate_all_endpoints_sequentially
+from websecmap.scanners.duplicates import deduplicate_endpoints, describe_merges
 
 log = logging.getLogger(__name__)
 
@@ -18,12 +18,15 @@ class Command(BaseCommand):
     """
 
     def add_arguments(self, parser):
-        parser.add_argument(
-            "--days", nargs=1, help="How big the gap between endpoints can be, default=60", type=int, default=60
-        )
+        parser.add_argument("--days", help="How big the gap between endpoints can be, default=60", type=int, default=60)
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be merged.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Merges per transaction, default=100")
         super().add_arguments(parser)
 
     help = __doc__
 
     def handle(self, *args, **options):
-        deduplicate_all_endpoints_sequentially(days=options["days"])
+        merges = deduplicate_endpoints(
+            days=options["days"], dry_run=options["dry_run"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(describe_merges(merges, options["dry_run"]))
@@ -0,0 +1,48 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from websecmap.organizations.models import Url
+from websecmap.scanners.scanner.dnssec import compare_engines
+
+log = logging.getLogger(__package__)
+
+
+class Command(BaseCommand):
+    """Runs both DNSSEC engines (dnscheck and dnspython) and shows where their classification differs.
+
+    This requires dnscheck to be installed. Without urls, all top level urls in the database are compared.
+
+    Examples:
+        websecmap dnssec_compare_engines faalkaart.nl basisbeveiliging.nl
+        websecmap dnssec_compare_engines --only-differences
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="*", help="Urls to compare, defaults to all top level urls.")
+        parser.add_argument("--only-differences", action="store_true", help="Only show urls where engines differ.")
+
+    def handle(self, *args, **options):
+        urls = options["urls"]
+        if not urls:
+            urls = list(
+                Url.objects.all()
+                .filter(computed_subdomain="", is_dead=False, not_resolvable=False)
+                .values_list("url", flat=True)
+            )
+
+        log.info(f"Comparing DNSSEC engines on {len(urls)} urls, this might take a while.")
+        comparison = compare_engines(urls)
+
+        for item in comparison:
+            if options["only_differences"] and item["same"]:
+                continue
+            marker = "  " if item["same"] else "!!"
+            self.stdout.write(
+                f"{marker} {item['url']:<50} dnscheck: {item['dnscheck']:<10} dnspython: {item['dnspython']}"
+            )
+
+        differences = len([item for item in comparison if not item["same"]])
+        log.info(f"Compared {len(comparison)} urls, {differences} classifications differ.")
@@ -2,7 +2,7 @@ import logging
 
 from websecmap.app.management.commands._private import VerifyTaskCommand
 from websecmap.organizations.models import Url
-from websecmap.scanners.scanner.onboard import forward_onboarding_status
+from websecmap.scanners.scanner.onboard import forward_onboarding
 
 log = logging.getLogger(__name__)
 
@@ -15,11 +15,7 @@ class Command(VerifyTaskCommand):
     def handle(self, *args, **options):
 
         try:
-            expired = Url.objects.all().filter(onboarding_stage__in=["endpoint_discovery", "scans_running", "crawling"])
-
-            for url in expired:
-                log.debug("Forwarding onboarding status of %s" % url)
-                forward_onboarding_status(url)
+            forward_onboarding(Url.objects.all())
 
         except KeyboardInterrupt:
             log.info("Received keyboard interrupt. Stopped.")
@@ -2,7 +2,7 @@ import logging
 
 from websecmap.app.management.commands._private import VerifyTaskCommand
 from websecmap.organizations.models import Url
-from websecmap.scanners.scanner.onboard import reset_onboarding_status
+from websecmap.scanners.scanner.onboard import reset_onboarding
 
 log = logging.getLogger(__name__)
 
@@ -19,11 +19,7 @@ class Command(VerifyTaskCommand):
     def handle(self, *args, **options):
 
         try:
-            expired = Url.objects.all().filter(onboarding_stage__in=["endpoint_discovery", "scans_running", "crawling"])
-
-            for url in expired:
-                log.debug("Resetting onboarding status of %s" % url)
-                reset_onboarding_status(url)
+            reset_onboarding(Url.objects.all())
 
         except KeyboardInterrupt:
             log.info("Received keyboard interrupt. Stopped.")
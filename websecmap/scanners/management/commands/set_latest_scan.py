@@ -1,11 +1,15 @@
 import logging
 from datetime import datetime
+from typing import Dict
 
 import pytz
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
 
 from websecmap.scanners import ENDPOINT_SCAN_TYPES, URL_SCAN_TYPES
 from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.scanner.utils import in_chunks
 
 log = logging.getLogger(__name__)
 
@@ -14,67 +18,51 @@ class Command(BaseCommand):
     """Determines which scans are the latest and sets the latest scan flag. Normally this would happen automatically
     using the scan manager. But the flags are empty in older systems.
 
-    The queries used allow sliding through time, for example setting the latest on a certain date. Which does not
-    make sense at all, but works."""
+    Only flags that are wrong are changed, so this can also be used to check the flags regularly."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Scans per update, default=1000")
 
     def handle(self, *args, **options):
         for scan_type in URL_SCAN_TYPES:
-            reflag_urlgenericscan(type=scan_type)
+            reflag_urlgenericscan(type=scan_type, batch_size=options["batch_size"])
 
         for scan_type in ENDPOINT_SCAN_TYPES:
-            reflag_endpointgenericscan(type=scan_type)
+            reflag_endpointgenericscan(type=scan_type, batch_size=options["batch_size"])
 
 
-def reflag_urlgenericscan(type):
+def reflag_urlgenericscan(type, batch_size: int = 1000):
     log.debug("Setting flags on UrlGenericScan type: %s" % type)
-    UrlGenericScan.objects.all().filter(type=type).update(is_the_latest_scan=False)
-
-    # get the latest scans
-    sql = """
-        SELECT
-            id,
-            last_scan_moment,
-            is_the_latest_scan
-        FROM scanners_urlgenericscan
-        INNER JOIN
-            (SELECT MAX(id) as id2 FROM scanners_urlgenericscan egs2
-             WHERE last_scan_moment <= '%(when)s' and type = '%(type)s' GROUP BY url_id
-             ) as x
-        ON x.id2 = scanners_urlgenericscan.id
-    """ % {
-        "when": datetime.now(pytz.utc),
-        "type": type,
-    }
-
-    updatescans(UrlGenericScan.objects.raw(sql))
-
-
-def reflag_endpointgenericscan(type):
+    return reflag(UrlGenericScan.objects.all().filter(type=type), "url_id", batch_size)
+
+
+def reflag_endpointgenericscan(type, batch_size: int = 1000):
     log.debug("Setting flags on EndpointGenericScan type: %s" % type)
-    EndpointGenericScan.objects.all().filter(type=type).update(is_the_latest_scan=False)
-
-    # get the latest endpointgenericscans
-    sql = """
-        SELECT
-            id,
-            last_scan_moment,
-            is_the_latest_scan
-        FROM scanners_endpointgenericscan
-        INNER JOIN
-            (SELECT MAX(id) as id2 FROM scanners_endpointgenericscan egs2
-             WHERE last_scan_moment <= '%(when)s' and type = '%(type)s' GROUP BY endpoint_id
-             ) as x
-        ON x.id2 = scanners_endpointgenericscan.id
-    """ % {
-        "when": datetime.now(pytz.utc),
-        "type": type,
-    }
-
-    updatescans(EndpointGenericScan.objects.raw(sql))
-
-
-def updatescans(scans):
-    log.debug("Updating %s scans" % len(list(scans)))
-    for scan in scans:
-        scan.is_the_latest_scan = True
-        scan.save()
+    return reflag(EndpointGenericScan.objects.all().filter(type=type), "endpoint_id", batch_size)
+
+
+def reflag(scans, subject: str, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    The latest scan of every endpoint or url is the one with the highest id. Only the scans of which the flag differs
+    from that are updated, in a single transaction: the map never sees a moment without latest scans.
+    """
+    latest = (
+        scans.filter(last_scan_moment__lte=datetime.now(pytz.utc))
+        .order_by()
+        .values(subject)
+        .annotate(latest_id=Max("id"))
+        .values("latest_id")
+    )
+
+    with transaction.atomic():
+        outdated = list(scans.filter(is_the_latest_scan=True).exclude(id__in=latest).values_list("id", flat=True))
+        missing = list(scans.filter(is_the_latest_scan=False, id__in=latest).values_list("id", flat=True))
+
+        for chunk in in_chunks(outdated, batch_size):
+            scans.model.objects.all().filter(id__in=chunk).update(is_the_latest_scan=False)
+        for chunk in in_chunks(missing, batch_size):
+            scans.model.objects.all().filter(id__in=chunk).update(is_the_latest_scan=True)
+
+    if outdated or missing:
+        log.info(f"Corrected latest scan flags of {scans.model.__name__}: {len(outdated)} off, {len(missing)} on.")
+    return {"outdated": len(outdated), "missing": len(missing)}
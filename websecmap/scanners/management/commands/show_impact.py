@@ -1,8 +1,11 @@
 import logging
 
+import pytz
 from django.core.management.base import BaseCommand
 
+from websecmap.map.management.commands.custom_commands import is_iso
 from websecmap.scanners.impact import report_impact_to_commandline
+from websecmap.scanners.management.commands.revive import valid_date
 
 log = logging.getLogger(__name__)
 
@@ -10,5 +13,14 @@ log = logging.getLogger(__name__)
 class Command(BaseCommand):
     """Shows the impact of this installation."""
 
+    def add_arguments(self, parser):
+        parser.add_argument("--country", type=is_iso, help="2 character iso code of country", required=False)
+        parser.add_argument("--layer", type=str, help="name of the organization type", default="municipality")
+        parser.add_argument("--since", type=valid_date, help="Start of the period, YYYY-MM-DD", required=False)
+        parser.add_argument("--until", type=valid_date, help="End of the period, YYYY-MM-DD", required=False)
+
     def handle(self, *args, **options):
-        report_impact_to_commandline()
+        since, until = [
+            options[moment].replace(tzinfo=pytz.utc) if options[moment] else None for moment in ["since", "until"]
+        ]
+        report_impact_to_commandline(country=options["country"], layer=options["layer"], since=since, until=until)
@@ -0,0 +1,49 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from websecmap.scanners.models import EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.scanmanager import store_severity
+
+log = logging.getLogger(__package__)
+
+SEVERITY_FIELDS = [
+    "severity_high",
+    "severity_medium",
+    "severity_low",
+    "severity_ok",
+    "severity_not_testable",
+    "severity_not_applicable",
+    "impact",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores the severity of scans that were made before these were stored automatically. "
+        "Can be stopped and started again, only scans without a stored severity are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in [EndpointGenericScan, UrlGenericScan]:
+            store_scan_severities(model, options["batch_size"])
+
+
+def store_scan_severities(model, batch_size: int = 1000):
+    last_id = 0
+    processed = 0
+    while True:
+        scans = list(model.objects.all().filter(id__gt=last_id, impact__isnull=True).order_by("id")[0:batch_size])
+        if not scans:
+            break
+
+        for scan in scans:
+            store_severity(scan)
+        model.objects.bulk_update(scans, fields=SEVERITY_FIELDS)
+
+        last_id = scans[-1].id
+        processed += len(scans)
+        log.info(f"Stored severity of {processed} {model.__name__} scans, up to scan {last_id}.")
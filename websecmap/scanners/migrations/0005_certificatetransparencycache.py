@@ -0,0 +1,39 @@
+# Generated by Django 3.1.13 on 2026-10-19 10:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("organizations", "0060_auto_20200908_1055"),
+        ("scanners", "0004_auto_20210626_1313"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CertificateTransparencyCache",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "last_certificate_id",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="The highest certificate id that was inspected, newer certificates have a higher id.",
+                    ),
+                ),
+                (
+                    "known_subdomains",
+                    jsonfield.fields.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="All subdomains that have been seen in certificates of this domain.",
+                    ),
+                ),
+                ("last_discovery", models.DateTimeField(blank=True, null=True)),
+                ("url", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to="organizations.url")),
+            ],
+        ),
+    ]
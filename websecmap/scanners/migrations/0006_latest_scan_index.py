@@ -0,0 +1,25 @@
+# Generated by Django 3.1.13 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scanners", "0005_certificatetransparencycache"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="endpointgenericscan",
+            index=models.Index(
+                fields=["type", "is_the_latest_scan", "rating_determined_on"], name="endpointgenericscan_latest_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="urlgenericscan",
+            index=models.Index(
+                fields=["type", "is_the_latest_scan", "rating_determined_on"], name="urlgenericscan_latest_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 3.1.13 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scanners", "0006_latest_scan_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="impact",
+            field=models.CharField(
+                blank=True,
+                help_text="The worst severity of this scan: high, medium, low or good. Empty when there is no severity calculation for this type of scan, null when the severity has not been stored yet.",
+                max_length=6,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="severity_high",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="severity_low",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="severity_medium",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="severity_not_applicable",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="severity_not_testable",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="endpointgenericscan",
+            name="severity_ok",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="impact",
+            field=models.CharField(
+                blank=True,
+                help_text="The worst severity of this scan: high, medium, low or good. Empty when there is no severity calculation for this type of scan, null when the severity has not been stored yet.",
+                max_length=6,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="severity_high",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="severity_low",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="severity_medium",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="severity_not_applicable",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="severity_not_testable",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="urlgenericscan",
+            name="severity_ok",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="endpointgenericscan",
+            index=models.Index(fields=["type", "is_the_latest_scan", "impact"], name="endpointgenericscan_impact_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="urlgenericscan",
+            index=models.Index(fields=["type", "is_the_latest_scan", "impact"], name="urlgenericscan_impact_idx"),
+        ),
+    ]
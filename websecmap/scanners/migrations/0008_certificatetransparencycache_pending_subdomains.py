@@ -0,0 +1,50 @@
+# Generated by Django 3.1.13 on 2026-10-19 12:27
+
+from django.db import migrations
+import jsonfield.fields
+
+
+def move_unknown_subdomains_to_pending(apps, schema_editor):
+    # Known subdomains used to include names that were never added, those are offered again from now on.
+    CertificateTransparencyCache = apps.get_model("scanners", "CertificateTransparencyCache")
+    Url = apps.get_model("organizations", "Url")
+
+    for cache in CertificateTransparencyCache.objects.all().select_related("url").iterator():
+        suffix = f".{cache.url.url}"
+        existing = set(
+            Url.objects.all()
+            .filter(url__in=[f"{subdomain}{suffix}" for subdomain in cache.known_subdomains])
+            .values_list("url", flat=True)
+        )
+        known = [subdomain for subdomain in cache.known_subdomains if f"{subdomain}{suffix}" in existing]
+        cache.pending_subdomains = sorted(set(cache.known_subdomains) - set(known))
+        cache.known_subdomains = sorted(known)
+        cache.save(update_fields=["known_subdomains", "pending_subdomains"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scanners", "0007_scan_severity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="certificatetransparencycache",
+            name="pending_subdomains",
+            field=jsonfield.fields.JSONField(
+                blank=True,
+                default=list,
+                help_text="Subdomains from certificates of this domain that could not be added yet, for example "
+                "because they did not resolve. These are offered again on every discovery.",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="certificatetransparencycache",
+            name="known_subdomains",
+            field=jsonfield.fields.JSONField(
+                blank=True, default=list, help_text="Subdomains from certificates of this domain that exist as url."
+            ),
+        ),
+        migrations.RunPython(move_unknown_subdomains_to_pending, migrations.RunPython.noop),
+    ]
@@ -527,6 +527,40 @@ class GenericScanMixin(ExplainMixin, LatestScanMixin):
         "cannot change once it's set."
     )
 
+    # The outcome of the severity calculation, so scans can be filtered and counted on severity in the database.
+    # Explanations are not part of this, as scans can be explained after they are stored.
+    severity_high = models.PositiveSmallIntegerField(default=0)
+    severity_medium = models.PositiveSmallIntegerField(default=0)
+    severity_low = models.PositiveSmallIntegerField(default=0)
+    severity_ok = models.PositiveSmallIntegerField(default=0)
+    severity_not_testable = models.BooleanField(default=False)
+    severity_not_applicable = models.BooleanField(default=False)
+    impact = models.CharField(
+        max_length=6,
+        null=True,
+        blank=True,
+        help_text="The worst severity of this scan: high, medium, low or good. Empty when there is no severity "
+        "calculation for this type of scan, null when the severity has not been stored yet.",
+    )
+
+    def set_severity(self, calculation: dict):
+        """Copies the outcome of a severity calculation (see reporting.severity.get_severity) to this scan."""
+        self.severity_high = calculation["high"]
+        self.severity_medium = calculation["medium"]
+        self.severity_low = calculation["low"]
+        self.severity_ok = calculation["ok"]
+        self.severity_not_testable = calculation["not_testable"]
+        self.severity_not_applicable = calculation["not_applicable"]
+        self.impact = (
+            "high"
+            if self.severity_high
+            else "medium"
+            if self.severity_medium
+            else "low"
+            if self.severity_low
+            else "good"
+        )
+
     class Meta:
         """
         From the docs:
@@ -541,6 +575,12 @@ class GenericScanMixin(ExplainMixin, LatestScanMixin):
         ordering = [
             "-rating_determined_on",
         ]
+        # Used to find the most recently changed latest scans of a type, for example in the latest scans feed.
+        indexes = [
+            models.Index(fields=["type", "is_the_latest_scan", "rating_determined_on"], name="%(class)s_latest_idx"),
+            # Used to count and find the current issues per severity, for example the worst issues per layer.
+            models.Index(fields=["type", "is_the_latest_scan", "impact"], name="%(class)s_impact_idx"),
+        ]
 
 
 class EndpointGenericScan(GenericScanMixin):
@@ -687,3 +727,33 @@ class TlsQualysScratchpad(models.Model):
     domain = models.CharField(max_length=255)
     at_when = models.DateTimeField(auto_now_add=True)
     data = models.TextField()
+
+
+class CertificateTransparencyCache(models.Model):
+    """
+    Remembers what was found in certificate transparency logs for a domain. Certificates up to last_certificate_id
+    have been inspected already, and only subdomains that are not known yet, or that are still pending, are offered
+    for adding.
+    """
+
+    url = models.OneToOneField(Url, on_delete=models.CASCADE)
+
+    last_certificate_id = models.BigIntegerField(
+        default=0, help_text="The highest certificate id that was inspected, newer certificates have a higher id."
+    )
+
+    known_subdomains = JSONField(
+        default=list, blank=True, help_text="Subdomains from certificates of this domain that exist as url."
+    )
+
+    pending_subdomains = JSONField(
+        default=list,
+        blank=True,
+        help_text="Subdomains from certificates of this domain that could not be added yet, for example because they "
+        "did not resolve. These are offered again on every discovery.",
+    )
+
+    last_discovery = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return "%s: %s" % (self.url, self.last_certificate_id)
@@ -1,14 +1,21 @@
 import logging
 from datetime import datetime
+from typing import Any, Dict, List, Tuple, Union
 
 import pytz
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Max
 
+from websecmap.app.instrumentation import count, timed
+from websecmap.reporting.severity import get_severity
 from websecmap.scanners.models import Endpoint, EndpointGenericScan, Url, UrlGenericScan
+from websecmap.scanners.signals import scan_results_stored
 
 log = logging.getLogger(__package__)
 
 
+@timed("scan_result.store")
 def store_endpoint_scan_result(scan_type: str, endpoint_id: int, rating: str, message: str, evidence: str = ""):
 
     # Check if the latest scan has the same rating or not:
@@ -44,14 +51,116 @@ def store_endpoint_scan_result(scan_type: str, endpoint_id: int, rating: str, me
     gs.last_scan_moment = datetime.now(pytz.utc)
     gs.rating_determined_on = datetime.now(pytz.utc)
     gs.is_the_latest_scan = True
+    store_severity(gs)
     gs.save()
 
     # Set all the previous endpoint scans of this endpoint + type to NOT be the latest scan.
     EndpointGenericScan.objects.all().filter(endpoint=gs.endpoint, type=gs.type).exclude(pk=gs.pk).update(
         is_the_latest_scan=False
     )
+    scan_results_stored.send(sender=EndpointGenericScan, scan_types=[scan_type])
 
 
+@timed("scan_results.store")
+def store_endpoint_scan_results(scan_results: List[Dict[str, Any]]):
+    """
+    Bulk variant of store_endpoint_scan_result, which is used when a lot of results arrive at once, for example
+    when processing a finished internet.nl scan. Instead of a handful of queries per result, this performs a few
+    queries per batch of results while keeping the same deduplication behaviour: unchanged results only get their
+    last_scan_moment updated, changed results are inserted as a new latest scan.
+
+    :param scan_results: list of dicts with the keys: scan_type, endpoint_id, rating, message and optionally evidence.
+    :return: None
+    """
+
+    # when the same endpoint + type is supplied multiple times, the last one wins, as it would sequentially.
+    results = {}
+    for scan_result in scan_results:
+        results[(scan_result["endpoint_id"], scan_result["scan_type"])] = scan_result
+    count("scan_results.stored", len(results))
+
+    if not results:
+        return
+
+    endpoint_ids = {endpoint_id for endpoint_id, _ in results.keys()}
+    scan_types = {scan_type for _, scan_type in results.keys()}
+
+    latest_scans = latest_endpoint_scans(endpoint_ids, scan_types)
+
+    unchanged_scan_ids = []
+    changed = set()
+    new_scans = []
+    now = datetime.now(pytz.utc)
+
+    for key, scan_result in results.items():
+        existing_scan = latest_scans.get(key, None)
+        message, rating = scan_result["message"], scan_result["rating"]
+
+        if existing_scan and existing_scan.explanation == str(message) and existing_scan.rating == str(rating):
+            unchanged_scan_ids.append(existing_scan.id)
+            continue
+
+        changed.add(key)
+        new_scan = EndpointGenericScan(
+            explanation=message[0:255],
+            rating=rating,
+            endpoint_id=scan_result["endpoint_id"],
+            type=scan_result["scan_type"],
+            evidence=scan_result.get("evidence", "")[0:9000],
+            last_scan_moment=now,
+            rating_determined_on=now,
+            is_the_latest_scan=True,
+        )
+        store_severity(new_scan)
+        new_scans.append(new_scan)
+
+    log.debug(
+        f"Storing {len(results)} endpoint scan results: {len(unchanged_scan_ids)} unchanged, {len(new_scans)} changed."
+    )
+
+    # all previous scans of a changed endpoint + type are not the latest scan anymore.
+    outdated_scan_ids = [
+        scan_id
+        for scan_id, endpoint_id, scan_type in EndpointGenericScan.objects.all()
+        .filter(endpoint__in=endpoint_ids, type__in=scan_types, is_the_latest_scan=True)
+        .values_list("id", "endpoint_id", "type")
+        if (endpoint_id, scan_type) in changed
+    ]
+
+    with transaction.atomic():
+        EndpointGenericScan.objects.all().filter(id__in=unchanged_scan_ids).update(last_scan_moment=now)
+        EndpointGenericScan.objects.all().filter(id__in=outdated_scan_ids).update(is_the_latest_scan=False)
+        EndpointGenericScan.objects.bulk_create(new_scans, batch_size=500)
+        if new_scans:
+            scan_results_stored.send(sender=EndpointGenericScan, scan_types=sorted({scan.type for scan in new_scans}))
+
+
+def latest_endpoint_scans(endpoint_ids, scan_types) -> Dict[Tuple[int, str], EndpointGenericScan]:
+    """
+    The latest scan per endpoint and type, by last_scan_moment, like store_endpoint_scan_result retrieves it.
+
+    :return: {(endpoint_id, scan_type): scan}
+    """
+    scans = EndpointGenericScan.objects.all().filter(endpoint__in=endpoint_ids, type__in=scan_types)
+    latest_moments = {
+        (row["endpoint_id"], row["type"]): row["latest"]
+        for row in scans.values("endpoint_id", "type").annotate(latest=Max("last_scan_moment")).order_by()
+    }
+
+    latest_scans = {}
+    candidates = (
+        scans.filter(last_scan_moment__in=set(latest_moments.values()))
+        .order_by("id")
+        .only("id", "endpoint_id", "type", "rating", "explanation", "last_scan_moment")
+    )
+    for scan in candidates:
+        key = (scan.endpoint_id, scan.type)
+        if latest_moments.get(key) == scan.last_scan_moment:
+            latest_scans[key] = scan
+    return latest_scans
+
+
+@timed("scan_result.store")
 def store_url_scan_result(scan_type: str, url_id: int, rating: str, message: str, evidence: str = ""):
 
     # Check if the latest scan has the same rating or not:
@@ -89,9 +198,20 @@ def store_url_scan_result(scan_type: str, url_id: int, rating: str, message: str
         gs.last_scan_moment = datetime.now(pytz.utc)
         gs.rating_determined_on = datetime.now(pytz.utc)
         gs.is_the_latest_scan = True
+        store_severity(gs)
         gs.save()
 
         UrlGenericScan.objects.all().filter(url=gs.url, type=gs.type).exclude(pk=gs.pk).update(is_the_latest_scan=False)
+        scan_results_stored.send(sender=UrlGenericScan, scan_types=[scan_type])
+
+
+def store_severity(scan: Union[EndpointGenericScan, UrlGenericScan]):
+    """Sets the severity fields of a scan that is about to be saved."""
+    try:
+        scan.set_severity(get_severity(scan))
+    except (ValueError, KeyError):
+        log.debug(f"No severity can be calculated for {scan.type} scan with rating {scan.rating}.")
+        scan.impact = ""
 
 
 def endpoint_has_scans(scan_type: str, endpoint_id: int):
@@ -3,9 +3,9 @@ import logging
 import random
 from typing import List
 
-from constance import config
 from django.db.models import Q
 
+from websecmap.app.constance import constance_cached_value
 from websecmap.map.models import Configuration
 from websecmap.organizations.models import Organization, Url
 from websecmap.scanners import plannedscan
@@ -59,14 +59,14 @@ def add_model_filter(queryset, **kwargs):
 # Note that .__module__  is always celery.local :)
 def allowed_to_scan(scanner_name: str = ""):
 
-    if not config.SCAN_AT_ALL:
+    if not constance_cached_value("SCAN_AT_ALL"):
         return False
 
     if scanner_name == "dummy":
         return True
 
     try:
-        return getattr(config, "USE_SCANNER_%s" % scanner_name.upper())
+        return constance_cached_value("USE_SCANNER_%s" % scanner_name.upper())
     except AttributeError:
         log.debug("Scanner %s is not allowed to scan due to setting." % scanner_name)
         return False
@@ -74,7 +74,7 @@ def allowed_to_scan(scanner_name: str = ""):
 
 def allowed_to_discover_urls(scanner_name: str = ""):
     try:
-        return getattr(config, "DISCOVER_URLS_USING_%s" % scanner_name.upper())
+        return constance_cached_value("DISCOVER_URLS_USING_%s" % scanner_name.upper())
     except AttributeError:
         log.debug("Scanner %s is not allowed to discover urls due to setting." % scanner_name)
         return False
@@ -82,7 +82,7 @@ def allowed_to_discover_urls(scanner_name: str = ""):
 
 def allowed_to_discover_endpoints(scanner_name: str = ""):
     try:
-        return getattr(config, "DISCOVER_ENDPOINTS_USING_%s" % scanner_name.upper())
+        return constance_cached_value("DISCOVER_ENDPOINTS_USING_%s" % scanner_name.upper())
     except AttributeError:
         log.debug("Scanner %s is not allowed to discover endpoints due to setting." % scanner_name)
         return False
@@ -0,0 +1,128 @@
+"""
+Finds subdomains in certificate transparency logs.
+
+Certificates are retrieved as JSON from crt.sh, or from a compatible mirror, or from a local dump file. A dump file
+contains one crt.sh JSON entry per line, optionally gzip compressed:
+
+    {"id": 4199364211, "common_name": "faalkaart.nl", "name_value": "faalkaart.nl\\nwww.faalkaart.nl", ...}
+
+A dump is read once for all domains of a discovery.
+
+Every certificate has an increasing id. The highest id that has been seen for a domain is stored, so that on the next
+discovery only certificates that are newer are inspected.
+"""
+
+import gzip
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import requests
+
+log = logging.getLogger(__name__)
+
+# Names in certificates can also be e-mail addresses or contain wildcards in the middle, those are not subdomains.
+VALID_NAME = re.compile(r"^[a-z0-9_.-]+$")
+
+
+def is_remote_source(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def retrieve_entries(domain: str, source: str) -> Iterable[Dict[str, Any]]:
+    if is_remote_source(source):
+        return entries_from_crt_sh(domain, source)
+    return entries_from_dump([domain], source)[domain]
+
+
+def entries_from_crt_sh(domain: str, base_url: str) -> List[Dict[str, Any]]:
+    # https://crt.sh/?q=%25.zutphen.nl&output=json
+    response = requests.get(
+        base_url, params={"q": f"%.{domain}", "output": "json"}, timeout=(30, 120), allow_redirects=False
+    )
+    response.raise_for_status()
+
+    # crt.sh answers with an empty body instead of an empty list in some cases.
+    if not response.text.strip():
+        return []
+
+    return response.json()
+
+
+def entries_from_dump(domains: Iterable[str], path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reads the entries of all domains from a dump in a single pass, a dump is large and there are many domains.
+
+    :return: the entries per domain, {"faalkaart.nl": [{"id": 4199364211, ...}, ...], ...}
+    """
+    entries = {domain: [] for domain in domains}
+    if not entries:
+        return entries
+
+    # parsing json is relatively expensive, most lines in a dump will not be about these domains. This lookahead
+    # matches at every position in the line, so a line that contains any of the domains is found.
+    mentions_domain = re.compile("(?=%s)" % "|".join(re.escape(domain) for domain in entries))
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for line in f:
+            if not mentions_domain.search(line):
+                continue
+            entry = json.loads(line)
+            for domain in domains_of_entry(entry, entries):
+                entries[domain].append(entry)
+
+    return entries
+
+
+def domains_of_entry(entry: Dict[str, Any], domains: Dict[str, Any]) -> Set[str]:
+    """The domains of which a name in the certificate is a subdomain, names are stripped label by label."""
+    found = set()
+    for name in names_of_entry(entry):
+        labels = name.split(".")
+        for position in range(1, len(labels)):
+            parent = ".".join(labels[position:])
+            if parent in domains:
+                found.add(parent)
+    return found
+
+
+def names_of_entry(entry: Dict[str, Any]) -> List[str]:
+    # wildcards are stored as their base, sometimes subdomains have nice features: *.apps.domain.tld.
+    names = []
+    for name in entry.get("name_value", "").split("\n") + [entry.get("common_name", "")]:
+        name = name.strip().lower()
+        if name.startswith("*."):
+            name = name[2:]
+        names.append(name)
+    return names
+
+
+def subdomains_from_entries(
+    entries: Iterable[Dict[str, Any]], domain: str, newer_than: int = 0
+) -> Tuple[Set[str], int]:
+    """
+    Extracts the subdomains of domain from certificates with an id higher than newer_than.
+
+    :return: the found subdomains, such as {"www", "mail.internal"}, and the highest certificate id that was seen.
+    """
+    suffix = f".{domain}"
+    subdomains = set()
+    last_certificate_id = newer_than
+
+    for entry in entries:
+        certificate_id = int(entry.get("id", 0))
+        if certificate_id <= newer_than:
+            continue
+        last_certificate_id = max(last_certificate_id, certificate_id)
+
+        for name in names_of_entry(entry):
+            if not name.endswith(suffix) or not VALID_NAME.match(name):
+                continue
+
+            subdomain = name[: -len(suffix)]
+            if subdomain:
+                subdomains.add(subdomain)
+
+    return subdomains, last_certificate_id
@@ -21,18 +21,26 @@ We strongly recomend using the docker approach.
 
 import logging
 import subprocess
-from typing import List
+from typing import Any, Dict, List
 
 from celery import Task, group
 from django.conf import settings
 from django.db.models import Q
 
+from websecmap.app.constance import constance_cached_value
 from websecmap.celery import ParentFailed, app
 from websecmap.organizations.models import Organization, Url
 from websecmap.scanners import plannedscan
 from websecmap.scanners.models import Endpoint
 from websecmap.scanners.scanmanager import store_url_scan_result
-from websecmap.scanners.scanner.__init__ import allowed_to_scan, q_configurations_to_scan, unique_and_random
+from websecmap.scanners.scanner import dnssec_validator
+from websecmap.scanners.scanner.__init__ import (
+    allowed_to_scan,
+    chunks2,
+    q_configurations_to_scan,
+    unique_and_random,
+)
+from websecmap.scanners.scanner.utils import get_nameservers
 
 log = logging.getLogger(__name__)
 
@@ -44,6 +52,9 @@ RETRY_DELAY = 10
 # can also be a datetime.
 EXPIRES = 3600  # one hour is more then enough
 
+# The dnspython engine validates domains in bulk, this is the amount of domains per task.
+BULK_SCAN_CHUNK_SIZE = 50
+
 
 def filter_scan(
     organizations_filter: dict = dict(), urls_filter: dict = dict(), endpoints_filter: dict = dict(), **kwargs
@@ -116,6 +127,9 @@ def compose_scan_task(urls) -> Task:
     """
     # The number of top level urls is negligible, so randomization is not needed.
 
+    if constance_cached_value("SCANNER_DNSSEC_ENGINE") == "dnspython":
+        return compose_bulk_scan_task(urls)
+
     # create tasks for scanning all selected endpoints as a single managable group
     # Sending entire objects is possible. How signatures (.s and .si) work is documented:
     # http://docs.celeryproject.org/en/latest/reference/celery.html#celery.signature
@@ -127,6 +141,19 @@ def compose_scan_task(urls) -> Task:
     return task
 
 
+def compose_bulk_scan_task(urls) -> Task:
+    """Compose taskset to scan toplevel domains in chunks, using the in process dnspython engine."""
+    tasks = []
+    for chunk in chunks2(list(urls), BULK_SCAN_CHUNK_SIZE):
+        tasks.append(
+            scan_dnssec_bulk.si([url.url for url in chunk])
+            | store_dnssec_bulk.s({url.url: url.pk for url in chunk})
+            | plannedscan.finish_multiple.si("scan", "dnssec", [url.pk for url in chunk])
+        )
+
+    return group(tasks)
+
+
 @app.task(queue="storage")
 def store_dnssec(result: List[str], url_id: int):
     """
@@ -137,6 +164,23 @@ def store_dnssec(result: List[str], url_id: int):
     if isinstance(result, Exception):
         return ParentFailed("skipping result parsing because scan failed.", cause=result)
 
+    return store_dnssec_result(result, url_id)
+
+
+@app.task(queue="storage")
+def store_dnssec_bulk(results: Dict[str, List[str]], url_ids: Dict[str, int]):
+    """
+    :param results: {url: dnscheck style output} as returned by scan_dnssec_bulk
+    :param url_ids: {url: url_id}
+    """
+
+    if isinstance(results, Exception):
+        return ParentFailed("skipping result parsing because scan failed.", cause=results)
+
+    return [store_dnssec_result(result, url_ids[url]) for url, result in results.items() if url in url_ids]
+
+
+def store_dnssec_result(result: List[str], url_id: int):
     # relevant helps to store the minimum amount of information.
     level, relevant = analyze_result(result)
 
@@ -185,8 +229,7 @@ def scan_dnssec(self, url: str):
     try:
         log.info("Start scanning %s", url)
 
-        output = subprocess.check_output([settings.TOOLS["dnscheck"]["executable"], url]).decode("UTF-8")
-        content = output.splitlines()
+        content = run_dnscheck(url)
 
         log.info("Done scanning: %s, result: %s", url, content)
         return content
@@ -207,6 +250,54 @@ def scan_dnssec(self, url: str):
             return e
 
 
+def run_dnscheck(url: str) -> List[str]:
+    output = subprocess.check_output([settings.TOOLS["dnscheck"]["executable"], url]).decode("UTF-8")
+    return output.splitlines()
+
+
+@app.task(
+    queue="internet",
+    expires=EXPIRES,
+    task_time_limit=600,
+)
+def scan_dnssec_bulk(urls: List[str]) -> Dict[str, List[str]]:
+    """
+    Validates DNSSEC of a set of urls concurrently using dnspython. The output has the same format as the output
+    of dnscheck, so it can be stored with the same logic.
+    """
+    log.info("Start validating DNSSEC of %s urls.", len(urls))
+    return dnssec_validator.validate_zones(urls, get_nameservers())
+
+
+def compare_engines(urls: List[str], nameservers: List[str] = None) -> List[Dict[str, Any]]:
+    """
+    Runs both dnscheck and the dnspython engine on the given urls, to see where their classification differs.
+    This requires dnscheck to be installed.
+
+    :return: list of {"url", "dnscheck", "dnspython", "same"}, the latter three contain the level (ERROR, etc).
+    """
+    validated = dnssec_validator.validate_zones(urls, nameservers or get_nameservers())
+
+    comparison = []
+    for url in urls:
+        try:
+            dnscheck_level, _ = analyze_result(run_dnscheck(url))
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            dnscheck_level = f"failed: {e}"
+
+        dnspython_level, _ = analyze_result(validated[url])
+        comparison.append(
+            {
+                "url": url,
+                "dnscheck": dnscheck_level,
+                "dnspython": dnspython_level,
+                "same": dnscheck_level == dnspython_level,
+            }
+        )
+
+    return comparison
+
+
 def analyze_result(result: List[str]):
     """
     All possible outcomes:
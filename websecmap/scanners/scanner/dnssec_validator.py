@@ -0,0 +1,247 @@
+"""
+Validates DNSSEC of many zones concurrently, without starting a dnscheck process per zone.
+
+This engine queries the DNSKEY, DS and SOA records of a zone including their signatures and validates them using
+dnspython. The findings are written in the same format as the output of dnscheck (dnssec.pl), so the exact same
+classification in dnssec.analyze_result is used for both engines:
+
+    0.012: INFO Begin testing DNSSEC for faalkaart.nl.
+    0.034: INFO Found DS record for faalkaart.nl at parent.
+    ...
+
+Queries are sent with the checking disabled (CD) flag, so a validating resolver also returns data it considers bogus.
+This way the validation is performed here and the reason of a failure can be reported.
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+
+import dns.asyncquery
+import dns.dnssec
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.rcode
+
+log = logging.getLogger(__name__)
+
+# The amount of zones that are validated at the same time.
+CONCURRENCY = 20
+
+# Seconds to wait for an answer of a single nameserver.
+QUERY_TIMEOUT = 5
+
+# DS digest types that can be verified against the DNSKEY at the child.
+DIGEST_TYPES = {1: "SHA1", 2: "SHA256", 4: "SHA384"}
+
+
+class QueryFailed(Exception):
+    pass
+
+
+def validate_zones(
+    zones: List[str], nameservers: List[str], port: int = 53, concurrency: int = CONCURRENCY
+) -> Dict[str, List[str]]:
+    """
+    Validates DNSSEC on a list of zones, at most `concurrency` zones at the same time.
+
+    :param zones: list of domains, such as ["faalkaart.nl", "basisbeveiliging.nl"]
+    :param nameservers: recursive nameservers that are queried, the next one is used when one does not answer.
+    :param port: port of the nameservers, useful for testing.
+    :param concurrency: maximum number of zones that are validated simultaneously.
+    :return: {zone: [dnscheck style output lines]}
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(validate_zones_async(zones, nameservers, port, concurrency))
+    finally:
+        loop.close()
+
+
+async def validate_zones_async(
+    zones: List[str], nameservers: List[str], port: int = 53, concurrency: int = CONCURRENCY
+) -> Dict[str, List[str]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(zone):
+        async with semaphore:
+            return await validate_zone(zone, nameservers, port)
+
+    results = await asyncio.gather(*[limited(zone) for zone in zones])
+    return dict(zip(zones, results))
+
+
+async def validate_zone(zone: str, nameservers: List[str], port: int = 53) -> List[str]:
+    output = ZoneOutput()
+    output.info(f"Begin testing DNSSEC for {zone}.")
+
+    try:
+        name = dns.name.from_text(zone)
+    except dns.exception.DNSException as e:
+        # a malformed name, for example with a label that is too long, should not abort the other zones.
+        output.error(f"{zone} is not a valid domain name: {e}.")
+        output.info(f"Done testing DNSSEC for {zone}.")
+        return output.lines
+
+    try:
+        await check_zone(zone, name, nameservers, port, output)
+    except QueryFailed as e:
+        output.error(f"Could not retrieve records for {zone}: {e}.")
+
+    output.info(f"Done testing DNSSEC for {zone}.")
+    return output.lines
+
+
+async def check_zone(zone: str, name: dns.name.Name, nameservers: List[str], port: int, output: "ZoneOutput"):
+    ds, _ = await query_with_signatures(name, dns.rdatatype.DS, nameservers, port)
+    if ds:
+        output.info(f"Found DS record for {zone} at parent.")
+    else:
+        output.info(f"Did not find DS record for {zone} at parent.")
+
+    dnskey, dnskey_signatures = await query_with_signatures(name, dns.rdatatype.DNSKEY, nameservers, port)
+    if not dnskey:
+        # both of these lines are treated as errors, as they are by dnscheck.
+        output.info(f"Did not find DNSKEY record for {zone} at child.")
+        output.info("No DNSKEY(s) found at child, other tests skipped.")
+        return
+
+    output.info(f"Found DNSKEY record for {zone} at child.")
+    keys = {name: dnskey}
+
+    failure = validation_failure(dnskey, dnskey_signatures, keys)
+    if failure:
+        output.error(f"No valid signatures over DNSKEY RRset found for {zone}: {failure}.")
+    else:
+        output.info(f"Enough valid signatures over DNSKEY RRset found for {zone}.")
+
+    if ds:
+        matching = matching_ds(name, ds, dnskey)
+        if matching:
+            output.info(f"Parent DS({zone}/{matching}) refers to valid key at child.")
+        else:
+            output.error(f"No DS record at parent for {zone} refers to a valid key at child.")
+    else:
+        output.warning(
+            f"[DNSSEC:MISSING_DS] Broken chain of trust for {zone} - DNSKEY found at child, but no DS was found at "
+            f"parent."
+        )
+
+    soa, soa_signatures = await query_with_signatures(name, dns.rdatatype.SOA, nameservers, port)
+    failure = validation_failure(soa, soa_signatures, keys) if soa else "no SOA record"
+    if failure:
+        output.error(f"No valid signatures over SOA RRset found for {zone}: {failure}.")
+    else:
+        output.info(f"Enough valid signatures over SOA RRset found for {zone}.")
+
+    denial_type = await authenticated_denial_type(name, nameservers, port)
+    if denial_type:
+        output.info(f"Authenticated denial records found for {zone}, of type {denial_type}.")
+    else:
+        output.info(f"Authenticated denial records not found for {zone}.")
+
+
+def validation_failure(rrset, signatures, keys) -> Optional[str]:
+    """Returns the reason why the rrset is not validly signed, or None if it is."""
+    if not signatures:
+        return "no signatures"
+
+    try:
+        dns.dnssec.validate(rrset, signatures, keys)
+    except dns.dnssec.UnsupportedAlgorithm as e:
+        return f"unsupported algorithm ({e})"
+    except dns.dnssec.ValidationFailure as e:
+        return str(e)
+
+    return None
+
+
+def matching_ds(name: dns.name.Name, ds, dnskey) -> Optional[str]:
+    """Returns a description of the first DS record that refers to one of the DNSKEYs, if any."""
+    for ds_record in ds:
+        if ds_record.digest_type not in DIGEST_TYPES:
+            continue
+
+        for key in dnskey:
+            if dns.dnssec.key_id(key) != ds_record.key_tag:
+                continue
+
+            if dns.dnssec.make_ds(name, key, DIGEST_TYPES[ds_record.digest_type]) == ds_record:
+                return f"{ds_record.algorithm}/{ds_record.digest_type}/{ds_record.key_tag}"
+
+    return None
+
+
+async def authenticated_denial_type(name: dns.name.Name, nameservers: List[str], port: int) -> Optional[str]:
+    # a random label will not exist, so the answer must prove that it does not exist.
+    non_existing = dns.name.from_text(f"websecmap-{secrets.token_hex(6)}", name)
+    response = await query(non_existing, dns.rdatatype.A, nameservers, port)
+
+    rdtypes = {rrset.rdtype for rrset in response.authority}
+    if dns.rdatatype.NSEC3 in rdtypes:
+        return "NSEC3"
+    if dns.rdatatype.NSEC in rdtypes:
+        return "NSEC"
+
+    return None
+
+
+async def query_with_signatures(name: dns.name.Name, rdtype, nameservers: List[str], port: int) -> Tuple:
+    response = await query(name, rdtype, nameservers, port)
+
+    rrset = find_in_answer(response, name, rdtype)
+    signatures = find_in_answer(response, name, dns.rdatatype.RRSIG, covers=rdtype)
+    return rrset, signatures
+
+
+def find_in_answer(response: dns.message.Message, name: dns.name.Name, rdtype, covers=dns.rdatatype.NONE):
+    try:
+        return response.find_rrset(response.answer, name, dns.rdataclass.IN, rdtype, covers)
+    except KeyError:
+        return None
+
+
+async def query(name: dns.name.Name, rdtype, nameservers: List[str], port: int) -> dns.message.Message:
+    message = dns.message.make_query(name, rdtype, want_dnssec=True, payload=4096)
+    message.flags |= dns.flags.CD
+
+    last_problem = "no nameservers"
+    for nameserver in nameservers:
+        try:
+            response, _ = await dns.asyncquery.udp_with_fallback(message, nameserver, timeout=QUERY_TIMEOUT, port=port)
+        except (dns.exception.DNSException, OSError) as e:
+            last_problem = f"{nameserver}: {e.__class__.__name__}"
+            continue
+
+        if response.rcode() in [dns.rcode.NOERROR, dns.rcode.NXDOMAIN]:
+            return response
+
+        last_problem = f"{nameserver}: {dns.rcode.to_text(response.rcode())}"
+
+    raise QueryFailed(f"{dns.rdatatype.to_text(rdtype)} query failed ({last_problem})")
+
+
+class ZoneOutput:
+    """Collects output in the format of dnscheck: '[seconds since start]: [LEVEL] [message]'."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.lines = []
+
+    def add(self, level: str, message: str):
+        self.lines.append(f"{time.monotonic() - self.started:.3f}: {level} {message}")
+
+    def info(self, message: str):
+        self.add("INFO", message)
+
+    def warning(self, message: str):
+        self.add("WARNING", message)
+
+    def error(self, message: str):
+        self.add("ERROR", message)
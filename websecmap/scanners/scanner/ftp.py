@@ -9,6 +9,9 @@ Scans for missing AUTH TLS / AUTH SSL options in FTP servers.
 
 import logging
 from ftplib import FTP, error_perm, error_proto, error_reply, error_temp  # nosec scanning for insecure ftp is the point
+from multiprocessing.pool import ThreadPool
+from time import monotonic
+from typing import Any, Dict, List, Tuple
 
 from celery import Task, group
 from django.utils import timezone
@@ -18,9 +21,10 @@ from websecmap.organizations.models import Url
 from websecmap.scanners import plannedscan
 from websecmap.scanners.models import Endpoint
 from websecmap.scanners.plannedscan import retrieve_endpoints_from_urls
-from websecmap.scanners.scanmanager import store_endpoint_scan_result
+from websecmap.scanners.scanmanager import store_endpoint_scan_result, store_endpoint_scan_results
 from websecmap.scanners.scanner.__init__ import (
     allowed_to_scan,
+    chunks2,
     endpoint_filters,
     q_configurations_to_scan,
     unique_and_random,
@@ -36,6 +40,14 @@ RETRY_DELAY = 10
 
 FTP_SERVER_TIMEOUT = 30
 
+# The maximum time (seconds) a single server may take for all commands together. Without it a slow server could
+# take the FTP_SERVER_TIMEOUT for every command.
+FTP_SERVER_DEADLINE = 60
+
+# Bulk scans: the amount of endpoints per task and the amount of servers that are contacted at the same time.
+BULK_SCAN_CHUNK_SIZE = 50
+BULK_SCAN_CONCURRENCY = 10
+
 # after which time (seconds) a pending task should no longer be accepted by a worker
 # can also be a datetime.
 EXPIRES = 3600  # one hour is more then enough
@@ -150,12 +162,19 @@ def compose_scan_task(urls):
     log.info("Scanning FTP servers on %s endpoints.", len(endpoints))
     tasks = []
 
-    for endpoint in endpoints:
-        tasks.append(
-            scan.si(endpoint.url.url, endpoint.port).set(queue=CELERY_IP_VERSION_QUEUE_NAMES[endpoint.ip_version])
-            | store.s(endpoint.id)
-            | plannedscan.finish.si("scan", "ftp", endpoint.url.pk)
-        )
+    # endpoints are scanned in bulk, every ip version has its own queue.
+    for ip_version in [4, 6]:
+        ip_version_endpoints = [endpoint for endpoint in endpoints if endpoint.ip_version == ip_version]
+
+        for chunk in chunks2(ip_version_endpoints, BULK_SCAN_CHUNK_SIZE):
+            targets = [{"endpoint_id": ep.id, "address": ep.url.url, "port": ep.port} for ep in chunk]
+            url_ids = list({endpoint.url.pk for endpoint in chunk})
+
+            tasks.append(
+                scan_bulk.si(targets).set(queue=CELERY_IP_VERSION_QUEUE_NAMES[ip_version])
+                | store_bulk.s()
+                | plannedscan.finish_multiple.si("scan", "ftp", url_ids)
+            )
 
     return group(tasks)
 
@@ -236,14 +255,59 @@ def store(result: dict, endpoint_id: int):
     :param endpoint:
 
     """
-    level = ""
-    message = ""
-
     # if scan task failed, ignore the result (exception) and report failed status
     if isinstance(result, Exception):
         return ParentFailed("skipping result parsing because scan failed.", cause=result)
 
-    # analyze result
+    level, message = analyze_result(result)
+
+    log.debug("Storing result: %s, for url: %s.", level, endpoint_id)
+
+    if result:
+        store_endpoint_scan_result("ftp", endpoint_id, level, message, str(result))
+
+    # return something informative
+    return {"status": "success", "result": level}
+
+
+@app.task(queue="storage")
+def store_bulk(results: List[Dict[str, Any]]):
+    """
+    Stores the results of scan_bulk in one go.
+
+    :param results: list of {"endpoint_id": int, "result": scan result}
+    """
+
+    # if scan task failed, ignore the result (exception) and report failed status
+    if isinstance(results, Exception):
+        return ParentFailed("skipping result parsing because scan failed.", cause=results)
+
+    scan_results = []
+    for result in results:
+        if not result["result"]:
+            continue
+
+        level, message = analyze_result(result["result"])
+        scan_results.append(
+            {
+                "scan_type": "ftp",
+                "endpoint_id": result["endpoint_id"],
+                "rating": level,
+                "message": message,
+                "evidence": str(result["result"]),
+            }
+        )
+
+    log.debug("Storing %s FTP results.", len(scan_results))
+    store_endpoint_scan_results(scan_results)
+
+    return {"status": "success", "stored": len(scan_results)}
+
+
+def analyze_result(result: dict) -> Tuple[str, str]:
+    level = ""
+    message = ""
+
     if result["supports_ssl"] is True and result["supports_tls"] in [False, "Unknown"]:
         level = "outdated"
         message = "FTP Server only supports insecure SSL protocol."
@@ -260,13 +324,7 @@ def store(result: dict, endpoint_id: int):
         level = "unknown"
         message = "An FTP connection could not be established properly. Not possible to verify encryption."
 
-    log.debug("Storing result: %s, for url: %s.", level, endpoint_id)
-
-    if result:
-        store_endpoint_scan_result("ftp", endpoint_id, level, message, str(result))
-
-    # return something informative
-    return {"status": "success", "result": level}
+    return level, message
 
 
 # supporting 4 and 6, whatever resolves to the FTP server is fine.
@@ -300,6 +358,35 @@ def scan(self, address: str, port: int):
 
     """
 
+    return scan_ftp_server(address, port)
+
+
+@app.task(
+    bind=True,
+    default_retry_delay=RETRY_DELAY,
+    retry_kwargs={"max_retries": MAX_RETRIES},
+    expires=EXPIRES,
+)
+def scan_bulk(self, targets: List[Dict[str, Any]]):
+    """
+    Scans a set of FTP servers in parallel. The amount of simultaneous connections is limited by
+    BULK_SCAN_CONCURRENCY and every server gets at most FTP_SERVER_DEADLINE seconds.
+
+    :param targets: list of {"endpoint_id": int, "address": str, "port": int}
+    :return: list of {"endpoint_id": int, "result": scan result}
+    """
+
+    pool = ThreadPool(min(BULK_SCAN_CONCURRENCY, max(len(targets), 1)))
+    try:
+        results = pool.map(lambda target: scan_ftp_server(target["address"], target["port"]), targets)
+    finally:
+        pool.close()
+        pool.join()
+
+    return [{"endpoint_id": target["endpoint_id"], "result": result} for target, result in zip(targets, results)]
+
+
+def scan_ftp_server(address: str, port: int):
     # supports_ssl is outdated and implies non-secure connections can be set up.
     results = {
         "address": address,
@@ -312,11 +399,13 @@ def scan(self, address: str, port: int):
         "features": "",
     }
 
+    deadline = monotonic() + FTP_SERVER_DEADLINE
+
     # todo: this only connects to encrypted servers?
     ftp = FTP()  # nosec scanning for insecure ftp is the point
 
     try:
-        ftp.connect(host=address, port=port, timeout=FTP_SERVER_TIMEOUT)
+        ftp.connect(host=address, port=port, timeout=min(FTP_SERVER_TIMEOUT, FTP_SERVER_DEADLINE))
         results["status"] += "Connected"
         log.debug("Connecting to %s " % address)
     except OSError as Ex:
@@ -363,6 +452,11 @@ def scan(self, address: str, port: int):
      MLSD
     """
 
+    if not within_deadline(ftp, deadline):
+        results["status"] += "Deadline exceeded"
+        ftp.close()
+        return results
+
     try:
         results["features"] = ftp.voidcmd("FEAT")
         results["supports_tls"] = "AUTH TLS" in results["features"]
@@ -375,11 +469,11 @@ def scan(self, address: str, port: int):
         results["status"] += "FEAT Command: " + getattr(Ex, "message", repr(Ex))
 
     # Even if the feat command delivered nothing, we're doing to AUTH anyway.
-    if not results["supports_tls"] and not results["supports_ssl"]:
+    if not results["supports_tls"] and not results["supports_ssl"] and within_deadline(ftp, deadline):
         results["supports_tls"], result = try_tls(ftp)
         results["status"] += "Supports tls: %s" % result
 
-        if not results["supports_tls"]:
+        if not results["supports_tls"] and within_deadline(ftp, deadline):
             # the fallback, even if it's not as secure.
             results["supports_ssl"], result = try_ssl(ftp)
             results["status"] += "Supports ssl: %s" % result
@@ -392,6 +486,11 @@ def scan(self, address: str, port: int):
     #     pass
 
     # try to gracefully close the connection, if that's not accepted by the server we flip the table and leave.
+    if not within_deadline(ftp, deadline):
+        ftp.close()
+        results["status"] += "Deadline exceeded, force closed connection"
+        return results
+
     try:
         ftp.quit()
         results["status"] += "Quit successfully"
@@ -402,6 +501,25 @@ def scan(self, address: str, port: int):
     return results
 
 
+def within_deadline(ftp: FTP, deadline: float) -> bool:
+    """
+    Limits the time the next command on this connection may take to what is left until the deadline.
+
+    :return: False if the deadline has already passed.
+    """
+    remaining = deadline - monotonic()
+    if remaining <= 0:
+        return False
+
+    try:
+        ftp.sock.settimeout(min(FTP_SERVER_TIMEOUT, remaining))
+    except (AttributeError, OSError):
+        # connection has been closed by the other side
+        return False
+
+    return True
+
+
 def try_ssl(ftp):
     try:
         ftp.voidcmd("AUTH SSL")
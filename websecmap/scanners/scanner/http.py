@@ -41,6 +41,7 @@ from django.conf import settings
 from requests import HTTPError, ReadTimeout, Request, Session, Timeout
 from requests.exceptions import ConnectionError, SSLError, ChunkedEncodingError, ContentDecodingError, ConnectTimeout
 
+from websecmap.app.instrumentation import timed
 from websecmap.celery import app
 from websecmap.organizations.models import Organization, Url
 from websecmap.scanners import plannedscan
@@ -262,6 +263,7 @@ def get_ips(url: str):
 
 
 # It's possible you don't get an address back, it could not be configured on our or their side.
+@timed("dns", record="A")
 def get_ipv4(url: str):
     # https://www.iana.org/assignments/iana-ipv4-special-registry/iana-ipv4-special-registry.xhtml
     ipv4 = ""
@@ -288,6 +290,7 @@ def get_ipv4(url: str):
 
 
 # It's possible you don't get an address back, it could not be configured on our or their side.
+@timed("dns", record="AAAA")
 def get_ipv6(url: str):
     # https://www.iana.org/assignments/iana-ipv6-special-registry/iana-ipv6-special-registry.xhtml
     ipv6 = ""
@@ -766,6 +769,7 @@ def check_network(code_location=""):
         log.info("IPv6 could be reached via %s" % code_location)
 
 
+@timed("http", scanner="plain_https")
 def redirects_to_safety(url: str):
     """
     Also includes the ip-version of the endpoint. Implies that the endpoint resolves.
@@ -8,7 +8,8 @@ import json
 import logging
 from copy import copy
 from datetime import datetime, timedelta
-from typing import List, Tuple, Dict, Any
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple
 
 import pytz
 import tldextract
@@ -19,7 +20,7 @@ from django.db import transaction
 from websecmap.celery import app
 from websecmap.organizations.models import Url
 from websecmap.scanners.models import Endpoint, InternetNLV2Scan, InternetNLV2StateLog, EndpointGenericScan
-from websecmap.scanners.scanmanager import store_endpoint_scan_result
+from websecmap.scanners.scanmanager import store_endpoint_scan_result, store_endpoint_scan_results
 from websecmap.scanners.scanner.internet_nl_v2 import InternetNLApiSettings, register, result, status
 
 log = logging.getLogger(__name__)
@@ -545,37 +546,65 @@ def result_administration(response: Tuple[int, dict], scan_id: int):
     update_state(scan.pk, "scan results stored", "")
 
 
+# The amount of domains that are processed in one go. Each chunk resolves its endpoints in a single query and stores
+# all results of all domains in the chunk using bulk writes.
+PROCESSING_CHUNK_SIZE = 250
+
+SCAN_TYPE_TO_PROTOCOL = {
+    # mail is used for web security map, it is a subset of mail servers that dedupes servers on cnames.
+    "mail": "dns_mx_no_cname",
+    # dns soa are internet.nl dashboard scans that have a different requirement set for the mailserver endpoint
+    "mail_dashboard": "dns_soa",
+    # web scans are only used by the internet.nl dashboard...
+    "web": "dns_a_aaaa",
+}
+
+
 @app.task(queue="storage")
 def process_scan_results(scan_id: int):
-    scan_type_to_protocol = {
-        # mail is used for web security map, it is a subset of mail servers that dedupes servers on cnames.
-        "mail": "dns_mx_no_cname",
-        # dns soa are internet.nl dashboard scans that have a different requirement set for the mailserver endpoint
-        "mail_dashboard": "dns_soa",
-        # web scans are only used by the internet.nl dashboard...
-        "web": "dns_a_aaaa",
-    }
-
     scan = InternetNLV2Scan.objects.all().filter(pk=scan_id).first()
     if not scan:
         log.debug(f"Could not retrieve scan {scan_id}.")
         return []
 
-    domains = scan.retrieved_scan_report.keys()
-
-    for domain in domains:
+    report = scan.retrieved_scan_report
+    total_domains = len(report)
+    processed_domains = 0
 
-        store_domain_scan_results(
-            domain=domain,
-            scan_data=scan.retrieved_scan_report[domain],
+    for chunk in chunked_scan_report(report, PROCESSING_CHUNK_SIZE):
+        store_domain_scan_results_in_bulk(
+            domains_scan_data=chunk,
             scan_type=scan.type,
-            endpoint_protocol=scan_type_to_protocol[scan.type],
+            endpoint_protocol=SCAN_TYPE_TO_PROTOCOL[scan.type],
         )
+        processed_domains += len(chunk)
+
+        # only log progress on large scans, small scans are processed in one go anyway.
+        if total_domains > PROCESSING_CHUNK_SIZE:
+            update_state(
+                scan.pk, "processing scan results", f"Processed {processed_domains} of {total_domains} domains."
+            )
 
     update_state(scan.pk, "scan results processed", "")
     update_state(scan.pk, "finished", "")
 
 
+def chunked_scan_report(report: Dict[str, dict], chunk_size: int) -> Iterator[Dict[str, dict]]:
+    """
+    Walks through the domains of a scan report in chunks, without copying the whole report.
+
+    :param report: retrieved scan report, {domain: scan_data}
+    :param chunk_size: the maximum number of domains per chunk
+    :return: iterator of dicts with at most chunk_size domains.
+    """
+    domains = iter(report.items())
+    while True:
+        chunk = dict(islice(domains, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def reuse_last_fields_and_set_them_to_error(endpoint_id: int):
 
     if not endpoint_id:
@@ -594,11 +623,11 @@ def reuse_last_fields_and_set_them_to_error(endpoint_id: int):
         )
 
 
-# todo: store this on another queue: there are so many results that it blocks the entire storage worker...
-# should be a scan management queue that just does planned scans?
-@app.task(queue="storage")
-def store_domain_scan_results(domain: str, scan_data: dict, scan_type: str, endpoint_protocol: str):
+def store_domain_scan_results_in_bulk(domains_scan_data: Dict[str, dict], scan_type: str, endpoint_protocol: str):
     """
+    Stores the scan results of a set of domains. The endpoints of all domains are retrieved in a single query and
+    all results of all domains are written in one bulk operation.
+
         The error status only occurs when there was a crash during the scanning of a domain. This is usually
         a bug in the internet.nl scanner, which has to be fixed over time. An error will be emitted when
         an error is found. All last metrics from the domain (whatever the metric will be, even outdated metrics),
@@ -632,28 +661,55 @@ def store_domain_scan_results(domain: str, scan_data: dict, scan_type: str, endp
             }
         }
 
-    :return:
-    :param domain: a domain name, such as "internet.nl"
-    :param scan_data: the scan data for a specific domain
+    :param domains_scan_data: {domain: scan_data}, such as {"internet.nl": {...}}
     :param scan_type: web, mail, mail_dashboard
     :param endpoint_protocol: to what endpoint of this domain the result data has to be connected.
     :return:
     """
 
-    # Match the endpoint. We're not implicitly adding endpoints.
-    endpoint = Endpoint.objects.all().filter(protocol=endpoint_protocol, url__url=domain, is_dead=False).first()
+    # Match the endpoints. We're not implicitly adding endpoints.
+    endpoints = get_endpoints_of_domains(list(domains_scan_data.keys()), endpoint_protocol)
 
-    if not endpoint:
-        log.debug("No matching endpoint found, perhaps this was deleted / resolvable meanwhile. Skipping")
-        return
+    scan_results = []
+    for domain, scan_data in domains_scan_data.items():
+        endpoint_id = endpoints.get(domain, None)
 
-    if scan_data["status"] == "error":
-        log.error(
-            "Domain received an error from internet.nl. Bug in the scanner? Previous results are now set to error.",
-            extra={"domain": domain},
-        )
-        reuse_last_fields_and_set_them_to_error(endpoint.pk)
-        return
+        if not endpoint_id:
+            log.debug("No matching endpoint found, perhaps this was deleted / resolvable meanwhile. Skipping")
+            continue
+
+        if scan_data["status"] == "error":
+            log.error(
+                "Domain received an error from internet.nl. Bug in the scanner? Previous results are now set to error.",
+                extra={"domain": domain},
+            )
+            reuse_last_fields_and_set_them_to_error(endpoint_id)
+            continue
+
+        scan_results += domain_scan_results(endpoint_id, scan_data, scan_type)
+
+    store_endpoint_scan_results(scan_results)
+
+
+def get_endpoints_of_domains(domains: List[str], endpoint_protocol: str) -> Dict[str, int]:
+    """
+    Returns the first alive endpoint with the given protocol for each of the domains: {domain: endpoint_id}
+    """
+    endpoints = (
+        Endpoint.objects.all()
+        .filter(protocol=endpoint_protocol, url__url__in=domains, is_dead=False)
+        .order_by("-pk")
+        .values_list("url__url", "pk")
+    )
+
+    # ordered descending, so the first endpoint is added last and wins. This is the same as .first().
+    return {domain: endpoint_id for domain, endpoint_id in endpoints}
+
+
+def domain_scan_results(endpoint_id: int, scan_data: dict, scan_type: str) -> List[Dict[str, Any]]:
+    """
+    Translates the scan data of a single domain into a list of scan results for store_endpoint_scan_results.
+    """
 
     # link changes every time, so can't save that as message. -> _wrong_
     # The link changes every time and thus does the link to the report that will be referred in our own reports
@@ -663,13 +719,15 @@ def store_domain_scan_results(domain: str, scan_data: dict, scan_type: str, endp
     # which was from another user. But that will take all updates from that scan, so it's up to date. These are
     # edge cases that are in here by design: we always want to get data from a certain point in time, regardless
     # who started the scan.
-    store_endpoint_scan_result(
-        scan_type=f"internet_nl_{scan_type}_overall_score",
-        endpoint_id=endpoint.pk,
-        rating=scan_data["scoring"]["percentage"],
-        message=scan_data["report"]["url"],
-        evidence=scan_data["report"]["url"],
-    )
+    scan_results = [
+        {
+            "scan_type": f"internet_nl_{scan_type}_overall_score",
+            "endpoint_id": endpoint_id,
+            "rating": scan_data["scoring"]["percentage"],
+            "message": scan_data["report"]["url"],
+            "evidence": scan_data["report"]["url"],
+        }
+    ]
 
     api_v2_categories_to_v1_categories = {
         "mail": {
@@ -700,18 +758,23 @@ def store_domain_scan_results(domain: str, scan_data: dict, scan_type: str, endp
         # to keep APIv2 field names in line with APIv1, so we don't have to rename fields and all reports stay valid.
         scan_type_field = f"internet_nl_{scan_type}_{api_v2_categories_to_v1_categories[scan_type][category]}"
 
-        store_endpoint_scan_result(
-            scan_type=scan_type_field,
-            endpoint_id=endpoint.pk,
-            rating=scan_data["results"]["categories"][category]["status"],
-            message=json.dumps(
-                {"translation": scan_data["results"]["categories"][category]["verdict"], "technical_details_hash": ""}
-            ),
-            evidence=scan_data["report"]["url"],
+        scan_results.append(
+            {
+                "scan_type": scan_type_field,
+                "endpoint_id": endpoint_id,
+                "rating": scan_data["results"]["categories"][category]["status"],
+                "message": json.dumps(
+                    {
+                        "translation": scan_data["results"]["categories"][category]["verdict"],
+                        "technical_details_hash": "",
+                    }
+                ),
+                "evidence": scan_data["report"]["url"],
+            }
         )
 
     # standard tests:
-    store_test_results(endpoint.pk, scan_data["results"]["tests"])
+    scan_results += scan_results_from_test_results(endpoint_id, scan_data["results"]["tests"])
 
     # prepare for calculated results
     scan_data["results"]["calculated_results"] = {}
@@ -720,10 +783,14 @@ def store_domain_scan_results(domain: str, scan_data: dict, scan_type: str, endp
     elif scan_type == "mail_dashboard":
         scan_data = calculate_forum_standaardisatie_views_mail(scan_data)
 
-    store_test_results(endpoint.pk, scan_data["results"]["calculated_results"])
+    scan_results += scan_results_from_test_results(endpoint_id, scan_data["results"]["calculated_results"])
+
+    return scan_results
 
 
-def store_test_results(endpoint_id, test_results):
+def scan_results_from_test_results(endpoint_id, test_results) -> List[Dict[str, Any]]:
+    scan_results = []
+
     # this way new fields are automatically added
     test_results_keys = test_results.keys()
 
@@ -741,16 +808,20 @@ def store_test_results(endpoint_id, test_results):
         # version, so all the rest of the stuff is kept.
         dumped_technical_details = ""
         technical_details_hash = hashlib.md5(dumped_technical_details.encode("utf-8")).hexdigest()
-        store_endpoint_scan_result(
-            scan_type=scan_type,
-            endpoint_id=endpoint_id,
-            rating=test_result["status"],
-            message=json.dumps(
-                {"translation": test_result["verdict"], "technical_details_hash": technical_details_hash}
-            ),
-            evidence="",
+        scan_results.append(
+            {
+                "scan_type": scan_type,
+                "endpoint_id": endpoint_id,
+                "rating": test_result["status"],
+                "message": json.dumps(
+                    {"translation": test_result["verdict"], "technical_details_hash": technical_details_hash}
+                ),
+                "evidence": "",
+            }
         )
 
+    return scan_results
+
 
 def add_calculation(scan_data, new_key: str, required_values: List[str]):
     lowest_value = lowest_value_in_results(scan_data, required_values)
@@ -1,10 +1,11 @@
 import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Union
 
 import pytz
 from celery import group
-from django.utils import timezone
+from django.db.models import Count, Q
+from statshog.defaults.django import statsd
 
 from websecmap.celery import Task, app
 from websecmap.map.report import update_report_tasks
@@ -15,6 +16,34 @@ from websecmap.scanners.tasks import crawl_tasks, explore_tasks, scan_tasks
 
 log = logging.getLogger(__package__)
 
+"""
+Onboarding is a state machine, every url is in one of these stages:
+
+V ""                    new url
+V endpoint_discovery    endpoints are discovered on the url
+V endpoint_finished     done, ready for next stage
+V scans_running         running a series of scans on the endpoints
+V scans_finished        done, ready for next stage
+V crawling              trying to find more endpoints (via DNS)
+- onboarded             onboarding completed
+
+Every time compose_task runs, all urls that are ready for a next stage are moved to the running stage of that next
+stage with a single update per stage. Then the tasks for that stage are created per chunk of urls, which move the
+urls to the finished stage with a single update when done.
+"""
+
+# A stage that is ready for a next step: the stage the url is in while that step is running.
+NEXT_STAGE = {"": "endpoint_discovery", "endpoint_finished": "scans_running", "scans_finished": "crawling"}
+
+# A running stage: the stage the url is in when the tasks of that stage are done.
+FINISHED_STAGE = {"endpoint_discovery": "endpoint_finished", "scans_running": "scans_finished", "crawling": "onboarded"}
+
+# A running stage: the stage to retry from when the tasks never finished.
+PREVIOUS_STAGE = {running: ready for ready, running in NEXT_STAGE.items()}
+
+# Tls qualys scans are inserted per 25. This is due to behaviour of the qualys service.
+CHUNK_SIZE = 25
+
 
 def compose_task(
     organizations_filter: dict = dict(), urls_filter: dict = dict(), endpoints_filter: dict = dict(), **kwargs
@@ -26,20 +55,7 @@ def compose_task(
     discovered but the next task hanged. This is extensively documented here:
     https://github.com/celery/celery/issues/4681
 
-    Therefore this onboarding task creates different sets of tasks per stage per url.
-
-    Stage:
-    V ""
-    V endpoint_discovery    endpoints are discovered on the url
-    V endpoint_finished     done, ready for next stage
-    V scans_running         running a series of scans on the endpoints
-    V scans_finished        done, ready for next stage
-    V crawling              trying to find more endpoints (via DNS)
-    V crawl_finished        IMPLICIT! Last step will not be saved.
-    - onboarded             onboarding completed
-
-    Todo: date the last step was set. So we can find processes that failed and retry.
-    Todo: run this every minute.
+    Therefore this onboarding task creates different sets of tasks per stage per chunk of urls.
     """
 
     # Resetting the outdated onboarding has a risk: if the queue takes longer than the onboarding tasks to finish the
@@ -53,130 +69,137 @@ def compose_task(
     urls = Url.objects.all().filter(q_configurations_to_scan(level="url"), **urls_filter)
     urls = url_filters(urls, organizations_filter, urls_filter, endpoints_filter)
 
-    log.info("Found %s urls to create tasks for." % len(urls))
-
     # it's impossible to set the first stage "endpoint_discovery" in a task, as the task might take an hour
     # to complete (depending of how much work is in the queue. Could be days. So therefore to trigger the first
-    # stage and not to re-submit the url for onboarding (again and again and again) the first stage is set in
-    # this routine for each of the steps.
+    # stage and not to re-submit the url for onboarding (again and again and again) the running stage is set here.
+    tasks = []
+    for ready_stage, running_stage in NEXT_STAGE.items():
+        url_ids = move_to_stage(urls, ready_stage, running_stage)
+        if not url_ids:
+            continue
 
-    # some urls can be returned a number of times if they are shared amongs organizations, this reduces that:
-    # note that mysql and sqlite dont support DISTINCT ON.
-    urls = list(set(urls))
+        log.info(f"Moved {len(url_ids)} urls from stage '{ready_stage}' to '{running_stage}'.")
+        claimed_urls = list(Url.objects.all().filter(id__in=url_ids).only("id", "url").order_by("id"))
+        for chunk in in_chunks(claimed_urls, CHUNK_SIZE):
+            tasks.append(stage_tasks(running_stage, chunk))
 
-    endpoint_discovery_urls = []
-    scans_running_urls: List[int] = []
-    crawling_urls = []
+    send_stage_metrics()
 
-    tasks = []
-    for url in urls:
-        log.info("Url %s is at onboarding_stage: %s", url, url.onboarding_stage)
+    log.info("Created %s tasks to be performed." % len(tasks))
+    return group(tasks)
 
-        # you will see this happen per worker-size (so for example per 20 things)
-        if not url.onboarding_stage:  # While developing: or url.onboarding_stage == "endpoint_discovery":
-            log.info("Exploring on: %s", url)
-            update_stage([url], "endpoint_discovery")
-            endpoint_discovery_urls.append(url)
 
-        elif url.onboarding_stage in ["endpoint_finished"]:  # dev: , "scans_running"
-            log.info("Scanning on: %s", url)
-            update_stage([url], "scans_running")
-            scans_running_urls.append(url.pk)
+def stage_tasks(running_stage: str, urls: List[Url]) -> Task:
+    url_ids = [url.id for url in urls]
 
-        elif url.onboarding_stage == "scans_finished":
-            log.info("Crawling on: %s", url)
-            update_stage([url], "crawling")
-            crawling_urls.append(url)
+    if running_stage == "endpoint_discovery":
+        return explore_tasks(urls) | update_stage.si(url_ids, "endpoint_finished")
 
-        else:
-            # Do nothing when wheels are set in motion or an unknown state is encountered.
-            pass
+    if running_stage == "scans_running":
+        return scan_tasks(urls) | update_report_tasks(url_ids) | update_stage.si(url_ids, "scans_finished")
 
-    for url in endpoint_discovery_urls:
-        tasks.append(explore_tasks(url) | update_stage.si([url], "endpoint_finished"))
+    return crawl_tasks(urls) | finish_onboarding.si(url_ids)
 
-    chunks = in_chunks(scans_running_urls, 25)
-    for chunk in chunks:
-        tasks.append(scan_tasks(chunk) | update_report_tasks(chunk) | update_stage.si(chunk, "scans_finished"))
 
-    for url in crawling_urls:
-        tasks.append(crawl_tasks(url) | finish_onboarding.si(url))
+def in_stage(stage: str) -> Q:
+    # new urls have no onboarding stage at all
+    if not stage:
+        return Q(onboarding_stage="") | Q(onboarding_stage__isnull=True)
+    return Q(onboarding_stage=stage)
 
-    log.info("Created %s tasks to be performed." % len(tasks))
-    task = group(tasks)
 
-    # log.info("Task:")
-    # log.info(task)
+def move_to_stage(urls, current_stage: str, stage: str) -> List[int]:
+    """
+    Moves urls from one stage to another with an update per chunk. Returns the ids of the urls that have been moved.
 
-    return task
+    The update only changes urls that are still in their current stage, so when onboarding runs twice at the same
+    time a url is not moved (and onboarded) twice.
+    """
+    moved = []
+    now = datetime.now(pytz.utc)
+    for chunk in in_chunks(list(set(urls.filter(in_stage(current_stage)).values_list("id", flat=True))), 500):
+        changed = (
+            Url.objects.all()
+            .filter(in_stage(current_stage), id__in=chunk)
+            .update(onboarding_stage=stage, onboarding_stage_set_on=now)
+        )
+        if changed != len(chunk):
+            # some urls have been moved by someone else in the meantime
+            chunk = list(
+                Url.objects.all()
+                .filter(id__in=chunk, onboarding_stage=stage, onboarding_stage_set_on=now)
+                .values_list("id", flat=True)
+            )
+        moved += chunk
+
+    if moved:
+        statsd.incr("onboarding", len(moved), tags={"stage": stage})
+    return moved
+
+
+def send_stage_metrics() -> Dict[str, int]:
+    """The number of urls in every stage of onboarding, the backlog of every stage."""
+    stages = dict(
+        Url.objects.all()
+        .filter(onboarded=False)
+        .order_by()
+        .values_list("onboarding_stage")
+        .annotate(amount=Count("id"))
+        .values_list("onboarding_stage", "amount")
+    )
+
+    stages[""] = stages.get("", 0) + stages.pop(None, 0)
+
+    for stage in list(NEXT_STAGE.keys()) + list(FINISHED_STAGE.keys()):
+        statsd.gauge("onboarding_stage", stages.get(stage, 0), tags={"stage": stage or "new"})
+
+    return stages
 
 
 def reset_expired_onboards():
     # If the queues don't finish in 7 days, you have a problem somewhere. This will add to that problem by adding
     # EVEN MORE tasks to the queue. So an unmanaged system will run out of space somewhere sometime :)
-    expired = list(Url.objects.all().filter(onboarding_stage_set_on__lte=datetime.now(pytz.utc) - timedelta(days=7)))
-
-    # some older tasks might never have an onboarding stage due to a bug. add those too:
-    expired += list(Url.objects.all().filter(onboarding_stage_set_on__isnull=True))
-
-    for url in expired:
-        reset_onboarding_status(url)
-
+    # some older tasks might never have an onboarding stage due to a bug. add those too.
+    reset_onboarding(
+        Url.objects.all().filter(
+            Q(onboarding_stage_set_on__lte=datetime.now(pytz.utc) - timedelta(days=7))
+            | Q(onboarding_stage_set_on__isnull=True)
+        )
+    )
 
-def reset_onboarding_status(url):
-    # set the task a step back.
-    # retry endpoint discovery if that didn't finish.
-    if url.onboarding_stage == "endpoint_discovery":
-        url.onboarding_stage = ""
 
-    # retry scanning after discovery of endpoints
-    if url.onboarding_stage == "scans_running":
-        url.onboarding_stage = "endpoint_finished"
+def reset_onboarding(urls):
+    """Sets urls that are in a running stage a step back, so the stage is retried."""
+    for running_stage, previous_stage in PREVIOUS_STAGE.items():
+        changed = urls.filter(onboarding_stage=running_stage).update(onboarding_stage=previous_stage)
+        if changed:
+            log.info(f"Reset {changed} urls from stage '{running_stage}' to '{previous_stage}'.")
+            statsd.incr("onboarding_reset", changed, tags={"stage": running_stage})
 
-    # retry crawling after scans are finished
-    if url.onboarding_stage == "crawling":
-        url.onboarding_stage = "scans_finished"
 
-    url.save()
-
-
-def forward_onboarding_status(url):
-    # set the task a step back.
-    # retry endpoint discovery if that didn't finish.
-    if url.onboarding_stage == "endpoint_discovery":
-        url.onboarding_stage = "endpoint_finished"
-
-    # retry scanning after discovery of endpoints
-    if url.onboarding_stage == "scans_running":
-        url.onboarding_stage = "scans_finished"
-
-    # retry crawling after scans are finished
-    if url.onboarding_stage == "crawling":
-        url.onboarded = True
-        url.onboarded_on = timezone.now()
-        url.onboarding_stage = "onboarded"
-
-    url.save()
+def forward_onboarding(urls):
+    """Sets urls that are in a running stage to the finished stage, as if the running tasks are done."""
+    for running_stage, finished_stage in FINISHED_STAGE.items():
+        url_ids = list(urls.filter(onboarding_stage=running_stage).values_list("id", flat=True))
+        if url_ids:
+            update_stage(url_ids, finished_stage)
 
 
 @app.task(queue="storage")
-def finish_onboarding(url):
-    log.info("Finishing onboarding of %s", url)
-    url.onboarded = True
-    url.onboarded_on = timezone.now()
-    url.onboarding_stage = "onboarded"
-    url.onboarding_stage_set_on = datetime.now(pytz.utc)
-    url.save(update_fields=["onboarded_on", "onboarded", "onboarding_stage", "onboarding_stage_set_on"])
-    return True
+def finish_onboarding(urls: Union[List[int], Url]):
+    # A single url is accepted for tasks that were created before urls were onboarded in chunks.
+    return update_stage([urls] if isinstance(urls, Url) else urls, "onboarded")
 
 
 @app.task(queue="storage")
-def update_stage(urls: List[Url], stage=""):
+def update_stage(urls: List[Union[int, Url]], stage=""):
+    url_ids = [url.pk if isinstance(url, Url) else url for url in urls]
+    log.info(f"Updating onboarding_stage of {len(url_ids)} urls to {stage}.")
 
-    for url in urls:
-        log.info("Updating onboarding_stage of %s from %s to %s", url, url.onboarding_stage, stage)
-        url.onboarding_stage = stage
-        url.onboarding_stage_set_on = datetime.now(pytz.utc)
-        url.save(update_fields=["onboarding_stage", "onboarding_stage_set_on"])
+    values = {"onboarding_stage": stage, "onboarding_stage_set_on": datetime.now(pytz.utc)}
+    if stage == "onboarded":
+        values.update({"onboarded": True, "onboarded_on": datetime.now(pytz.utc)})
 
+    changed = Url.objects.all().filter(id__in=url_ids).update(**values)
+    statsd.incr("onboarding", changed, tags={"stage": stage})
     return True
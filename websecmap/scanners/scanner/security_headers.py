@@ -10,6 +10,7 @@ import urllib3
 from celery import Task, group
 from requests import ConnectionError, ConnectTimeout, HTTPError, ReadTimeout, Timeout, Response
 
+from websecmap.app.instrumentation import timed
 from websecmap.celery import app
 from websecmap.organizations.models import Organization, Url
 from websecmap.scanners import plannedscan
@@ -435,6 +436,7 @@ def get_headers(self, uri_uri: str) -> Union[Dict[str, Any], bool]:
             return False
 
 
+@timed("http", scanner="security_headers")
 def get_headers_request(uri_url: str) -> Response:
     """
     Issue #94:
@@ -7,24 +7,31 @@ from datetime import datetime
 from typing import List, Any, Dict
 
 import pytz
+import requests
 from celery import Task, group
 from django.db import connection
 from django.db.models import Q
-from tenacity import before_log, retry, wait_fixed
+from tenacity import before_log, retry, retry_if_exception_type, stop_after_attempt, wait_fixed
 
+from websecmap.app.constance import constance_cached_value
 from websecmap.celery import app
 from websecmap.map.logic.map_defaults import get_country
 from websecmap.organizations.models import Organization, Url
 from websecmap.scanners import plannedscan
+from websecmap.scanners.models import CertificateTransparencyCache
 from websecmap.scanners.scanner.__init__ import q_configurations_to_scan, unique_and_random, url_filters
+from websecmap.scanners.scanner.certificate_transparency import (
+    entries_from_dump,
+    is_remote_source,
+    retrieve_entries,
+    subdomains_from_entries,
+)
 from websecmap.scanners.scanner.http import get_ips
 
 # Include DNSRecon code from an external dependency. This is cloned recursively and placed outside the django app.
 from websecmap.scanners.scanner.utils import get_random_nameserver
 from dnsrecon.__main__ import ds_zone_walk, brute_domain
 from dnsrecon.lib.dnshelper import DnsHelper
-import re
-import requests
 
 
 log = logging.getLogger(__package__)
@@ -70,15 +77,37 @@ def compose_manual_discover_task(organizations_filter: dict = dict(), urls_filte
 
 
 def compose_discover_task(urls) -> Task:
-    task = group(
-        certificate_transparency_scan.si(url.url)
-        | store_certificate_transparency_results.s(url.id)
-        | nsec_scan.si(url.url)
-        | dnsrecon_parse_report_contents.s(url.as_dict())
-        | plannedscan.finish.si("discover", "subdomains", url.pk)
-        for url in urls
+    # continue where the previous certificate transparency lookup of each url stopped.
+    last_certificate_ids = dict(
+        CertificateTransparencyCache.objects.all()
+        .filter(url__in=[url.pk for url in urls])
+        .values_list("url_id", "last_certificate_id")
+    )
+
+    if is_remote_source(constance_cached_value("CERTIFICATE_TRANSPARENCY_SOURCE")):
+        return group(
+            certificate_transparency_scan.si(url.url, last_certificate_ids.get(url.pk, 0))
+            | store_certificate_transparency_results.s(url.id)
+            | nsec_scan.si(url.url)
+            | dnsrecon_parse_report_contents.s(url.as_dict())
+            | plannedscan.finish.si("discover", "subdomains", url.pk)
+            for url in urls
+        )
+
+    if not urls:
+        return group([])
+
+    # a dump is read once for all urls, instead of once per url.
+    return (
+        certificate_transparency_dump_scan.si({url.url: last_certificate_ids.get(url.pk, 0) for url in urls})
+        | store_certificate_transparency_dump_results.s({url.url: url.id for url in urls})
+        | group(
+            nsec_scan.si(url.url)
+            | dnsrecon_parse_report_contents.s(url.as_dict())
+            | plannedscan.finish.si("discover", "subdomains", url.pk)
+            for url in urls
+        )
     )
-    return task
 
 
 def filter_verify(
@@ -259,7 +288,7 @@ def discover_wildcard(url: str):
 
 
 @app.task(queue="storage")
-def dnsrecon_parse_report_contents(contents: List, url: Dict[str, Any]):
+def dnsrecon_parse_report_contents(contents: List, url: Dict[str, Any]) -> List[int]:
     """
     [
         {'type': 'A', 'name': 'basisbeveiliging.nl', 'address': '1.1.1.1'},
@@ -267,7 +296,7 @@ def dnsrecon_parse_report_contents(contents: List, url: Dict[str, Any]):
         {'type': 'A', 'name': 'something.somthing.something.darkside.example.com', 'address': 'no_ip'}
     ]
     """
-    addedlist = []
+    subdomains = set()
     for record in contents:
         # brutally ignore all kinds of info from other structures.
         log.debug("Record: %s" % record)
@@ -291,16 +320,17 @@ def dnsrecon_parse_report_contents(contents: List, url: Dict[str, Any]):
             if subdomain[0:2] == "*.":
                 subdomain = subdomain[2 : len(subdomain)]
 
-            # will check for resolve and if this is a wildcard.
-            db_url = Url.objects.all().filter(pk=url["id"]).first()
-            if not db_url:
-                continue
+            subdomains.add(subdomain.lower())
+
+    if not subdomains:
+        return []
 
-            added = db_url.add_subdomain(subdomain.lower())
-            if added:
-                addedlist.append(added)
+    db_url = Url.objects.all().filter(pk=url["id"]).first()
+    if not db_url:
+        return []
 
-    return addedlist
+    # will check for resolve and if this is a wildcard.
+    return db_url.add_subdomains_bulk(list(subdomains))
 
 
 # place it on the IPv4 queue, so it can scale using cloud workers :)
@@ -421,66 +451,105 @@ def remove_wildcards(urls: List[Url]):
 
 
 # don't overload the crt.sh service, rate limit
-# todo: create a generic: go to $page with $parameter and scrape all urls.
 @app.task(ignore_result=True, queue="discover_subdomains", rate_limit="2/m")
-@retry(wait=wait_fixed(30), before=before_log(log, logging.DEBUG))
-def certificate_transparency_scan(url: str):
+@retry(
+    wait=wait_fixed(30),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception_type((requests.ConnectionError, requests.Timeout)),
+    reraise=True,
+    before=before_log(log, logging.DEBUG),
+)
+def certificate_transparency_scan(url: str, last_certificate_id: int = 0) -> Dict[str, Any]:
     """
-    Checks the certificate transparency database for subdomains. Using a regex the subdomains
-    are extracted. This method is extremely fast and reliable: these certificates all exist.
+    Checks the certificate transparency database for subdomains. This method is extremely fast and reliable: these
+    certificates all exist.
+
+    crt.sh cannot be asked for certificates newer than a given id, so the complete list is retrieved as JSON. Only
+    the certificates that are newer than last_certificate_id are inspected.
+
+    Only network errors are retried. An error answer or malformed JSON results in no subdomains, without advancing
+    last_certificate_id, so these certificates are inspected again on the next discovery.
 
     Hooray for transparency :)
-    :return:
+    :return: {"subdomains": ["www", ...], "last_certificate_id": 4199364211}
+    """
+    source = constance_cached_value("CERTIFICATE_TRANSPARENCY_SOURCE")
+    try:
+        entries = retrieve_entries(url, source)
+    except (requests.HTTPError, ValueError) as error:
+        log.warning(f"Could not retrieve certificates of {url}: {error}")
+        return {"subdomains": [], "last_certificate_id": last_certificate_id}
+    return certificate_transparency_subdomains(url, entries, last_certificate_id)
+
+
+# Reading a local dump does not bother anyone, so there is no rate limit.
+@app.task(ignore_result=True, queue="discover_subdomains")
+def certificate_transparency_dump_scan(last_certificate_ids: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the subdomains of all urls from a dump in a single pass.
+
+    :param last_certificate_ids: {"faalkaart.nl": 4199364211, ...}
+    :return: the result per url, {"faalkaart.nl": {"subdomains": ["www", ...], "last_certificate_id": ...}, ...}
     """
+    source = constance_cached_value("CERTIFICATE_TRANSPARENCY_SOURCE")
+    entries = entries_from_dump(last_certificate_ids.keys(), source)
+    return {
+        url: certificate_transparency_subdomains(url, entries[url], last_certificate_id)
+        for url, last_certificate_id in last_certificate_ids.items()
+    }
 
-    # https://crt.sh/?q=%25.zutphen.nl
-    crt_sh_url = "https://crt.sh/?q=%25." + str(url)
-    pattern = r"[^\s%>]*\." + str(url.replace(".", r"\."))  # harder string formatting :)
-
-    response = requests.get(crt_sh_url, timeout=(30, 30), allow_redirects=False)
-    matches = re.findall(pattern, response.text)
-
-    subdomains = []
-    for match in matches:
-        # handle wildcards, sometimes subdomains have nice features.
-        # examples: *.apps.domain.tld.
-        # done: perhaps store that it was a wildcard cert, for further inspection?
-        # - no we don't as that can change and this information can be outdated. We will check on that using any
-        # brute force dns scan and some other places. Adding the logic here will increase complexity.
-        match = match.replace("*.", "")
-        if match != url:
-            subdomains.append(match[0 : len(match) - len(url) - 1])  # wraps around
-
-    subdomains = [x.lower() for x in subdomains]  # do lowercase normalization elsewhere
-    subdomains = set(subdomains)
-
-    # 25 and '' are created due to the percentage and empty subdomains. Remove them
-    # wildcards (*) are also not allowed.
-    if "" in subdomains:
-        subdomains.remove("")
-    if "25" in subdomains:
-        subdomains.remove("25")
 
+def certificate_transparency_subdomains(url: str, entries, last_certificate_id: int) -> Dict[str, Any]:
+    subdomains, last_certificate_id = subdomains_from_entries(entries, url, last_certificate_id)
     log.debug("Found subdomains: %s" % subdomains)
-    return subdomains
+    return {"subdomains": sorted(subdomains), "last_certificate_id": last_certificate_id}
 
 
 @app.task(queue="storage")
-def store_certificate_transparency_results(subdomains: List[str], url_id) -> List[str]:
-    if not subdomains:
+def store_certificate_transparency_results(result: Dict[str, Any], url_id) -> List[int]:
+    """
+    Only subdomains that have not been seen in certificates of this url before are added. This prevents that the
+    same names are resolved over and over again: certificates are renewed a lot. Names that are not added, because
+    they are not valid or do not resolve, are offered again on every discovery until they exist as url.
+    """
+    if not result:
         return []
 
+    # results of before the discovery was incremental are a plain list of subdomains.
+    if not isinstance(result, dict):
+        result = {"subdomains": result, "last_certificate_id": 0}
+
     db_url = Url.objects.all().filter(id=url_id).first()
     if not db_url:
         return []
 
-    addedlist = []
-    for subdomain in subdomains:
-        added = db_url.add_subdomain(subdomain)
-        if added:
-            addedlist.append(added)
+    cache, _ = CertificateTransparencyCache.objects.get_or_create(url=db_url)
+    known_subdomains = set(cache.known_subdomains)
+    # names that were not added before, for example because they did not resolve, are offered again.
+    new_subdomains = sorted(
+        (set(result["subdomains"]) - known_subdomains) | (set(cache.pending_subdomains) - known_subdomains)
+    )
+
+    added = db_url.add_subdomains_bulk(new_subdomains)
+
+    suffix = f".{db_url.url}"
+    existing = Url.objects.all().filter(url__in=[f"{subdomain}{suffix}" for subdomain in new_subdomains])
+    known_subdomains |= {url[: -len(suffix)] for url in existing.values_list("url", flat=True)}
 
-    return addedlist
+    cache.known_subdomains = sorted(known_subdomains)
+    cache.pending_subdomains = sorted(set(new_subdomains) - known_subdomains)
+    cache.last_certificate_id = max(cache.last_certificate_id, result["last_certificate_id"])
+    cache.last_discovery = datetime.now(pytz.utc)
+    cache.save()
+
+    log.debug(f"Certificate transparency: {len(new_subdomains)} new subdomains for {db_url}, {len(added)} added.")
+    return added
+
+
+@app.task(queue="storage")
+def store_certificate_transparency_dump_results(results: Dict[str, Dict[str, Any]], url_ids: Dict[str, int]):
+    for url, result in results.items():
+        store_certificate_transparency_results(result, url_ids[url])
 
 
 # this is a fairly safe scanner, and can be run pretty quiclkly (no clue if parralelisation works)
@@ -32,6 +32,7 @@ from celery import Task, group
 from django.utils import timezone
 from tenacity import RetryError, before_log, retry, wait_fixed
 
+from websecmap.app.instrumentation import timed
 from websecmap.celery import app
 from websecmap.organizations.models import Organization, Url
 from websecmap.scanners import plannedscan
@@ -505,6 +506,7 @@ def report_to_console(domain: str, data: Dict[str, Any]):
 # Qualys is a service that is constantly attacked / ddossed and very unreliable. So try a couple of times before
 # giving up. It can even be down for half a day. Waiting a little between retries.
 @retry(wait=wait_fixed(30), before=before_log(log, logging.DEBUG))
+@timed("http", scanner="tls_qualys")
 def service_provider_scan_via_api_with_limits(proxy: Dict[str, Any], domain: str):
     # API Docs: https://github.com/ssllabs/ssllabs-scan/blob/stable/ssllabs-api-docs.md
     payload = {
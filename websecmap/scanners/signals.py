@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by the scanmanager after new scans have been stored, with the argument scan_types. Bulk inserts and updates
+# do not send post_save signals, so this is the way to learn about new scans. Results that are the same as the latest
+# scan only update the last_scan_moment of that scan, and are not sent.
+scan_results_stored = Signal()
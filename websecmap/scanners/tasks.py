@@ -1,9 +1,11 @@
 """Import modules containing tasks that need to be auto-discovered by Django Celery."""
 import logging
+from typing import List
 
 from celery import group
 
 from websecmap.map.views import screenshot
+from websecmap.organizations.models import Url
 from websecmap.scanners import plannedscan, proxy
 from websecmap.scanners.scanner import (
     dns_endpoints,
@@ -74,37 +76,25 @@ DEFAULT_SCANNERS = [
 TLD_DEFAULT_SCANNERS = [dnssec.plan_scan]
 
 
-def get_tasks(url, normal_tasks, tld_tasks):
-    scanners = normal_tasks
-    if url.is_top_level():
-        scanners += tld_tasks
+def get_tasks(urls: List[Url], normal_tasks, tld_tasks):
+    tasks = [scanner(urls_filter={"url__in": urls}) for scanner in normal_tasks]
 
-    tasks = []
-    for scanner in scanners:
-        tasks.append(scanner(urls_filter={"url": url}))
+    top_level_urls = [url for url in urls if url.is_top_level()]
+    if top_level_urls:
+        tasks += [scanner(urls_filter={"url__in": top_level_urls}) for scanner in tld_tasks]
 
-    return group(tasks)
+    # scanners that plan scans do so right away, and do not return a task.
+    return group([task for task in tasks if task is not None])
 
 
-def explore_tasks(url):
-    return get_tasks(url, DEFAULT_EXPLORERS, TLD_DEFAULT_EXPLORERS)
+def explore_tasks(urls: List[Url]):
+    return get_tasks(urls, DEFAULT_EXPLORERS, TLD_DEFAULT_EXPLORERS)
 
 
-def crawl_tasks(url):
-    return get_tasks(url, DEFAULT_CRAWLERS, TLD_DEFAULT_CRAWLERS)
+def crawl_tasks(urls: List[Url]):
+    return get_tasks(urls, DEFAULT_CRAWLERS, TLD_DEFAULT_CRAWLERS)
 
 
-def scan_tasks(url_chunk):
-    tasks = []
-
-    for scanner in DEFAULT_SCANNERS:
-        # Tls qualys scans are inserted per 25. This is due to behaviour of the qualys service.
-        tasks.append(scanner(urls_filter={"url__in": url_chunk}))
-
-    # and add the top level urls.
-    for url in url_chunk:
-        if url.is_top_level():
-            for tld_scanner in TLD_DEFAULT_SCANNERS:
-                tasks.append(tld_scanner(urls_filter={"url": url}))
-
-    return group(tasks)
+def scan_tasks(url_chunk: List[Url]):
+    # Tls qualys scans are inserted per 25. This is due to behaviour of the qualys service.
+    return get_tasks(url_chunk, DEFAULT_SCANNERS, TLD_DEFAULT_SCANNERS)
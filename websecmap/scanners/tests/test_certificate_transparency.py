@@ -0,0 +1,115 @@
+import gzip
+import json
+
+import requests
+
+from websecmap.organizations.models import Url
+from websecmap.scanners.models import CertificateTransparencyCache
+from websecmap.scanners.scanner import subdomains
+from websecmap.scanners.scanner.certificate_transparency import entries_from_dump, subdomains_from_entries
+from websecmap.scanners.scanner.subdomains import (
+    certificate_transparency_dump_scan,
+    certificate_transparency_scan,
+    store_certificate_transparency_results,
+)
+
+ENTRIES = [
+    {"id": 10, "common_name": "faalonie.test", "name_value": "faalonie.test\nwww.faalonie.test"},
+    {"id": 11, "common_name": "*.apps.faalonie.test", "name_value": "*.apps.faalonie.test\nMAIL.faalonie.test"},
+    {"id": 12, "common_name": "faalonie.test", "name_value": "hostmaster@faalonie.test\nnotfaalonie.test"},
+    {"id": 13, "common_name": "vpn.faalonie.test", "name_value": "vpn.faalonie.test\nvpn.example.test"},
+]
+
+
+def test_subdomains_from_entries():
+    found, last_certificate_id = subdomains_from_entries(ENTRIES, "faalonie.test")
+    assert found == {"www", "apps", "mail", "vpn"}
+    assert last_certificate_id == 13
+
+    # only newer certificates are inspected
+    found, last_certificate_id = subdomains_from_entries(ENTRIES, "faalonie.test", newer_than=11)
+    assert found == {"vpn"}
+    assert last_certificate_id == 13
+
+    assert subdomains_from_entries(ENTRIES, "faalonie.test", newer_than=13) == (set(), 13)
+
+
+def test_entries_from_dump(tmp_path):
+    path = tmp_path / "ct.ndjson.gz"
+    with gzip.open(path, "wt") as f:
+        for entry in ENTRIES + [{"id": 14, "common_name": "example.test", "name_value": "example.test"}]:
+            f.write(json.dumps(entry) + "\n")
+
+    # the dump is read once for all domains, also for domains that are subdomains of each other
+    entries = entries_from_dump(["faalonie.test", "apps.faalonie.test", "example.test", "other.test"], str(path))
+    assert {domain: [entry["id"] for entry in found] for domain, found in entries.items()} == {
+        "faalonie.test": [10, 11, 13],
+        "apps.faalonie.test": [],
+        "example.test": [13],
+        "other.test": [],
+    }
+
+
+def test_incremental_discovery(db, tmp_path, monkeypatch):
+    url = Url.objects.create(url="faalonie.test")
+
+    path = tmp_path / "ct.ndjson"
+    path.write_text("\n".join(json.dumps(entry) for entry in ENTRIES[:2]) + "\n")
+    monkeypatch.setattr(subdomains, "constance_cached_value", lambda key: str(path))
+
+    offered, unresolvable = [], {"mail"}
+
+    def add_subdomains_bulk(self, subdomains):
+        offered.extend(subdomains)
+        added = [f"{subdomain}.{self.url}" for subdomain in subdomains if subdomain not in unresolvable]
+        return [Url.objects.create(url=new_url).id for new_url in added]
+
+    monkeypatch.setattr(Url, "add_subdomains_bulk", add_subdomains_bulk)
+
+    result = certificate_transparency_dump_scan({url.url: 0})[url.url]
+    assert result == {"subdomains": ["apps", "mail", "www"], "last_certificate_id": 11}
+    store_certificate_transparency_results(result, url.id)
+    assert offered == ["apps", "mail", "www"]
+
+    # a renewed certificate for a known name and one new name
+    path.write_text(
+        "\n".join(json.dumps(entry) for entry in ENTRIES[:2])
+        + "\n"
+        + json.dumps({"id": 20, "common_name": "www.faalonie.test", "name_value": "www.faalonie.test"})
+        + "\n"
+        + json.dumps({"id": 21, "common_name": "new.faalonie.test", "name_value": "new.faalonie.test"})
+        + "\n"
+    )
+
+    cache = CertificateTransparencyCache.objects.get(url=url)
+    result = certificate_transparency_dump_scan({url.url: cache.last_certificate_id})[url.url]
+    assert result == {"subdomains": ["new", "www"], "last_certificate_id": 21}
+
+    # the name that did not resolve before is offered again, although it is in an older certificate
+    cache.refresh_from_db()
+    assert cache.known_subdomains == ["apps", "www"]
+    assert cache.pending_subdomains == ["mail"]
+
+    offered.clear()
+    unresolvable.clear()
+    store_certificate_transparency_results(result, url.id)
+    assert offered == ["mail", "new"]
+
+    cache.refresh_from_db()
+    assert cache.last_certificate_id == 21
+    assert cache.known_subdomains == ["apps", "mail", "new", "www"]
+    assert cache.pending_subdomains == []
+
+
+def test_crt_sh_errors(monkeypatch, mocker):
+    monkeypatch.setattr(subdomains, "constance_cached_value", lambda key: "https://crt.sh/")
+    response = mocker.Mock(text="<html>")
+    get = mocker.patch.object(requests, "get", return_value=response)
+
+    # error answers and malformed json are not retried and do not advance the last certificate id
+    response.raise_for_status.side_effect = requests.HTTPError("503 Server Error")
+    assert certificate_transparency_scan("faalonie.test", 11) == {"subdomains": [], "last_certificate_id": 11}
+    response.raise_for_status.side_effect = None
+    response.json.side_effect = ValueError("Expecting value")
+    assert certificate_transparency_scan("faalonie.test", 11) == {"subdomains": [], "last_certificate_id": 11}
+    assert get.call_count == 2
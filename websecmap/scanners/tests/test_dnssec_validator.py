@@ -0,0 +1,183 @@
+"""Testing the dnspython DNSSEC engine against a locally served, signed, zone."""
+import base64
+import socket
+import struct
+import threading
+import time
+
+import dns.dnssec
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from websecmap.scanners.scanner import dnssec_validator
+from websecmap.scanners.scanner.dnssec import analyze_result
+from websecmap.scanners.scanner.dnssec_validator import validate_zones
+
+ED25519 = 15
+
+
+def make_dnskey(private_key):
+    public = private_key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    text = f"257 3 {ED25519} {base64.b64encode(public).decode()}"
+    return dns.rdata.from_text(dns.rdataclass.IN, dns.rdatatype.DNSKEY, text)
+
+
+def sign(rrset, private_key, dnskey, signer):
+    """Creates the RRSIG rrset for an rrset, mirroring what dns.dnssec validates."""
+    now = int(time.time())
+    rrsig = dns.rdata.from_text(
+        dns.rdataclass.IN,
+        dns.rdatatype.RRSIG,
+        f"{dns.rdatatype.to_text(rrset.rdtype)} {ED25519} {len(rrset.name) - 1} {rrset.ttl} "
+        f"{now + 3600} {now - 3600} {dns.dnssec.key_id(dnskey)} {signer} AAAA",
+    )
+
+    data = rrsig.to_wire()[:18] + signer.to_digestable()
+    rrfixed = struct.pack("!HHI", rrset.rdtype, rrset.rdclass, rrset.ttl)
+    for rdata in sorted(rrset):
+        rrdata = rdata.to_digestable()
+        data += rrset.name.to_digestable() + rrfixed + struct.pack("!H", len(rrdata)) + rrdata
+
+    rrsig = rrsig.replace(signature=private_key.sign(data))
+    return dns.rrset.from_rdata(rrset.name, rrset.ttl, rrsig)
+
+
+def make_zone(zone: str, signed: bool = True, with_ds: bool = True, bogus: bool = False):
+    """Returns {(name, rdtype): [rrsets]} and the authority to add to non existing names."""
+    name = dns.name.from_text(zone)
+    records = {}
+
+    soa = dns.rrset.from_text(name, 300, "IN", "SOA", f"ns.{zone} hostmaster.{zone} 1 7200 3600 1209600 300")
+    records[(name, dns.rdatatype.SOA)] = [soa]
+
+    if not signed:
+        return records, []
+
+    key = Ed25519PrivateKey.generate()
+    dnskey_rdata = make_dnskey(key)
+    dnskey = dns.rrset.from_rdata(name, 300, dnskey_rdata)
+
+    # a bogus zone is signed with another key than the one that is published.
+    signing_key = Ed25519PrivateKey.generate() if bogus else key
+
+    records[(name, dns.rdatatype.DNSKEY)] = [dnskey, sign(dnskey, signing_key, dnskey_rdata, name)]
+    records[(name, dns.rdatatype.SOA)] = [soa, sign(soa, signing_key, dnskey_rdata, name)]
+
+    if with_ds:
+        ds = dns.rrset.from_rdata(name, 300, dns.dnssec.make_ds(name, dnskey_rdata, "SHA256"))
+        records[(name, dns.rdatatype.DS)] = [ds]
+
+    nsec = dns.rrset.from_text(name, 300, "IN", "NSEC", f"{zone} SOA RRSIG NSEC DNSKEY")
+    return records, [nsec, sign(nsec, signing_key, dnskey_rdata, name)]
+
+
+class LocalNameserver:
+    """Answers DNS queries over UDP from a set of in memory zones."""
+
+    def __init__(self, zones):
+        self.records = {}
+        self.denial = {}
+        for zone, (records, denial) in zones.items():
+            self.records.update(records)
+            self.denial[dns.name.from_text(zone)] = denial
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                wire, address = self.socket.recvfrom(4096)
+            except OSError:
+                return
+            self.socket.sendto(self.answer(dns.message.from_wire(wire)).to_wire(), address)
+
+    def answer(self, query):
+        response = dns.message.make_response(query)
+        question = query.question[0]
+
+        if (question.name, question.rdtype) in self.records:
+            response.answer = self.records[(question.name, question.rdtype)]
+            return response
+
+        for zone, denial in self.denial.items():
+            if question.name == zone:
+                # the name exists, but not with this type
+                return response
+            if question.name.is_subdomain(zone):
+                response.set_rcode(dns.rcode.NXDOMAIN)
+                response.authority = denial
+                return response
+
+        response.set_rcode(dns.rcode.REFUSED)
+        return response
+
+    def close(self):
+        self.socket.close()
+
+
+@pytest.fixture
+def nameserver():
+    server = LocalNameserver(
+        {
+            "signed.test.": make_zone("signed.test."),
+            "nods.test.": make_zone("nods.test.", with_ds=False),
+            "bogus.test.": make_zone("bogus.test.", bogus=True),
+            "unsigned.test.": make_zone("unsigned.test.", signed=False),
+        }
+    )
+    yield server
+    server.close()
+
+
+def test_validate_zones(nameserver):
+    # a malformed name does not abort the other zones
+    malformed = "a" * 64 + ".test"
+    zones = ["signed.test", "nods.test", "bogus.test", "unsigned.test", malformed]
+    results = validate_zones(zones, ["127.0.0.1"], port=nameserver.port, concurrency=2)
+
+    assert list(results.keys()) == zones
+
+    levels = {zone: analyze_result(output)[0] for zone, output in results.items()}
+    assert levels == {
+        "signed.test": "INFO",
+        # a missing DS at the parent is not seen as a problem, the same as with dnscheck
+        "nods.test": "INFO",
+        "bogus.test": "ERROR",
+        "unsigned.test": "ERROR",
+        malformed: "ERROR",
+    }
+
+    signed = "\n".join(results["signed.test"])
+    assert "refers to valid key at child" in signed
+    assert "Authenticated denial records found for signed.test, of type NSEC." in signed
+
+    bogus = "\n".join(results["bogus.test"])
+    assert "ERROR No valid signatures over SOA RRset found for bogus.test" in bogus
+
+    assert "INFO No DNSKEY(s) found at child, other tests skipped." in "\n".join(results["unsigned.test"])
+
+
+def test_validate_zones_without_answers(monkeypatch):
+    monkeypatch.setattr(dnssec_validator, "QUERY_TIMEOUT", 0.5)
+
+    # nothing is listening on this port
+    unused = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    unused.bind(("127.0.0.1", 0))
+    port = unused.getsockname()[1]
+    unused.close()
+
+    results = validate_zones(["signed.test"], ["127.0.0.1"], port=port)
+    level, relevant = analyze_result(results["signed.test"])
+    assert level == "ERROR"
+    assert "Could not retrieve records for signed.test" in relevant[0]
@@ -0,0 +1,152 @@
+"""Testing the FTP scanner against local FTP servers."""
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from websecmap.scanners.models import Endpoint, EndpointGenericScan
+from websecmap.scanners.scanner import ftp
+from websecmap.scanners.scanner.ftp import scan_bulk, scan_ftp_server, store_bulk
+
+pyftpdlib_handlers = pytest.importorskip("pyftpdlib.handlers")
+pyftpdlib_ioloop = pytest.importorskip("pyftpdlib.ioloop")
+pyftpdlib_servers = pytest.importorskip("pyftpdlib.servers")
+
+
+def self_signed_certificate(path):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime.utcnow() - timedelta(days=1))
+        .not_valid_after(datetime.utcnow() + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+    with open(path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+            )
+        )
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+
+    return str(path)
+
+
+def run_ftp_server(handler):
+    # every server runs in its own thread, so it also needs its own event loop.
+    server = pyftpdlib_servers.FTPServer(("127.0.0.1", 0), handler, ioloop=pyftpdlib_ioloop.IOLoop())
+    thread = threading.Thread(target=server.serve_forever, kwargs={"timeout": 0.1}, daemon=True)
+    thread.start()
+    return server
+
+
+def run_broken_server(behaviour: str):
+    """A server that either sends garbage or never says anything."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+    connections = []
+
+    def serve():
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            if behaviour == "garbage":
+                connection.sendall(b"this is not ftp\r\n")
+                connection.close()
+            else:
+                # keep the connection open without a welcome message
+                connections.append(connection)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return listener
+
+
+@pytest.fixture
+def ftp_servers(tmp_path):
+    plain_handler = type("PlainHandler", (pyftpdlib_handlers.FTPHandler,), {})
+    plain_handler.authorizer = pyftpdlib_handlers.DummyAuthorizer()
+
+    tls_handler = type("TLSHandler", (pyftpdlib_handlers.TLS_FTPHandler,), {})
+    tls_handler.authorizer = pyftpdlib_handlers.DummyAuthorizer()
+    tls_handler.certfile = self_signed_certificate(tmp_path / "certificate.pem")
+
+    plain = run_ftp_server(plain_handler)
+    tls = run_ftp_server(tls_handler)
+    garbage = run_broken_server("garbage")
+    silent = run_broken_server("silent")
+
+    yield {
+        "plain": plain.address[1],
+        "tls": tls.address[1],
+        "garbage": garbage.getsockname()[1],
+        "silent": silent.getsockname()[1],
+    }
+
+    plain.close_all()
+    tls.close_all()
+    garbage.close()
+    silent.close()
+
+
+def test_scan_ftp_server(ftp_servers, monkeypatch):
+    monkeypatch.setattr(ftp, "FTP_SERVER_DEADLINE", 2)
+
+    result = scan_ftp_server("127.0.0.1", ftp_servers["plain"])
+    assert result["supports_tls"] is False
+    assert result["supports_ssl"] is False
+    assert ftp.analyze_result(result)[0] == "insecure"
+
+    result = scan_ftp_server("127.0.0.1", ftp_servers["tls"])
+    assert result["supports_tls"] is True
+    assert ftp.analyze_result(result)[0] == "secure"
+
+    result = scan_ftp_server("127.0.0.1", ftp_servers["garbage"])
+    assert ftp.analyze_result(result)[0] == "unknown"
+
+    # a server that never answers is given up on after the deadline.
+    started = datetime.now()
+    result = scan_ftp_server("127.0.0.1", ftp_servers["silent"])
+    assert ftp.analyze_result(result)[0] == "unknown"
+    assert datetime.now() - started < timedelta(seconds=5)
+
+
+def test_scan_bulk_and_store_bulk(db, faaloniae, ftp_servers, monkeypatch):
+    monkeypatch.setattr(ftp, "FTP_SERVER_DEADLINE", 2)
+
+    endpoints = {}
+    for name, port in ftp_servers.items():
+        endpoints[name] = Endpoint.objects.create(url=faaloniae["url"], protocol="ftp", port=port, ip_version=4)
+
+    targets = [
+        {"endpoint_id": endpoint.id, "address": "127.0.0.1", "port": endpoint.port} for endpoint in endpoints.values()
+    ]
+    results = scan_bulk(targets)
+    assert [result["endpoint_id"] for result in results] == [target["endpoint_id"] for target in targets]
+
+    store_bulk(results)
+
+    ratings = dict(EndpointGenericScan.objects.all().filter(type="ftp").values_list("endpoint_id", "rating"))
+    assert ratings == {
+        endpoints["plain"].id: "insecure",
+        endpoints["tls"].id: "secure",
+        endpoints["garbage"].id: "unknown",
+        endpoints["silent"].id: "unknown",
+    }
+
+    # storing the same verdicts again does not create new scans
+    store_bulk(results)
+    assert EndpointGenericScan.objects.all().filter(type="ftp").count() == 4
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytz
+
+from websecmap.organizations.models import Organization, OrganizationType, Url
+from websecmap.scanners.impact import calculate_impact
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.scanmanager import store_severity
+
+
+def create_scans(subject, scan_type, ratings):
+    owner = {"endpoint": subject} if isinstance(subject, Endpoint) else {"url": subject}
+    model = EndpointGenericScan if isinstance(subject, Endpoint) else UrlGenericScan
+    for month, rating in enumerate(ratings, start=1):
+        moment = datetime(2020, month, 1, tzinfo=pytz.utc)
+        scan = model(**owner, type=scan_type, rating=rating, explanation="", rating_determined_on=moment)
+        scan.last_scan_moment = moment
+        scan.is_the_latest_scan = month == len(ratings)
+        store_severity(scan)
+        scan.save()
+
+
+def test_calculate_impact(db, django_assert_max_num_queries):
+    municipality, _ = OrganizationType.objects.all().get_or_create(name="municipality")
+    organization = Organization.objects.create(name="Faalonië", type=municipality, country="NL")
+
+    endpoints = []
+    for number in range(4):
+        url = Url.objects.create(url=f"site{number}.example")
+        url.organization.add(organization)
+        endpoints.append(Endpoint.objects.create(url=url, protocol="https", port=443, ip_version=4))
+
+    # fixed in march, broken in march, broken in january and fixed in february, and never changed.
+    create_scans(endpoints[0], "tls_qualys_encryption_quality", ["F", "F", "A"])
+    create_scans(endpoints[1], "tls_qualys_encryption_quality", ["A", "A", "B"])
+    create_scans(endpoints[2], "tls_qualys_encryption_quality", ["F", "A"])
+    create_scans(endpoints[3], "tls_qualys_encryption_quality", ["A"])
+    create_scans(endpoints[0].url, "DNSSEC", ["ERROR", "ok"])
+    # older scans without a stored severity are still taken into account
+    EndpointGenericScan.objects.all().update(impact=None)
+
+    # the queries do not depend on the amount of endpoints, also not when severities have to be calculated
+    with django_assert_max_num_queries(7):
+        impact = calculate_impact(country="NL")
+
+    tls = impact["scan_types"]["tls_qualys_encryption_quality"]
+    assert (tls["high"]["good"], tls["good"]["low"]) == (2, 1)
+    assert impact["scan_types"]["DNSSEC"]["high"]["good"] == 1
+    assert impact["total"]["high"]["good"] == 3
+    assert impact["metadata"]["endpoints"] == 4
+    assert impact["metadata"]["recorded_changes"] == 11
+    assert impact["metadata"]["amount_of_current_scans"] == 5
+    assert (impact["metadata"]["improvements"], impact["metadata"]["degradations"]) == (3, 1)
+
+    # in the period since february, the first measurement is the state at the first of february.
+    impact = calculate_impact(country="NL", since=datetime(2020, 2, 1, 12, tzinfo=pytz.utc))
+    tls = impact["scan_types"]["tls_qualys_encryption_quality"]
+    assert (tls["high"]["good"], tls["good"]["low"]) == (1, 1)
+    assert impact["metadata"]["recorded_changes"] == 2
+
+    # until february only the endpoint that was fixed in february changed.
+    impact = calculate_impact(country="NL", until=datetime(2020, 2, 1, tzinfo=pytz.utc))
+    assert impact["metadata"]["changes"] == 2
+
+    assert calculate_impact(country="DE")["metadata"]["endpoints"] == 0
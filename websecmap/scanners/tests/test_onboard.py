@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytz
+from celery import group
+
+from websecmap.organizations.models import Url
+from websecmap.scanners.scanner import onboard
+
+
+def test_onboarding_stages(db, monkeypatch, django_assert_max_num_queries):
+    # only the stage changes are tested, not the scans
+    for stage_tasks in ["explore_tasks", "scan_tasks", "crawl_tasks", "update_report_tasks"]:
+        monkeypatch.setattr(onboard, stage_tasks, lambda urls: group(onboard.update_stage.si([], "")))
+
+    recently = datetime.now(pytz.utc)
+    for number in range(60):
+        Url.objects.create(url=f"new{number}.example", onboarding_stage=None if number else "")
+    for number in range(3):
+        Url.objects.create(
+            url=f"scanned{number}.example", onboarding_stage="scans_finished", onboarding_stage_set_on=recently
+        )
+    stuck = Url.objects.create(url="stuck.example", onboarding_stage="scans_running", onboarding_stage_set_on=recently)
+    Url.objects.all().filter(id=stuck.id).update(onboarding_stage_set_on=recently - timedelta(days=8))
+
+    # the amount of queries does not depend on the amount of urls
+    with django_assert_max_num_queries(15):
+        tasks = onboard.compose_task()
+
+    # 60 new urls in chunks of 25, the stuck url is scanned again, the scanned urls are crawled
+    assert len(tasks.tasks) == 3 + 1 + 1
+    stages = dict(
+        Url.objects.all()
+        .filter(url__in=["new0.example", "stuck.example", "scanned0.example"])
+        .values_list("url", "onboarding_stage")
+    )
+    assert stages == {
+        "new0.example": "endpoint_discovery",
+        "stuck.example": "scans_running",
+        "scanned0.example": "crawling",
+    }
+
+    # urls that are claimed are not onboarded again
+    assert len(onboard.compose_task().tasks) == 0
+
+    crawled = list(Url.objects.all().filter(onboarding_stage="crawling").values_list("id", flat=True))
+    onboard.finish_onboarding(crawled)
+    assert (
+        Url.objects.all().filter(onboarded=True, onboarding_stage="onboarded", onboarded_on__isnull=False).count() == 3
+    )
+
+    onboard.reset_onboarding(Url.objects.all())
+    assert Url.objects.all().filter(onboarding_stage="").count() == 60
+    assert Url.objects.get(url="stuck.example").onboarding_stage == "endpoint_finished"
+
+    onboard.forward_onboarding(Url.objects.all().filter(url="new0.example"))
+    assert Url.objects.get(url="new0.example").onboarding_stage == ""
@@ -5,14 +5,14 @@ from django.utils import timezone
 from deepdiff import DeepDiff
 
 from websecmap.organizations.models import Url
-from websecmap.scanners.duplicates import deduplicate_all_endpoints_sequentially
+from websecmap.scanners.duplicates import deduplicate_endpoints, merge_short_outages
 from websecmap.scanners.models import Endpoint, EndpointGenericScan
 import logging
 
 log = logging.getLogger(__package__)
 
 
-def test_deduplicate_all_endpoints_sequentially(db):
+def test_deduplicate_endpoints(db):
     # This was made to remove both "remove duplicate endpoints" and "remove short outages"
     u = Url.objects.create(url="basisbeveiliging.nl")
     u2 = Url.objects.create(url="example.com")
@@ -54,7 +54,7 @@ def test_deduplicate_all_endpoints_sequentially(db):
 
     assert Endpoint.objects.all().count() == 11
 
-    deduplicate_all_endpoints_sequentially()
+    deduplicate_endpoints()
 
     assert Endpoint.objects.all().count() == 7
 
@@ -149,3 +149,32 @@ def test_deduplicate_all_endpoints_sequentially(db):
     # scans have migrated to endpoint id 1
     # first_epgs = EndpointGenericScan.objects.filter(endpoint=target_ep).first()
     # assert first_epgs.endpoint.id == 1
+
+
+def test_merge_short_outages(db, django_assert_max_num_queries):
+    u = Url.objects.create(url="basisbeveiliging.nl")
+    properties = {"protocol": "https", "port": 443, "ip_version": 4, "url": u}
+
+    # died on the 5th, a new endpoint was discovered two days later, which died on the 20th and came back the 22nd.
+    first = Endpoint.objects.create(
+        **properties, discovered_on=date(2021, 7, 1), is_dead=True, is_dead_since=date(2021, 7, 5)
+    )
+    second = Endpoint.objects.create(
+        **properties, discovered_on=date(2021, 7, 7), is_dead=True, is_dead_since=date(2021, 7, 20)
+    )
+    third = Endpoint.objects.create(**properties, discovered_on=date(2021, 7, 22), is_dead=False)
+    # discovered long after the last one died
+    later = Endpoint.objects.create(**{**properties, "discovered_on": date(2021, 9, 1), "is_dead": False})
+    EndpointGenericScan.objects.create(endpoint=third, rating_determined_on=timezone.now())
+
+    # nothing is changed in a dry run, and finding the merges is a single query.
+    with django_assert_max_num_queries(1):
+        merges = merge_short_outages(dry_run=True)
+    assert [(merge["into"], merge["merged"]) for merge in merges] == [(first.id, [second.id, third.id])]
+    assert Endpoint.objects.all().count() == 4
+
+    merge_short_outages(batch_size=1)
+    assert list(Endpoint.objects.all().order_by("id").values_list("id", flat=True)) == [first.id, later.id]
+    first.refresh_from_db()
+    assert first.is_dead is False
+    assert EndpointGenericScan.objects.get().endpoint_id == first.id
@@ -0,0 +1,102 @@
+from django.core.management import call_command
+
+from websecmap.organizations.models import Url
+from websecmap.scanners.models import Endpoint, EndpointGenericScan, UrlGenericScan
+from websecmap.scanners.scanmanager import (
+    store_endpoint_scan_result,
+    store_endpoint_scan_results,
+    store_url_scan_result,
+)
+from websecmap.scanners.scanner.internet_nl_v2_websecmap import chunked_scan_report
+
+
+def test_store_endpoint_scan_results(db):
+    url = Url.objects.create(url="example.nl")
+    endpoint = Endpoint.objects.create(protocol="dns_a_aaaa", port=0, ip_version=4, url=url)
+    other_endpoint = Endpoint.objects.create(protocol="dns_soa", port=0, ip_version=4, url=url)
+
+    store_endpoint_scan_result("test1", endpoint.pk, "passed", "message")
+    store_endpoint_scan_result("test2", endpoint.pk, "passed", "message")
+
+    store_endpoint_scan_results(
+        [
+            # unchanged: only the last scan moment is updated
+            {"scan_type": "test1", "endpoint_id": endpoint.pk, "rating": "passed", "message": "message"},
+            # changed: a new latest scan is created
+            {"scan_type": "test2", "endpoint_id": endpoint.pk, "rating": "failed", "message": "message"},
+            # new: a new latest scan is created
+            {"scan_type": "test3", "endpoint_id": endpoint.pk, "rating": "passed", "message": "message"},
+            {"scan_type": "test1", "endpoint_id": other_endpoint.pk, "rating": "passed", "message": "message"},
+        ]
+    )
+
+    assert EndpointGenericScan.objects.all().count() == 5
+    assert EndpointGenericScan.objects.all().filter(is_the_latest_scan=True).count() == 4
+    assert EndpointGenericScan.objects.all().filter(type="test2", is_the_latest_scan=True).first().rating == "failed"
+
+    # running the same results again does not add anything
+    store_endpoint_scan_results(
+        [{"scan_type": "test2", "endpoint_id": endpoint.pk, "rating": "failed", "message": "message"}]
+    )
+    assert EndpointGenericScan.objects.all().count() == 5
+
+    # the bulk method and the single method can be mixed
+    store_endpoint_scan_result("test2", endpoint.pk, "passed", "message")
+    assert EndpointGenericScan.objects.all().count() == 6
+    assert EndpointGenericScan.objects.all().filter(type="test2", is_the_latest_scan=True).count() == 1
+
+    # nothing to store, nothing happens
+    store_endpoint_scan_results([])
+    assert EndpointGenericScan.objects.all().count() == 6
+
+    # like the single method, the latest scan is the one that was scanned last, regardless of the latest scan flag
+    EndpointGenericScan.objects.all().filter(type="test2").update(is_the_latest_scan=False)
+    store_endpoint_scan_results(
+        [{"scan_type": "test2", "endpoint_id": endpoint.pk, "rating": "passed", "message": "message"}]
+    )
+    assert EndpointGenericScan.objects.all().count() == 6
+
+    # and a changed result makes all previous scans of the endpoint and type not the latest
+    EndpointGenericScan.objects.all().filter(type="test2").update(is_the_latest_scan=True)
+    store_endpoint_scan_results(
+        [{"scan_type": "test2", "endpoint_id": endpoint.pk, "rating": "failed", "message": "message"}]
+    )
+    assert EndpointGenericScan.objects.all().filter(type="test2", is_the_latest_scan=True).count() == 1
+    assert EndpointGenericScan.objects.all().filter(type="test1", is_the_latest_scan=True).count() == 2
+
+
+def test_chunked_scan_report():
+    report = {f"{number}.example.nl": {"status": "ok"} for number in range(7)}
+
+    chunks = list(chunked_scan_report(report, 3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert list(chunks[2].keys()) == ["6.example.nl"]
+
+    assert list(chunked_scan_report({}, 3)) == []
+
+
+def test_store_scan_severity(db):
+    url = Url.objects.create(url="example.nl")
+    endpoint = Endpoint.objects.create(protocol="https", port=443, ip_version=4, url=url)
+
+    store_endpoint_scan_result("tls_qualys_encryption_quality", endpoint.pk, "F", "")
+    store_endpoint_scan_results(
+        [{"scan_type": "tls_qualys_encryption_quality", "endpoint_id": endpoint.pk, "rating": "B", "message": ""}]
+    )
+    store_url_scan_result("DNSSEC", url.pk, "ERROR", "")
+    # scans without a severity calculation are stored without severity
+    store_endpoint_scan_result("test1", endpoint.pk, "passed", "message")
+
+    scans = EndpointGenericScan.objects.all().order_by("id")
+    assert [(scan.impact, scan.severity_high, scan.severity_low) for scan in scans] == [
+        ("high", 1, 0),
+        ("low", 0, 1),
+        ("", 0, 0),
+    ]
+    assert UrlGenericScan.objects.get().impact == "high"
+
+    # older scans get their severity stored with a command
+    EndpointGenericScan.objects.all().update(impact=None, severity_high=0, severity_low=0)
+    call_command("store_scan_severities", batch_size=1)
+    assert list(scans.values_list("impact", "severity_high")) == [("high", 1), ("low", 0), ("", 0)]
+    assert EndpointGenericScan.objects.all().filter(type="tls_qualys_encryption_quality", impact="high").count() == 1
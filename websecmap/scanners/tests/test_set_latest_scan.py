@@ -25,9 +25,13 @@ def test_reflag_endpointgenericscan(db):
     othere2 = EndpointGenericScan.objects.create(**args)
 
     # running multiple times does not matter
+    assert reflag_endpointgenericscan("tls_qualys", batch_size=1) == {"outdated": 0, "missing": 2}
     reflag_endpointgenericscan("tls_qualys")
     reflag_endpointgenericscan("tls_qualys")
-    reflag_endpointgenericscan("tls_qualys")
+
+    # only wrong flags are corrected
+    EndpointGenericScan.objects.all().filter(id=e1.pk).update(is_the_latest_scan=True)
+    assert reflag_endpointgenericscan("tls_qualys") == {"outdated": 1, "missing": 0}
 
     e1 = EndpointGenericScan.objects.get(id=e1.pk)
     assert e1.is_the_latest_scan is False
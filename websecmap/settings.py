@@ -96,7 +96,7 @@ INSTALLED_APPS = [
     "websecmap.organizations.apps.OrganizationsConfig",  # because some signals need this.
     "websecmap.scanners",
     "websecmap.reporting",
-    "websecmap.map",
+    "websecmap.map.apps.MapConfig",  # because some signals need this.
     "websecmap.game",
     "websecmap.api",
     "django_countries",
@@ -401,6 +401,11 @@ TOOLS = {
         "output_dir": OUTPUT_DIR
         + os.environ.get("OPENSTREETMAP_OUTPUT_DIR", "scanners/resources/output/openstreetmap/"),
     },
+    "datasets": {
+        # snapshots of the downloadable datasets
+        "output_dir": OUTPUT_DIR
+        + os.environ.get("DATASETS_OUTPUT_DIR", "scanners/resources/output/datasets/"),
+    },
     "organizations": {
         "import_data_dir": OUTPUT_DIR
         + os.environ.get("ORGANIZATION_IMPORT_DATA_DIR", "scanners/resources/data/organizations/"),
@@ -578,6 +583,12 @@ if not DEBUG:
         "django_statsd.patches.db",
     ]
 
+# Durations of phases in reporting and scanning (timeline, severity, saving, dns, http, queue wait), see
+# websecmap.app.instrumentation. Sent to statsd when INSTRUMENTATION is set, and/or appended as json lines to the file
+# in INSTRUMENTATION_PROFILE_LOG. Both are off by default.
+INSTRUMENTATION = bool(os.environ.get("INSTRUMENTATION", False))
+INSTRUMENTATION_PROFILE_LOG = os.environ.get("INSTRUMENTATION_PROFILE_LOG", "")
+
 # enable some features during debug
 if DEBUG:
     # We expect the debug toolbar always to be available in debug environments.
@@ -658,6 +669,13 @@ CONSTANCE_ADDITIONAL_FIELDS = {
         "django.forms.fields.ChoiceField",
         {"widget": "django.forms.Select", "choices": ((None, "-----"), ("1", "Yes"), ("0", "No"))},
     ],
+    "dnssec_engine_select": [
+        "django.forms.fields.ChoiceField",
+        {
+            "widget": "django.forms.Select",
+            "choices": (("dnscheck", "dnscheck (dnssec.pl)"), ("dnspython", "dnspython (in process, concurrent)")),
+        },
+    ],
     # Todo: no validation options, that is offloaded to the widget?
     "json": [
         "django.forms.fields.CharField",
@@ -911,6 +929,20 @@ CONSTANCE_CONFIG = {
         "only once every 10 minutes.",
         "json",
     ),
+    "SCANNER_DNSSEC_ENGINE": (
+        "dnscheck",
+        "Engine used to validate DNSSEC. dnscheck starts the dnssec.pl tool for every domain. dnspython validates "
+        "many domains at the same time in the worker itself, using the nameservers above. Both engines classify "
+        "their findings the same way.",
+        "dnssec_engine_select",
+    ),
+    "CERTIFICATE_TRANSPARENCY_SOURCE": (
+        "https://crt.sh/",
+        "Where certificates are retrieved to discover subdomains. This is either the address of crt.sh or a mirror "
+        "that answers the same JSON queries, or the path to a local dump file with one crt.sh JSON entry per line "
+        "(optionally .gz compressed). A dump file is read without the rate limit that is used for crt.sh.",
+        str,
+    ),
     "ENABLE_PRO": (False, "Todo: implement.", bool),
     "PRO_REPLY_TO_MAIL_ADDRESS": ("", "Reply mail address used when sending PRO mails.", str),
     # django mail settings, but managed dynamically
@@ -1000,7 +1032,7 @@ CONSTANCE_CONFIG_FIELDSETS = OrderedDict(
         ),
         (
             "Scanning preferences",
-            ("SCANNER_NAMESERVERS",),
+            ("SCANNER_NAMESERVERS", "SCANNER_DNSSEC_ENGINE", "CERTIFICATE_TRANSPARENCY_SOURCE"),
         ),
         (
             "Plus",